@@ -14,7 +14,7 @@
 #  limitations under the License.
 #
 
-__all__ = ['qconnection', 'qtype', 'qtemporal', 'qcollection']
+__all__ = ['qconnection', 'qasyncconnection', 'qpool', 'qsubscriber', 'qpublisher', 'qscatter', 'qserver', 'qtype', 'qtemporal', 'qcollection']
 
 
 __version__ = '2.0.0'
@@ -64,6 +64,15 @@ class MetaData(object):
 
 CONVERSION_OPTIONS = MetaData(raw = False,
                               numpy_temporals = False,
+                              numpy_guids = False,
                               pandas = False,
-                              single_char_strings = False
+                              arrow = False,
+                              categorical_symbols = False,
+                              lazy_tables = False,
+                              columnar_tables = False,
+                              columns = None,
+                              single_char_strings = False,
+                              compress = False,
+                              compress_threshold = 2000,
+                              compress_adaptive = False
                              )
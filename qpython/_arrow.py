@@ -0,0 +1,258 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import json
+import struct
+
+import pyarrow
+
+from qpython.qreader import QReader, QReaderException
+from qpython.qcollection import QDictionary
+from qpython.qtype import *
+
+try:
+    from qpython._pandas import PandasQReader as _BaseQReader
+except ImportError:
+    _BaseQReader = QReader
+
+
+
+# days between 1970.01.01 and 2000.01.01
+_EPOCH_DAYS = 10957
+
+# arrow types and conversions of raw q temporals, ``None`` if the raw
+# representation matches the arrow one
+_TEMPORAL_TYPES = {
+    QTIMESTAMP_LIST: (pyarrow.timestamp('ns'), lambda raw: raw + numpy.int64(_EPOCH_DAYS * 86400 * 10 ** 9)),
+    QMONTH_LIST:     (pyarrow.date32(),        lambda raw: (raw.astype(numpy.int64) + 360).astype('datetime64[M]').astype('datetime64[D]').astype(numpy.int32)),
+    QDATE_LIST:      (pyarrow.date32(),        lambda raw: raw + numpy.int32(_EPOCH_DAYS)),
+    QDATETIME_LIST:  (pyarrow.timestamp('ms'), lambda raw: numpy.round(raw * 86400000).astype(numpy.int64) + numpy.int64(_EPOCH_DAYS * 86400000)),
+    QTIMESPAN_LIST:  (pyarrow.duration('ns'),  None),
+    QMINUTE_LIST:    (pyarrow.time32('s'),     lambda raw: raw * numpy.int32(60)),
+    QSECOND_LIST:    (pyarrow.time32('s'),     None),
+    QTIME_LIST:      (pyarrow.time32('ms'),    None),
+    }
+
+_STRING_HEADER = struct.Struct('bBI')
+
+
+
+def _wrap(arrow_type, data, mask = None):
+    '''Wraps a `numpy` array as an arrow array without copying, nulls marked
+    by the `mask` are stored in the validity bitmap.'''
+    validity, null_count = None, 0
+    if mask is not None and mask.any():
+        validity = pyarrow.py_buffer(numpy.packbits(~mask, bitorder = 'little'))
+        null_count = int(mask.sum())
+    return pyarrow.Array.from_buffers(arrow_type, len(data), [validity, pyarrow.py_buffer(data)], null_count = null_count)
+
+
+
+def _to_arrow(data):
+    '''Converts a decoded table column to an arrow array.'''
+    if isinstance(data, (pyarrow.Array, pyarrow.ChunkedArray)):
+        return data
+    if isinstance(data, str):
+        # char vector
+        return pyarrow.array(list(data), type = pyarrow.string())
+    if len(data) and all(isinstance(element, pyarrow.Array) for element in data):
+        # nested vectors
+        elements = [element.dictionary_decode() if isinstance(element, pyarrow.DictionaryArray) else element for element in data]
+        offsets = numpy.zeros(len(elements) + 1, dtype = numpy.int32)
+        numpy.cumsum([len(element) for element in elements], out = offsets[1:])
+        return pyarrow.ListArray.from_arrays(pyarrow.array(offsets), pyarrow.concat_arrays(elements))
+
+    try:
+        return pyarrow.array(list(data))
+    except (pyarrow.ArrowInvalid, pyarrow.ArrowTypeError) as e:
+        raise QReaderException('Unable to convert column to arrow: %s' % e)
+
+
+
+def _to_numpy(data):
+    return data.to_numpy(zero_copy_only = False) if isinstance(data, pyarrow.Array) else data
+
+
+
+class ArrowQReader(_BaseQReader):
+    '''Extends the reader with the `arrow` conversion option, which decodes
+    q vectors and tables to `pyarrow` arrays and tables.'''
+
+    _reader_map = dict.copy(_BaseQReader._reader_map)
+    parse = Mapper(_reader_map)
+
+
+    def _native_types(self, reference = None):
+        # parsers fall back to the base reader unless a conversion is enabled
+        if self._options.arrow or self._options.pandas:
+            reference = QReader
+        return QReader._native_types(self, reference or ArrowQReader)
+
+
+    @parse(QDICTIONARY)
+    def _read_dictionary(self, qtype = QDICTIONARY):
+        if not self._options.arrow:
+            return _BaseQReader._read_dictionary(self, qtype = qtype)
+
+        keys, values = self._read_dictionary_items()
+        if isinstance(keys, pyarrow.Table):
+            if not isinstance(values, pyarrow.Table):
+                raise QReaderException('Keyed table creation: values are expected to be of type pyarrow.Table. Actual: %s' % type(values))
+
+            # key columns come first, their names are kept in the schema metadata
+            table = pyarrow.Table.from_arrays(keys.columns + values.columns, names = keys.column_names + values.column_names)
+            return table.replace_schema_metadata({b'keys': json.dumps(keys.column_names).encode()})
+
+        return QDictionary(_to_numpy(keys), _to_numpy(values))
+
+
+    @parse(QTABLE)
+    def _read_table(self, qtype = QTABLE):
+        if not self._options.arrow:
+            return _BaseQReader._read_table(self, qtype = qtype)
+
+        self._buffer.skip()  # ignore attributes
+        self._buffer.skip()  # ignore dict type stamp
+
+        columns = self._read_object().to_pylist()
+        if self._options.lazy_tables:
+            return self._read_lazy_table(columns)
+
+        columns, data = self._read_table_data(columns)
+        return self._assemble_table(columns, data)
+
+
+    def _read_column(self):
+        if not self._options.arrow:
+            return _BaseQReader._read_column(self)
+        return QReader._read_column(self)
+
+
+    def _assemble_table(self, columns, data):
+        if not self._options.arrow:
+            return _BaseQReader._assemble_table(self, columns, data)
+
+        names = [column if isinstance(column, str) else column.decode('utf-8') for column in columns]
+        return pyarrow.Table.from_arrays([_to_arrow(column) for column in data], names = names)
+
+
+    def _read_list(self, qtype):
+        if not self._options.arrow:
+            return _BaseQReader._read_list(self, qtype = qtype)
+
+        attr = self._buffer.get_byte()
+        length = self._buffer.get_long() if attr & 0x80 != 0 else self._buffer.get_uint()
+
+        if qtype == QSYMBOL_LIST:
+            return self._read_symbol_array(length)
+        elif qtype == QBOOL_LIST:
+            # arrow booleans are bit-packed
+            return pyarrow.array(numpy.frombuffer(self._read_vector_bytes(length), dtype = numpy.bool_))
+        elif qtype == QGUID_LIST:
+            data = numpy.frombuffer(self._read_vector_bytes(length * 16), dtype = GUID_RAW_TYPE)
+            mask = ~data.view(numpy.uint64).reshape(length, 2).any(axis = 1)
+            return _wrap(pyarrow.binary(16), data, mask)
+        elif qtype >= QBYTE_LIST and qtype <= QTIME_LIST and qtype != QSTRING:
+            data = numpy.frombuffer(self._read_vector_bytes(length * ATOM_SIZE[qtype]), dtype = PY_TYPE[-qtype])
+            if not self._is_native:
+                data = data.byteswap()
+
+            if qtype == QBYTE_LIST:
+                return _wrap(pyarrow.uint8(), data)
+
+            mask = numpy.isnan(data) if data.dtype.kind == 'f' else data == qnull(-qtype)
+            if qtype in _TEMPORAL_TYPES:
+                arrow_type, conversion = _TEMPORAL_TYPES[qtype]
+                if conversion:
+                    if qtype == QDATETIME_LIST:
+                        # infinities have no arrow representation
+                        mask = ~numpy.isfinite(data)
+                    data = conversion(numpy.where(mask, 0, data).astype(data.dtype))
+                return _wrap(arrow_type, data, mask)
+
+            return _wrap(pyarrow.from_numpy_dtype(data.dtype), data, mask)
+
+        raise QReaderException('Unable to deserialize q type: %s' % hex(qtype))
+
+
+    def _read_symbol_array(self, length):
+        '''Reads a symbol vector as an arrow dictionary array, null symbols are
+        stored in the validity bitmap.'''
+        symbols = self._buffer.get_symbol_array(length)
+        uniques, inverse = numpy.unique(symbols, return_inverse = True)
+
+        mask = inverse == 0 if len(uniques) and uniques[0] == b'' else None
+        indices = pyarrow.array(inverse.reshape(-1).astype(numpy.int32), mask = mask)
+        dictionary = pyarrow.array([symbol.decode('utf-8') for symbol in uniques.tolist()], type = pyarrow.string())
+        return pyarrow.DictionaryArray.from_arrays(indices, dictionary)
+
+
+    @parse(QGENERAL_LIST)
+    def _read_general_list(self, qtype = QGENERAL_LIST):
+        if self._options.arrow:
+            strings = self._read_string_array()
+            if strings is not None:
+                return strings
+
+        return _BaseQReader._read_general_list(self, qtype)
+
+
+    def _read_string_array(self):
+        '''Reads a list of char vectors as an arrow string array. Character
+        data is gathered into a single buffer indexed by offsets.
+
+        :returns: `pyarrow.StringArray` or ``None`` if the list contains other
+                  items, the buffer position is left unchanged in such case
+        '''
+        buffer = self._buffer
+        start = buffer._position
+        buffer.skip()  # ignore attributes
+        length = buffer.get_int()
+
+        header = struct.Struct(buffer.endianness + _STRING_HEADER.format)
+        data, position = buffer._data, buffer._position
+        offsets = numpy.empty(length + 1, dtype = numpy.int64)
+        offsets[0] = 0
+        chunks = []
+        view = memoryview(data)
+        for i in range(length):
+            if position + 1 > buffer._size:
+                raise QReaderException('Attempt to read data out of buffer bounds')
+
+            if data[position] != QSTRING:
+                buffer._position = start
+                return None
+
+            if position + header.size > buffer._size:
+                raise QReaderException('Attempt to read data out of buffer bounds')
+            size = header.unpack_from(data, position)[2]
+            position += header.size
+            if position + size > buffer._size:
+                raise QReaderException('Attempt to read data out of buffer bounds')
+            chunks.append(view[position : position + size])
+            offsets[i + 1] = offsets[i] + size
+            position += size
+
+        if length == 0:
+            buffer._position = start
+            return None
+
+        buffer._position = position
+        if offsets[-1] < 2 ** 31:
+            arrow_type, offsets = pyarrow.string(), offsets.astype(numpy.int32)
+        else:
+            arrow_type = pyarrow.large_string()
+        return pyarrow.Array.from_buffers(arrow_type, length, [None, pyarrow.py_buffer(offsets), pyarrow.py_buffer(b''.join(chunks))])
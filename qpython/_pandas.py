@@ -30,16 +30,159 @@ from qpython.qtype import *
 
 
 
+# q types without nulls replaced by ``numpy.nan``
+_UNMASKED_TYPES = (QBOOL, QMONTH, QDATE, QDATETIME, QMINUTE, QSECOND, QTIME, QTIMESTAMP, QTIMESPAN, QSYMBOL)
+
+_STRING_HEADER = struct.Struct('bBI')
+
+
+
+def _mask_nulls(data, qtype):
+    '''Replaces q nulls in a vector with ``numpy.nan``, integer vectors
+    containing nulls are converted to floats.'''
+    qtype = -abs(qtype)
+    if qtype in _UNMASKED_TYPES or data.dtype.kind == 'f':
+        return data
+
+    mask = data == QNULLMAP[qtype][1]
+    if not mask.any():
+        return data
+
+    if data.dtype == numpy.object_:
+        data = numpy.array(data, dtype = numpy.object_)
+        data[mask] = numpy.nan
+        return data
+    return numpy.where(mask, numpy.nan, data)
+
+
+
+def _char_array(text, mask_blanks = True):
+    '''Converts a char vector to an array of single characters, blanks are
+    replaced with ``numpy.nan`` if `mask_blanks` is set.'''
+    chars = numpy.frombuffer(text.encode('utf-32-le'), dtype = '<U1')
+    data = chars.astype(numpy.object_)
+    if mask_blanks:
+        data[chars == ' '] = numpy.nan
+    return data
+
+
+
+def _decode_symbols(symbols):
+    '''Decodes a vector of symbols, each distinct symbol is decoded once.'''
+    domain = SymbolDomain()
+    codes = domain.encode(numpy.asarray(symbols))
+    return numpy.array(domain.symbols, dtype = numpy.object_)[codes]
+
+
+
+class SymbolDomain(object):
+    '''Symbols decoded by a :class:`.PandasQReader`, shared by categorical
+    symbol columns of all messages read by the reader.
+
+    Each distinct symbol is decoded only once, symbol vectors are represented
+    by codes referring to the domain.
+
+    :Attributes:
+     - `symbols` (`list` of `string`) - decoded symbols, in order of first
+       occurrence
+    '''
+
+    def __init__(self, encoding = 'utf-8'):
+        self.symbols = []
+        self._encoding = encoding
+        self._codes = {}
+        self._dtype = None
+
+
+    def __len__(self):
+        return len(self.symbols)
+
+
+    @property
+    def dtype(self):
+        '''Retrieves the categorical data type with all symbols of the
+        domain as categories.
+
+        :returns: `pandas.CategoricalDtype`
+        '''
+        if self._dtype is None or len(self._dtype.categories) != len(self.symbols):
+            self._dtype = pandas.CategoricalDtype(pandas.Index(self.symbols, dtype = object))
+        return self._dtype
+
+
+    def encode(self, symbols):
+        '''Maps a vector of symbols to codes, new symbols are decoded and
+        added to the domain.
+
+        :Parameters:
+         - `symbols` (`numpy.ndarray` of `bytes`) - symbols to be encoded
+
+        :returns: `numpy.ndarray` of `int32` codes
+        '''
+        if len(symbols) == 0:
+            return numpy.zeros(0, dtype = numpy.int32)
+
+        if symbols.itemsize <= 8:
+            # symbols fitting into 8 bytes are hashed as integers
+            keys = numpy.zeros((len(symbols), 8), dtype = numpy.uint8)
+            keys[:, :symbols.itemsize] = symbols.view(numpy.uint8).reshape(len(symbols), symbols.itemsize)
+            inverse, uniques = pandas.factorize(keys.view(numpy.uint64).reshape(len(symbols)))
+            uniques = numpy.ascontiguousarray(uniques.view(numpy.uint8).reshape(len(uniques), 8)[:, :symbols.itemsize]).view(symbols.dtype).reshape(len(uniques))
+        else:
+            inverse, uniques = pandas.factorize(symbols)
+
+        codes = numpy.empty(len(uniques), dtype = numpy.int32)
+        for i, symbol in enumerate(uniques):
+            code = self._codes.get(symbol)
+            if code is None:
+                code = self._codes[symbol] = len(self.symbols)
+                self.symbols.append(symbol.decode(self._encoding))
+            codes[i] = code
+
+        return codes[inverse.reshape(-1)]
+
+
+    def categorical(self, symbols):
+        '''Converts a vector of symbols to `pandas.Categorical` with the domain
+        as categories.
+
+        :Parameters:
+         - `symbols` (`numpy.ndarray` of `bytes`) - symbols to be converted
+
+        :returns: `pandas.Categorical`
+        '''
+        codes = self.encode(symbols)
+        return pandas.Categorical.from_codes(codes, dtype = self.dtype)
+
+
+
 class PandasQReader(QReader):
 
     _reader_map = dict.copy(QReader._reader_map)
     parse = Mapper(_reader_map)
 
+
+    @property
+    def symbol_domain(self):
+        '''Retrieves the domain of symbols decoded with the
+        `categorical_symbols` option.
+
+        :returns: :class:`.SymbolDomain`
+        '''
+        if getattr(self, '_symbol_domain', None) is None:
+            self._symbol_domain = SymbolDomain()
+        return self._symbol_domain
+
+
+    def _native_types(self, reference = None):
+        # parsers fall back to QReader unless pandas conversion is enabled
+        return QReader._native_types(self, reference or (QReader if self._options.pandas else PandasQReader))
+
+
     @parse(QDICTIONARY)
     def _read_dictionary(self, qtype = QDICTIONARY):
         if self._options.pandas:
-            keys = self._read_object()
-            values = self._read_object()
+            keys, values = self._read_dictionary_items()
 
             if isinstance(keys, pandas.DataFrame):
                 if not isinstance(values, pandas.DataFrame):
@@ -58,8 +201,8 @@ class PandasQReader(QReader):
 
                 return table
             else:
-                keys = keys if not isinstance(keys, pandas.Series) else keys.values
-                values = values if not isinstance(values, pandas.Series) else values.values
+                keys = keys if not isinstance(keys, pandas.Series) else numpy.asarray(keys.values)
+                values = values if not isinstance(values, pandas.Series) else numpy.asarray(values.values)
                 return QDictionary(keys, values)
         else:
             return QReader._read_dictionary(self, qtype = qtype)
@@ -67,73 +210,139 @@ class PandasQReader(QReader):
 
     @parse(QTABLE)
     def _read_table(self, qtype = QTABLE):
-        if self._options.pandas:
+        if self._options.pandas and not self._options.lazy_tables:
             self._buffer.skip()  # ignore attributes
             self._buffer.skip()  # ignore dict type stamp
 
             columns = self._read_object()
-            self._buffer.skip() # ignore generic list type indicator
-            data = QReader._read_general_list(self, qtype)
+            columns, data = self._read_table_data(columns)
+
+            return self._assemble_table(columns, data)
+        else:
+            return QReader._read_table(self, qtype = qtype)
+
 
+    def _read_column(self):
+        if not self._options.pandas:
+            return QReader._read_column(self)
+
+        # vectors are read as raw numpy arrays and converted while the table
+        # is assembled
+        position = self._buffer._position
+        qtype = self._buffer.get_byte()
+        if qtype == QGENERAL_LIST:
+            strings = self._read_string_list()
+            if strings is not None:
+                return strings
+        elif qtype >= QBOOL_LIST and qtype <= QTIME_LIST and qtype != QSTRING:
+            self._options.numpy_temporals = True
+            self._options.numpy_guids = False
+            return QReader._read_list(self, qtype = qtype)
+
+        self._buffer._position = position
+        return self._read_object()
+
+
+    def _read_string_list(self):
+        '''Reads a list of strings as an array of `str`. Char atoms are
+        accepted as well, blank ones are replaced with ``numpy.nan``.
+
+        :returns: `numpy.ndarray` of objects or ``None`` if the list contains
+                  other items, the buffer position is left unchanged in such
+                  case
+        '''
+        buffer = self._buffer
+        start = buffer._position
+        buffer.skip()  # ignore attributes
+        length = buffer.get_int()
+        if length == 0:
+            buffer._position = start
+            return None
+
+        header = struct.Struct(buffer.endianness + _STRING_HEADER.format)
+        data, position, size = buffer._data, buffer._position, buffer._size
+        strings = numpy.empty(length, dtype = numpy.object_)
+        for i in range(length):
+            if position + 2 > size:
+                raise QReaderException('Attempt to read data out of buffer bounds')
+
+            qtype = data[position]
+            if qtype == QSTRING:
+                if position + header.size > size:
+                    raise QReaderException('Attempt to read data out of buffer bounds')
+                count = header.unpack_from(data, position)[2]
+                position += header.size
+                if position + count > size:
+                    raise QReaderException('Attempt to read data out of buffer bounds')
+                strings[i] = str(data[position : position + count], 'utf-8')
+                position += count
+            elif qtype == QCHAR & 0xff:
+                char = chr(data[position + 1])
+                strings[i] = numpy.nan if char == ' ' else char
+                position += 2
+            else:
+                buffer._position = start
+                return None
+
+        buffer._position = position
+        return strings
+
+
+    def _assemble_table(self, columns, data):
+        if self._options.pandas:
             odict = OrderedDict()
             meta = MetaData(qtype = QTABLE)
-            for i in range(len(columns)):
-                column_name = columns[i] if isinstance(columns[i], str) else columns[i].decode("utf-8")
-                if isinstance(data[i], str):
-                    if len(data[i]) == 1:
-                        # Single character - treat as QCHAR, don't convert to list
-                        meta[column_name] = QCHAR
-                        odict[column_name] = pandas.Series([data[i]], dtype = str)
-                    else:
-                        # convert character list (represented as string) to numpy representation
-                        meta[column_name] = QSTRING
-                        char_list = [Char(c) for c in data[i]]
-                        odict[column_name] = pandas.Series(char_list).replace(' ', numpy.nan)
-                elif isinstance(data[i], bytes):
-                    # convert character list (represented as string) to numpy representation
+            for column_name, column in zip(columns, data):
+                column_name = column_name if isinstance(column_name, str) else column_name.decode('utf-8')
+                if isinstance(column, str):
+                    # character list (represented as string), a single
+                    # character is treated as QCHAR
+                    meta[column_name] = QCHAR if len(column) == 1 else QSTRING
+                    odict[column_name] = _char_array(column, mask_blanks = len(column) != 1)
+                elif isinstance(column, bytes):
                     meta[column_name] = QSTRING
-                    odict[column_name] = pandas.Series(list(data[i].decode()), dtype = str).replace(' ', numpy.nan)
-                elif hasattr(data[i], 'meta') and data[i].meta.qtype == QSYMBOL_LIST:
-                    # Handle symbol lists - decode bytes to plain strings
-                    meta[column_name] = QSYMBOL
-                    decoded_symbols = []
-                    for symbol in data[i]:
-                        if hasattr(symbol, 'decode'):
-                            decoded_symbols.append(symbol.decode('utf-8'))
-                        else:
-                            decoded_symbols.append(str(symbol))
-                    odict[column_name] = pandas.Series(decoded_symbols)
-                elif isinstance(data[i], (list, tuple)):
+                    odict[column_name] = _char_array(column.decode())
+                elif isinstance(column, (list, tuple)) or not hasattr(column, 'meta'):
+                    # lists of strings are read as arrays of objects
                     meta[column_name] = QGENERAL_LIST
-                    tarray = numpy.ndarray(shape = len(data[i]), dtype = numpy.dtype('O'))
-                    for j in range(len(data[i])):
-                        tarray[j] = data[i][j]
-                    odict[column_name] = tarray
+                    odict[column_name] = column if isinstance(column, numpy.ndarray) else pandas.Series(column, dtype = numpy.object_)
+                elif isinstance(column, pandas.Series):
+                    meta[column_name] = QSYMBOL if column.meta.qtype == QSYMBOL_LIST else column.meta.qtype
+                    odict[column_name] = column
+                elif abs(column.meta.qtype) == QSYMBOL_LIST:
+                    meta[column_name] = QSYMBOL
+                    if self._options.categorical_symbols:
+                        odict[column_name] = self.symbol_domain.categorical(numpy.asarray(column))
+                    else:
+                        odict[column_name] = _decode_symbols(column)
                 else:
-                    meta[column_name] = data[i].meta.qtype
-                    odict[column_name] = data[i]
+                    meta[column_name] = abs(column.meta.qtype)
+                    odict[column_name] = _mask_nulls(column, column.meta.qtype)
 
             df = pandas.DataFrame(odict)
             df._metadata = ["meta"]
             df.meta = meta
             return df
         else:
-            return QReader._read_table(self, qtype = qtype)
+            return QReader._assemble_table(self, columns, data)
 
 
     def _read_list(self, qtype):
         if self._options.pandas:
             self._options.numpy_temporals = True
+            self._options.numpy_guids = False
+
+            if qtype == QSYMBOL_LIST and self._options.categorical_symbols:
+                attr = self._buffer.get_byte()
+                length = self._buffer.get_long() if attr & 0x80 != 0 else self._buffer.get_uint()
+                ps = pandas.Series(self.symbol_domain.categorical(self._buffer.get_symbol_array(length)))
+                ps.meta = MetaData(qtype = qtype)
+                return ps
 
         qlist = QReader._read_list(self, qtype = qtype)
 
         if self._options.pandas:
-            if -abs(qtype) not in [QBOOL, QMONTH, QDATE, QDATETIME, QMINUTE, QSECOND, QTIME, QTIMESTAMP, QTIMESPAN, QSYMBOL]:
-                null = QNULLMAP[-abs(qtype)][1]
-                ps = pandas.Series(data = qlist).replace(null, numpy.nan)
-            else:
-                ps = pandas.Series(data = qlist)
-
+            ps = pandas.Series(data = _mask_nulls(qlist, qtype))
             ps.meta = MetaData(qtype = qtype)
             return ps
         else:
@@ -164,6 +373,13 @@ class PandasQWriter(QWriter):
         if qtype is None and hasattr(data, 'meta'):
             qtype = -abs(data.meta.qtype)
 
+        if isinstance(data.dtype, pandas.CategoricalDtype) and qtype in (None, QSYMBOL):
+            # categories are encoded once, missing values are mapped to null symbol
+            categories = [category.encode(self._encoding) if isinstance(category, str) else category for category in data.cat.categories]
+            symbols = numpy.array(categories + [b''], dtype = numpy.bytes_)
+            self._write_list(symbols[data.cat.codes.values], qtype = QSYMBOL)
+            return
+
         if data.dtype == '|S1':
             qtype = QCHAR
 
@@ -14,9 +14,15 @@
 #  limitations under the License.
 #
 
+import sys
+import uuid
+
 import numpy
 cimport numpy
 
+from libc.stdint cimport int16_t, int32_t, int64_t, uint16_t, uint32_t, uint64_t
+from libc.string cimport memcpy, memchr
+
 DTYPE = numpy.int64
 ctypedef numpy.int64_t DTYPE_t
 ctypedef numpy.uint8_t DTYPE8_t
@@ -73,3 +79,408 @@ def uncompress(numpy.ndarray[DTYPE8_t] data, DTYPE_t uncompressed_size):
             i += i
 
     return uncompressed
+
+
+
+def compress(numpy.ndarray[DTYPE8_t] data, int compression_mode = 1):
+    cdef DTYPE_t c, d, e, s, t, p, q, r, s0, h, h0, f, i
+    cdef bint g
+
+    t = data.shape[0]
+    e = t // 2
+
+    cdef numpy.ndarray[DTYPE_t] ptrs = numpy.zeros(256, dtype = DTYPE)
+    cdef numpy.ndarray[DTYPE8_t] compressed = numpy.zeros(e, dtype = numpy.uint8)
+
+    compressed[0] = data[0]
+    compressed[1] = data[1]
+    compressed[2] = compression_mode
+
+    c, d, s = (12, 12, 8) if compression_mode == 1 else (16, 16, 8)
+    f, h, h0, s0, i = 0, 0, 0, 0, 0
+
+    while s < t:
+        if i == 0:
+            if d > e - 17:
+                return None
+            i = 1
+            compressed[c] = f
+            c = d
+            d += 1
+            f = 0
+
+        g = s > t - 3
+        if not g:
+            h = data[s] ^ data[s + 1]
+            p = ptrs[h]
+            g = p == 0 or data[s] != data[p]
+
+        if s0 > 0:
+            ptrs[h0] = s0
+            s0 = 0
+
+        if g:
+            h0 = h
+            s0 = s
+            compressed[d] = data[s]
+            d += 1
+            s += 1
+        else:
+            ptrs[h] = s
+            f |= i
+            p += 2
+            s += 2
+            r = s
+            q = min(s + 255, t)
+            while data[s] == data[p]:
+                s += 1
+                if s >= q:
+                    break
+                p += 1
+            compressed[d] = h
+            compressed[d + 1] = s - r
+            d += 2
+
+        i = (i << 1) & 0xff
+
+    compressed[c] = f
+    compressed[3] = d >> 32
+    compressed[4:8] = numpy.frombuffer(numpy.uint32(d & 0xffffffff).tobytes(), dtype = numpy.uint8)
+    if compression_mode == 1:
+        compressed[8:12] = numpy.frombuffer(numpy.int32(t).tobytes(), dtype = numpy.uint8)
+    else:
+        compressed[8:16] = numpy.frombuffer(numpy.int64(t).tobytes(), dtype = numpy.uint8)
+    return compressed[:d]
+
+
+
+# minimal length of a symbol list decoded by the QReader with vectorized operations
+cdef int SYMBOL_VECTORIZATION_THRESHOLD = 128
+
+cdef int QGENERAL_LIST = 0x00
+cdef int QGUID_LIST = 0x02
+cdef int QSTRING = 0x0a
+cdef int QSYMBOL_LIST = 0x0b
+cdef int QTIMESTAMP_LIST = 0x0c
+cdef int QTIME_LIST = 0x13
+cdef int QTABLE = 0x62
+cdef int QDICTIONARY = 0x63
+cdef int QERROR = -0x80
+cdef int QBOOL = -0x01
+cdef int QGUID = -0x02
+cdef int QBYTE = -0x04
+cdef int QSHORT = -0x05
+cdef int QINT = -0x06
+cdef int QLONG = -0x07
+cdef int QFLOAT = -0x08
+cdef int QDOUBLE = -0x09
+cdef int QCHAR = -0x0a
+cdef int QSYMBOL = -0x0b
+
+# qpython modules are imported on first use, fastutils is loaded while the
+# qpython package is being initialized
+cdef object MetaData, PY_TYPE, ATOM_SIZE, QException, Char, String
+cdef object QList, QTemporalList, QDictionary, QTable, QColumnarTable, QKeyedTable, array_from_raw_qtemporal
+cdef bint initialized = False
+
+
+cdef initialize():
+    global MetaData, PY_TYPE, ATOM_SIZE, QException, Char, String
+    global QList, QTemporalList, QDictionary, QTable, QColumnarTable, QKeyedTable, array_from_raw_qtemporal
+    global initialized
+
+    from qpython import MetaData
+    from qpython.qtype import PY_TYPE, ATOM_SIZE, QException, Char, String
+    from qpython.qcollection import QList, QTemporalList, QDictionary, QTable, QColumnarTable, QKeyedTable
+    from qpython.qtemporal import array_from_raw_qtemporal
+    initialized = True
+
+
+
+cdef class _Decoder:
+    '''Decodes q IPC data wrapped by the `QReader` buffer. Objects of types
+    not flagged as native are decoded by the `QReader`.'''
+
+    cdef object reader
+    cdef object buffer
+    cdef object view
+    cdef const unsigned char[::1] data
+    cdef const unsigned char* native
+    cdef bytes native_flags
+    cdef Py_ssize_t position
+    cdef Py_ssize_t size
+    cdef bint swap
+    cdef bint zero_copy
+
+
+    def __init__(self, reader, bytes native):
+        self.reader = reader
+        self.buffer = reader._buffer
+        self.view = memoryview(self.buffer._data)
+        self.data = self.view.cast('B')
+        self.native_flags = native
+        self.native = native
+        self.position = self.buffer._position
+        self.size = self.buffer._size
+        self.swap = self.buffer.endianness != ('<' if sys.byteorder == 'little' else '>')
+        self.zero_copy = reader._is_socket
+
+
+    cdef int check(self, Py_ssize_t offset) except -1:
+        if self.position + offset > self.size:
+            from qpython.qreader import QReaderException
+            raise QReaderException('Attempt to read data out of buffer bounds')
+        return 0
+
+
+    cdef inline signed char get_byte(self) except? -1:
+        self.check(1)
+        self.position += 1
+        return <signed char> self.data[self.position - 1]
+
+
+    cdef inline int32_t get_int(self) except? -1:
+        cdef uint32_t value
+        self.check(4)
+        memcpy(&value, &self.data[self.position], 4)
+        self.position += 4
+        if self.swap:
+            value = ((value & 0xff) << 24) | ((value & 0xff00) << 8) | ((value >> 8) & 0xff00) | (value >> 24)
+        return <int32_t> value
+
+
+    cdef inline int64_t get_long(self) except? -1:
+        cdef uint64_t value
+        cdef uint64_t swapped = 0
+        cdef int i
+        self.check(8)
+        memcpy(&value, &self.data[self.position], 8)
+        self.position += 8
+        if self.swap:
+            for i in range(8):
+                swapped = (swapped << 8) | ((value >> (8 * i)) & 0xff)
+            value = swapped
+        return <int64_t> value
+
+
+    cdef inline int16_t get_short(self) except? -1:
+        cdef uint16_t value
+        self.check(2)
+        memcpy(&value, &self.data[self.position], 2)
+        self.position += 2
+        if self.swap:
+            value = <uint16_t> ((value << 8) | (value >> 8))
+        return <int16_t> value
+
+
+    cdef inline double get_double(self) except? -1:
+        cdef int64_t value = self.get_long()
+        cdef double result
+        memcpy(&result, &value, 8)
+        return result
+
+
+    cdef inline float get_float(self) except? -1:
+        cdef int32_t value = self.get_int()
+        cdef float result
+        memcpy(&result, &value, 4)
+        return result
+
+
+    cdef Py_ssize_t find_null(self, Py_ssize_t start) except -2:
+        cdef const void* found
+        if start >= self.size:
+            return -1
+        found = memchr(&self.data[start], 0, self.size - start)
+        if found == NULL:
+            return -1
+        return <const unsigned char*> found - &self.data[0]
+
+
+    cdef bytes get_symbol(self):
+        cdef Py_ssize_t end = self.find_null(self.position)
+        cdef bytes symbol
+        if end < 0:
+            from qpython.qreader import QReaderException
+            raise QReaderException('Failed to read symbol from stream')
+        symbol = (<const char*> &self.data[0])[self.position : end]
+        self.position = end + 1
+        return symbol
+
+
+    cdef object delegate(self, signed char qtype):
+        self.buffer._position = self.position
+        result = self.reader._parse_object(qtype)
+        self.position = self.buffer._position
+        return result
+
+
+    cdef object read_object(self):
+        cdef signed char qtype = self.get_byte()
+
+        if not self.native[<unsigned char> qtype]:
+            return self.delegate(qtype)
+        elif qtype == QGENERAL_LIST:
+            return self.read_general_list()
+        elif qtype == QSTRING:
+            return self.read_string()
+        elif qtype > 0 and qtype <= QTIME_LIST:
+            return self.read_list(qtype)
+        elif qtype < 0 and qtype >= QSYMBOL:
+            return self.read_atom(qtype)
+        elif qtype == QDICTIONARY:
+            return self.read_dictionary()
+        elif qtype == QTABLE:
+            return self.read_table()
+        elif qtype == QERROR:
+            raise QException(self.get_symbol().decode('utf-8'))
+
+        return self.delegate(qtype)
+
+
+    cdef object read_atom(self, signed char qtype):
+        if qtype == QBOOL or qtype == QBYTE:
+            return PY_TYPE[qtype](self.get_byte())
+        elif qtype == QSHORT:
+            return PY_TYPE[qtype](self.get_short())
+        elif qtype == QINT:
+            return PY_TYPE[qtype](self.get_int())
+        elif qtype == QLONG:
+            return PY_TYPE[qtype](self.get_long())
+        elif qtype == QFLOAT:
+            return PY_TYPE[qtype](self.get_float())
+        elif qtype == QDOUBLE:
+            return PY_TYPE[qtype](self.get_double())
+        elif qtype == QCHAR:
+            return Char(chr(self.get_byte()).encode(self.reader._encoding))
+        elif qtype == QSYMBOL:
+            return self.get_symbol().decode('utf-8')
+        elif qtype == QGUID:
+            self.check(16)
+            self.position += 16
+            return uuid.UUID(bytes = bytes(self.data[self.position - 16 : self.position]))
+
+        return self.delegate(qtype)
+
+
+    cdef object read_string(self):
+        cdef int32_t length
+        self.get_byte()  # ignore attributes
+        length = self.get_int()
+        if length <= 0:
+            return String(b'')
+
+        self.check(length)
+        self.position += length
+        return String((<const char*> &self.data[0])[self.position - length : self.position])
+
+
+    cdef object read_list(self, signed char qtype):
+        cdef Py_ssize_t start = self.position
+        cdef signed char attr = self.get_byte()
+        cdef int64_t length = self.get_long() if attr & 0x80 != 0 else <uint32_t> self.get_int()
+        cdef int64_t size
+
+        if qtype == QSYMBOL_LIST:
+            if length >= SYMBOL_VECTORIZATION_THRESHOLD:
+                self.position = start
+                return self.delegate(qtype)
+            return self.make_list(self.read_symbols(length), qtype, False)
+        elif qtype == QGUID_LIST:
+            self.position = start
+            return self.delegate(qtype)
+
+        conversion = PY_TYPE.get(-qtype, None)
+        if conversion is None:
+            self.position = start
+            return self.delegate(qtype)
+
+        size = length * ATOM_SIZE[qtype]
+        self.check(size)
+        raw = self.view[self.position : self.position + size]
+        # vectors are views over the receive buffer only in the zero-copy mode
+        data = numpy.frombuffer(raw if self.zero_copy else raw.tobytes(), dtype = conversion)
+        self.position += size
+        if self.swap:
+            data = data.byteswap(data.flags.writeable)
+
+        if qtype >= QTIMESTAMP_LIST and qtype <= QTIME_LIST:
+            if self.reader._options.numpy_temporals:
+                return self.make_list(array_from_raw_qtemporal(data, qtype), qtype, False)
+            return self.make_list(data, qtype, True)
+
+        return self.make_list(data, qtype, False)
+
+
+    cdef object make_list(self, data, signed char qtype, bint raw_temporal):
+        # equivalent of qlist(data, qtype = qtype, adjust_dtype = False)
+        vector = data.view(QTemporalList if raw_temporal else QList)
+        vector.meta = MetaData(qtype = -qtype)
+        return vector
+
+
+    cdef object read_symbols(self, int64_t count):
+        cdef list symbols = []
+        cdef int64_t i
+        for i in range(count):
+            symbols.append(self.get_symbol())
+        return numpy.array(symbols, dtype = numpy.bytes_)
+
+
+    cdef list read_general_list(self):
+        cdef int32_t length, i
+        cdef list items
+        self.get_byte()  # ignore attributes
+        length = self.get_int()
+        items = []
+        for i in range(length):
+            items.append(self.read_object())
+        return items
+
+
+    cdef object read_dictionary(self):
+        keys = self.read_object()
+        values = self.read_object()
+
+        if isinstance(keys, (QTable, QColumnarTable)):
+            return QKeyedTable(keys, values)
+        else:
+            return QDictionary(keys, values)
+
+
+    cdef object read_table(self):
+        cdef int32_t count, i
+        cdef list data = []
+        self.get_byte()  # ignore attributes
+        self.get_byte()  # ignore dict type stamp
+
+        columns = self.read_object()
+        self.get_byte()  # ignore generic list type indicator
+        self.get_byte()  # ignore attributes
+        count = self.get_int()
+        for i in range(count):
+            data.append(self.read_object())
+
+        self.buffer._position = self.position
+        return self.reader._assemble_table(columns, data)
+
+
+
+def decode_object(reader, bytes native):
+    '''Decodes a single object from the buffer of the `reader`.
+
+    :Parameters:
+     - `reader` (`QReader`) - reader wrapping the data
+     - `native` (`bytes`) - flags of q types decoded by the compiled code,
+       indexed by the q type byte
+
+    :returns: decoded object
+    '''
+    if not initialized:
+        initialize()
+
+    cdef _Decoder decoder = _Decoder(reader, native)
+    try:
+        return decoder.read_object()
+    finally:
+        decoder.buffer._position = decoder.position
@@ -0,0 +1,365 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import asyncio
+import struct
+
+from collections import deque
+
+from qpython import MetaData, CONVERSION_OPTIONS
+from qpython.qconnection import MessageType, QConnectionException, QAuthenticationException, QTimeoutException, _describe, _unix_socket_addresses
+from qpython.qreader import QReader, QReaderException
+from qpython.qtype import QException
+from qpython.qwriter import QWriter, QWriterException
+
+
+
+class AsyncQConnection(object):
+    '''Connector class for interfacing with the q service from `asyncio`
+    applications.
+
+    Provides awaitable methods for synchronous and asynchronous interaction.
+    A single connection can be shared by any number of coroutines: q answers
+    synchronous requests in order, so concurrent :func:`.sendSync` calls are
+    written back-to-back and each caller is woken up with its own response.
+    Messages pushed by the q service (e.g. subscription updates) are retrieved
+    with :func:`.receive`. Synchronous requests sent by the q service are not
+    supported and are answered with a ``nyi`` error.
+
+    The :class:`.AsyncQConnection` class provides an asynchronous context
+    manager API::
+
+        async with qasyncconnection.AsyncQConnection(host = 'localhost', port = 5000) as q:
+            print(await q.sendSync('{til x}', 10))
+
+    :Parameters:
+     - `host` (`string`) - q service hostname, or ``unix://<path>`` to
+       connect via a Unix domain socket
+     - `port` (`integer`) - q service port
+     - `username` (`string` or `None`) - username for q authentication/authorization
+     - `password` (`string` or `None`) - password for q authentication/authorization
+     - `timeout` (`nonnegative float` or `None`) - timeout for establishing
+       the connection
+     - `encoding` (`string`) - string encoding for data deserialization
+     - `reader_class` (subclass of `QReader`) - data deserializer
+     - `writer_class` (subclass of `QWriter`) - data serializer
+     - `unix_socket` (`string`, `boolean` or `None`) - Unix domain socket to
+       connect to, see :class:`.QConnection`
+    :Options:
+     - see :class:`.QConnection`
+    '''
+
+    MAX_PROTOCOL_VERSION = 6
+
+    def __init__(self, host, port, username = None, password = None, timeout = None, encoding = 'latin-1', reader_class = None, writer_class = None, unix_socket = None, **options):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.unix_socket = unix_socket
+
+        self._stream_reader = None
+        self._stream_writer = None
+        self._protocol_version = None
+        self._read_task = None
+
+        self.timeout = timeout
+
+        self._encoding = encoding
+
+        self._options = MetaData(**CONVERSION_OPTIONS.union_dict(**options))
+
+        try:
+            from qpython._pandas import PandasQReader, PandasQWriter
+            self._reader_class = PandasQReader
+            self._writer_class = PandasQWriter
+        except ImportError:
+            self._reader_class = QReader
+            self._writer_class = QWriter
+
+        if self._options.arrow:
+            # arrow mode requires pyarrow, the reader is used only on request
+            from qpython._arrow import ArrowQReader
+            self._reader_class = ArrowQReader
+
+        if reader_class:
+            self._reader_class = reader_class
+
+        if writer_class:
+            self._writer_class = writer_class
+
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+
+    @property
+    def protocol_version(self):
+        '''Retrieves established version of the IPC protocol.
+
+        :returns: `integer` -- version of the IPC protocol
+        '''
+        return self._protocol_version
+
+
+    async def open(self):
+        '''Initialises connection to q service.
+
+        If the connection hasn't been initialised yet, invoking the
+        :func:`.open` opens a new stream and performs a handshake with a q
+        service.
+
+        :raises: :class:`.QConnectionException`, :class:`.QAuthenticationException`
+        '''
+        if not self._stream_writer:
+            if not self.host and not self.unix_socket:
+                raise QConnectionException('Host cannot be None')
+
+            await self._initialize()
+
+            self._writer = self._writer_class(None, protocol_version = self._protocol_version, encoding = self._encoding)
+            self._reader = self._reader_class(None, encoding = self._encoding)
+
+            self._pending = deque()
+            self._incoming = asyncio.Queue()
+            self._read_task = asyncio.ensure_future(self._read_loop())
+
+
+    async def _init_stream(self):
+        '''Opens the stream used for communicating with a q service.'''
+        addresses = _unix_socket_addresses(self.host, self.port, self.unix_socket)
+        if addresses is None:
+            self._stream_reader, self._stream_writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.timeout)
+            return
+
+        for address in addresses:
+            try:
+                self._stream_reader, self._stream_writer = await asyncio.wait_for(asyncio.open_unix_connection(address), self.timeout)
+                return
+            except OSError:
+                if address is addresses[-1]:
+                    raise
+
+
+    async def _close_stream(self):
+        if self._stream_writer:
+            self._stream_writer.close()
+            try:
+                await self._stream_writer.wait_closed()
+            except (AttributeError, OSError):
+                pass
+        self._stream_reader = None
+        self._stream_writer = None
+
+
+    async def _initialize(self):
+        '''Performs a IPC protocol handshake.'''
+        credentials = (self.username if self.username else '') + ':' + (self.password if self.password else '')
+        credentials = credentials.encode(self._encoding)
+
+        await self._init_stream()
+        self._stream_writer.write(credentials + bytes([self.MAX_PROTOCOL_VERSION, 0]))
+        response = await asyncio.wait_for(self._stream_reader.read(1), self.timeout)
+
+        if len(response) != 1:
+            await self._close_stream()
+            await self._init_stream()
+
+            self._stream_writer.write(credentials + b'\0')
+            response = await asyncio.wait_for(self._stream_reader.read(1), self.timeout)
+            if len(response) != 1:
+                await self._close_stream()
+                raise QAuthenticationException('Connection denied.')
+
+        self._protocol_version = min(struct.unpack('B', response)[0], self.MAX_PROTOCOL_VERSION)
+
+
+    async def close(self):
+        '''Closes connection with the q service.
+
+        Pending :func:`.sendSync` calls fail with :class:`.QConnectionException`.
+        '''
+        if self._read_task:
+            self._read_task.cancel()
+            try:
+                await self._read_task
+            except asyncio.CancelledError:
+                pass
+            self._read_task = None
+
+        if self._stream_writer:
+            await self._close_stream()
+            self._fail_pending(QConnectionException('Connection closed.'))
+
+
+    def is_connected(self):
+        '''Checks whether connection with a q service has been established.
+
+        :returns: `boolean` -- ``True`` if connection has been established,
+                  ``False`` otherwise
+        '''
+        return True if self._stream_writer else False
+
+
+    def __str__(self):
+        return _describe(self.host, self.port, self.username, self.unix_socket)
+
+
+    async def _read_message(self):
+        header = await self._stream_reader.readexactly(8)
+        size = self._reader.read_header(source = header).size
+        return header + await self._stream_reader.readexactly(size - 8)
+
+
+    async def _read_loop(self):
+        '''Reads messages from the stream and dispatches them either to the
+        awaiting :func:`.sendSync` callers or to the :func:`.receive` queue.
+        Synchronous requests are answered with an error.'''
+        try:
+            while True:
+                message = await self._read_message()
+
+                if message[1] == MessageType.RESPONSE:
+                    if not self._pending:
+                        raise QReaderException('Received response message without pending request')
+
+                    future = self._pending.popleft()
+                    # response for a cancelled request is discarded
+                    if not future.cancelled():
+                        future.set_result(message)
+                elif message[1] == MessageType.SYNC:
+                    # the q caller would block until it gets a response
+                    self._stream_writer.write(self._writer.write(QException('nyi'), MessageType.RESPONSE))
+                else:
+                    self._incoming.put_nowait(message)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            error = e if isinstance(e, (QConnectionException, QReaderException)) else QConnectionException('Connection lost: %s' % e)
+            self._fail_pending(error)
+            self._incoming.put_nowait(error)
+            self._stream_writer.close()
+            self._stream_reader = None
+            self._stream_writer = None
+
+
+    def _fail_pending(self, error):
+        while self._pending:
+            future = self._pending.popleft()
+            if not future.done():
+                future.set_exception(error)
+
+
+    def _write(self, msg_type, query, *parameters, **options):
+        if not self._stream_writer:
+            raise QConnectionException('Connection is not established.')
+
+        if parameters and len(parameters) > 8:
+            raise QWriterException('Too many parameters.')
+
+        if not parameters or len(parameters) == 0:
+            data = self._writer.write(query, msg_type, **self._options.union_dict(**options))
+        else:
+            data = self._writer.write([query] + list(parameters), msg_type, **self._options.union_dict(**options))
+
+        self._stream_writer.write(data)
+
+
+    async def query(self, msg_type, query, *parameters, **options):
+        '''Performs a query against a q service.
+
+        See :func:`.QConnection.query` for details.
+
+        :raises: :class:`.QConnectionException`, :class:`.QWriterException`
+        '''
+        self._write(msg_type, query, *parameters, **options)
+        await self._stream_writer.drain()
+
+
+    async def sendSync(self, query, *parameters, **options):
+        '''Performs a synchronous query against a q service and returns parsed
+        data.
+
+            >>> print(await q.sendSync('{y + til x}', 10, 1))
+            [ 1  2  3  4  5  6  7  8  9 10]
+
+        Cancelling the awaiting coroutine doesn't interrupt the q service; its
+        response is discarded when it arrives. The same applies to queries
+        exceeding the `timeout` option.
+
+        See :func:`.QConnection.sendSync` for the list of supported options.
+
+        :returns: query result parsed to Python data structures
+
+        :raises: :class:`.QConnectionException`, :class:`.QWriterException`,
+                 :class:`.QReaderException`, :class:`.QTimeoutException`
+        '''
+        timeout = options.pop('timeout', None)
+        future = asyncio.get_event_loop().create_future()
+        # the pending future and the message have to be queued atomically to
+        # keep requests and responses in order
+        self._write(MessageType.SYNC, query, *parameters, **options)
+        self._pending.append(future)
+
+        await self._stream_writer.drain()
+        if timeout is None:
+            message = await future
+        else:
+            try:
+                message = await asyncio.wait_for(future, timeout)
+            except asyncio.TimeoutError:
+                raise QTimeoutException('Message not received before the deadline')
+        return self._reader.read(source = message, **self._options.union_dict(**options)).data
+
+
+    async def sendAsync(self, query, *parameters, **options):
+        '''Performs an asynchronous query and returns **without** retrieving of
+        the response.
+
+        See :func:`.QConnection.sendAsync` for details.
+
+        :raises: :class:`.QConnectionException`, :class:`.QWriterException`
+        '''
+        await self.query(MessageType.ASYNC, query, *parameters, **options)
+
+
+    async def receive(self, data_only = True, **options):
+        '''Waits for and parses the next message pushed by the q service, e.g.
+        a subscription update.
+
+        See :func:`.QConnection.receive` for details.
+
+        :returns: depending on parameter flags: :class:`.QMessage` instance,
+                  parsed message, raw data
+        :raises: :class:`.QReaderException`, :class:`.QConnectionException`
+        '''
+        message = await self._incoming.get()
+        if isinstance(message, Exception):
+            # keep signalling the failure to other receivers
+            self._incoming.put_nowait(message)
+            raise message
+
+        result = self._reader.read(source = message, **self._options.union_dict(**options))
+        return result.data if data_only else result
+
+
+    async def __call__(self, *parameters, **options):
+        return await self.sendSync(parameters[0], *parameters[1:], **options)
@@ -16,7 +16,7 @@
 
 from qpython.qtype import *  # @UnusedWildImport
 from qpython import MetaData
-from qpython.qtemporal import qtemporal, QTemporal, from_raw_qtemporal, to_raw_qtemporal
+from qpython.qtemporal import qtemporal, QTemporal, from_raw_qtemporal, to_raw_qtemporal, array_to_raw_qtemporal
 
 
 class QList(numpy.ndarray):
@@ -76,6 +76,66 @@ class QTemporalList(QList):
         return numpy.array2string(self, separator=', ', formatter={"int": QTemporal.__str__})
 
 
+class QGuidList(QList):
+    '''An array object represents a q vector of guids.
+
+    Guids are stored as raw 16 bytes values (``V16`` dtype), so the vector is
+    serialized and deserialized with a single buffer operation. Elements are
+    converted to `uuid.UUID` instances on access.
+    '''
+
+    def __getitem__(self, idx):
+        item = numpy.ndarray.__getitem__(self, idx)
+        return uuid.UUID(bytes = item.tobytes()) if isinstance(item, numpy.void) else item
+
+    def __setitem__(self, idx, value):
+        numpy.ndarray.__setitem__(self, idx, to_raw_guid(value))
+
+    def raw(self, idx):
+        '''Gets the raw 16 bytes representation of the guid at the specified
+        index.
+
+        :Parameters:
+         - `idx` (`integer`) - array index of the guid to be retrieved
+
+        :returns: raw representation of the guid
+        '''
+        return numpy.ndarray.__getitem__(self, idx)
+
+    def uuids(self):
+        '''Converts the vector to a `numpy` array of `uuid.UUID` instances.
+
+        :returns: `numpy.ndarray` of `uuid.UUID`
+        '''
+        raw = self.tobytes()
+        array = numpy.empty(len(self), dtype = numpy.object_)
+        for i in range(len(self)):
+            array[i] = uuid.UUID(bytes = raw[i * 16 : i * 16 + 16])
+        return array
+
+    def __repr__(self):
+        return 'QGuidList({})'.format(numpy.array2string(self, separator=', ', formatter={'void': str}))
+
+    def __str__(self):
+        return numpy.array2string(self, separator=', ', formatter={'void': str})
+
+
+def to_raw_guid(value):
+    '''Converts `uuid.UUID` or a sequence of `uuid.UUID` instances to the raw
+    guid representation (``V16`` dtype).
+
+    :Parameters:
+     - `value` (`uuid.UUID` or sequence of `uuid.UUID`) - guids to be converted
+
+    :returns: `numpy.void` or `numpy.ndarray` - raw representation of guids
+    '''
+    if isinstance(value, uuid.UUID):
+        return numpy.void(value.bytes)
+    if isinstance(value, numpy.ndarray) and value.dtype == GUID_RAW_TYPE:
+        return value
+    return numpy.frombuffer(b''.join(guid.bytes for guid in value), dtype = GUID_RAW_TYPE)
+
+
 def get_list_qtype(array):
     '''Finds out a corresponding qtype for a specified `QList`/`numpy.ndarray` 
     instance.
@@ -102,6 +162,9 @@ def get_list_qtype(array):
     if qtype is None and array.dtype.type in (numpy.datetime64, numpy.timedelta64):
         qtype = TEMPORAL_PY_TYPE.get(str(array.dtype), None)
 
+    if qtype is None and array.dtype == GUID_RAW_TYPE:
+        qtype = QGUID
+
     if qtype is None:
         # determinate type based on first element of the numpy array
         qtype = Q_TYPE.get(type(array[0]), QGENERAL_LIST)
@@ -115,7 +178,9 @@ def qlist(array, adjust_dtype = True, **meta):
     meta data.
 
     Returns a :class:`.QList` instance for non-datetime vectors. For datetime 
-    vectors :class:`.QTemporalList` is returned instead.
+    vectors :class:`.QTemporalList` is returned instead. Guid vectors backed
+    by raw 16 bytes values (``V16`` dtype) are returned as
+    :class:`.QGuidList`.
 
     If parameter `adjust_dtype` is `True` and q type retrieved via 
     :func:`.get_list_qtype` doesn't match one provided as a `qtype` parameter 
@@ -168,7 +233,8 @@ def qlist(array, adjust_dtype = True, **meta):
     :Kwargs:
      - `qtype` (`integer` or `None`) - qtype indicator
      
-    :returns: `QList` or `QTemporalList` - array representation of the list
+    :returns: `QList`, `QTemporalList` or `QGuidList` - array representation
+              of the list
     
     :raises: `ValueError` 
     '''
@@ -187,11 +253,12 @@ def qlist(array, adjust_dtype = True, **meta):
 
     qtype = None
     is_numpy_temporal = array.dtype.type in (numpy.datetime64, numpy.timedelta64)
+    is_raw_guid = array.dtype == GUID_RAW_TYPE
 
     if meta and 'qtype' in meta:
         qtype = -abs(meta['qtype'])
         dtype = PY_TYPE[qtype]
-        if adjust_dtype and dtype != array.dtype and not is_numpy_temporal:
+        if adjust_dtype and dtype != array.dtype and not is_numpy_temporal and not is_raw_guid:
             array = array.astype(dtype = dtype)
 
     qtype = get_list_qtype(array) if qtype is None else qtype
@@ -199,12 +266,39 @@ def qlist(array, adjust_dtype = True, **meta):
 
     is_raw_temporal = meta['qtype'] in [QMONTH, QDATE, QDATETIME, QMINUTE, QSECOND, QTIME, QTIMESTAMP, QTIMESPAN] \
                       and not is_numpy_temporal
-    vector = array.view(QList) if not is_raw_temporal else array.view(QTemporalList)
+    if is_raw_temporal:
+        vector = array.view(QTemporalList)
+    elif is_raw_guid and meta['qtype'] == QGUID:
+        vector = array.view(QGuidList)
+    else:
+        vector = array.view(QList)
     vector._meta_init(**meta)
     return vector
 
 
 
+# keys hashed consistently with their equality
+_INDEXED_KEY_KINDS = 'biufSU'
+_INDEXED_KEY_TYPES = (str, bytes, int, float, numpy.number, numpy.bool_, uuid.UUID)
+
+
+
+def _private_keys(keys):
+    '''Copies keys before they are indexed, so the index isn't invalidated by
+    modifying the caller's arrays in place. The copy is read-only.'''
+    if isinstance(keys, QColumnarTable):
+        keys = QColumnarTable(keys.columns, [column.copy() for column in keys._data], **keys.meta.as_dict())
+        arrays = keys._data
+    else:
+        keys = keys.copy()
+        arrays = [keys]
+
+    for array in arrays:
+        array.flags.writeable = False
+    return keys
+
+
+
 class QDictionary(object):
     '''Represents a q dictionary.
     
@@ -235,6 +329,21 @@ class QDictionary(object):
         self.keys = keys
         self.values = values
 
+    @property
+    def keys(self):
+        '''Dictionary keys. Vectors of keys are copied and indexed on the
+        first lookup, the dictionary keeps the read-only copy afterwards.
+        Replace the keys instead of modifying them in place. Lists of keys are
+        searched linearly.'''
+        return self._keys
+
+    @keys.setter
+    def keys(self, keys):
+        self._keys = keys
+        self._private = False
+        self._index = None
+        self._sorted = None
+
     def __str__(self, *args, **kwargs):
         return '%s!%s' % (self.keys, self.values)
 
@@ -253,7 +362,40 @@ class QDictionary(object):
     def __ne__(self, other):
         return not self.__eq__(other)
 
+    def _key_index(self):
+        '''Builds the hash index mapping keys to positions of their first
+        occurrence, ``False`` if keys can be modified in place (lists) or
+        cannot be hashed consistently with their equality (e.g. vectors or
+        temporals).'''
+        if self._index is None:
+            keys = self._keys
+            if isinstance(keys, numpy.ndarray) and keys.dtype.kind in _INDEXED_KEY_KINDS:
+                keys = self._own_keys().tolist()
+            elif isinstance(keys, list) or not all(isinstance(key, _INDEXED_KEY_TYPES) for key in keys):
+                self._index = False
+                return self._index
+
+            # later positions are overwritten by the first occurrence
+            self._index = dict(zip(keys[::-1], range(len(keys) - 1, -1, -1)))
+        return self._index
+
+    def _own_keys(self):
+        '''Replaces the keys with a private copy before they are indexed.'''
+        if not self._private:
+            self._keys = _private_keys(self._keys)
+            self._private = True
+        return self._keys
+
     def _find_key_(self, key):
+        index = self._key_index()
+        if index is not False:
+            try:
+                return index[key]
+            except KeyError:
+                raise KeyError('QDictionary doesn`t contain key: %s' % key)
+            except TypeError:
+                pass  # unhashable key
+
         idx = 0
         for k in self.keys:
             if key == k:
@@ -262,12 +404,44 @@ class QDictionary(object):
 
         raise KeyError('QDictionary doesn`t contain key: %s' % key)
 
+    def _find_keys(self, keys):
+        kind = self._keys.dtype.kind if isinstance(self._keys, numpy.ndarray) else None
+        query = None
+        if kind and kind in _INDEXED_KEY_KINDS:
+            try:
+                query = numpy.asarray(keys)
+            except ValueError:
+                pass
+
+        if query is None or query.ndim != 1 or not (query.dtype.kind == kind or query.dtype.kind in 'biuf' and kind in 'biuf'):
+            return numpy.array([self._find_key_(key) for key in keys], dtype = numpy.intp)
+
+        if self._sorted is None:
+            self._own_keys()
+            order = numpy.argsort(self._keys, kind = 'stable')
+            self._sorted = (numpy.asarray(self._keys)[order], order)
+        sorted_keys, order = self._sorted
+
+        positions = numpy.searchsorted(sorted_keys, query)
+        found = positions < len(sorted_keys)
+        found[found] = sorted_keys[positions[found]] == query[found]
+        if not found.all():
+            raise KeyError('QDictionary doesn`t contain key: %s' % query[~found][0])
+        return order[positions]
+
     def __getitem__(self, key):
         return self.values[self._find_key_(key)]
 
     def __setitem__(self, key, value):
         self.values[self._find_key_(key)] = value
 
+    def __contains__(self, key):
+        try:
+            self._find_key_(key)
+            return True
+        except KeyError:
+            return False
+
     def __len__(self):
         return len(self.keys)
 
@@ -291,6 +465,29 @@ class QDictionary(object):
         '''Return an iterator over the dictionary's values.'''
         return iter(self.values)
 
+    def get_many(self, keys):
+        '''Retrieves values of many keys at once.
+
+        Numeric and symbol keys are resolved with a single binary search over
+        the sorted dictionary keys, other keys are looked up one by one.
+
+            >>> d = QDictionary(qlist(numpy.array([3, 1, 2], dtype=numpy.int64), qtype=QLONG_LIST),
+            ...                 qlist(numpy.array(['c', 'a', 'b']), qtype = QSYMBOL_LIST))
+            >>> print(d.get_many([1, 2, 3, 1]))
+            [b'a' b'b' b'c' b'a']
+
+        :Parameters:
+         - `keys` (`list` or `numpy.ndarray`) - keys to be retrieved
+
+        :returns: values of the keys, vector if dictionary values are
+                  a vector, `list` otherwise
+        :raises: `KeyError`
+        '''
+        positions = self._find_keys(keys)
+        if isinstance(self.values, numpy.ndarray):
+            return self.values[positions]
+        return [self.values[position] for position in positions]
+
 
 
 class QTable(numpy.recarray):
@@ -364,6 +561,19 @@ def qtable(columns, data, **meta):
     
     :raises: `ValueError`
     '''
+    names, data, meta = _table_columns(columns, data, meta)
+
+    dtypes = [(names[i], data[i].dtype) for i in range(len(names))]
+    table = numpy.core.records.fromarrays(data, dtype = dtypes)
+    table = table.view(QTable)
+
+    table._meta_init(**meta)
+    return table
+
+
+
+def _table_columns(columns, data, meta):
+    '''Converts table columns to q vectors and fills in their q types.'''
     if len(columns) != len(data):
         raise ValueError('Number of columns doesn`t match the data layout. %s vs %s' % (len(columns), len(data)))
 
@@ -372,7 +582,7 @@ def qtable(columns, data, **meta):
     if not 'qtype' in meta:
         meta['qtype'] = QTABLE
 
-    dtypes = []
+    names = []
     for i in range(len(columns)):
         column_name = columns[i] if isinstance(columns[i], str) else columns[i].decode("utf-8")
         
@@ -392,13 +602,338 @@ def qtable(columns, data, **meta):
 
         
         meta[column_name] = data[i].meta.qtype
-        dtypes.append((column_name, data[i].dtype))
+        names.append(column_name)
+
+    return names, data, meta
+
+
+
+class QColumnarTable(object):
+    '''Represents a q table stored column by column.
+
+    Each column is kept as a separate contiguous :class:`.QList`, as q stores
+    tables. Columns read by :class:`.QReader` with the `columnar_tables`
+    option are views over the received message and are serialized without
+    being packed into a record array first.
+
+    :class:`.QColumnarTable` provides `dtype` and `meta` attributes matching
+    the ones of :class:`.QTable` and can be converted to :class:`.QTable` via
+    :func:`.to_table` (or any `numpy` function):
+
+        >>> t = QColumnarTable(['name', 'iq'],
+        ...                    [qlist(numpy.array(['Dent', 'Beeblebrox', 'Prefect']), qtype = QSYMBOL_LIST),
+        ...                     qlist(numpy.array([98, 42, 126]), qtype = QLONG_LIST)])
+        >>> print('%s dtype: %s meta: %s' % (type(t), t.dtype, t.meta))
+        <class 'qpython.qcollection.QColumnarTable'> dtype: [('name', '<U10'), ('iq', '<i8')] meta: metadata(qtype=98, name=-11, iq=-7)
+        >>> print(t['iq'])
+        [ 98  42 126]
+
+    :Parameters:
+     - `columns` (list of `strings`) - table column names
+     - `data` (list of lists) - list of columns containing table data
+
+    :Kwargs:
+     - `meta` (`integer`) - qtype for particular column
+
+    :raises: `ValueError`
+    '''
+    def __init__(self, columns, data, **meta):
+        self.columns, self._data, meta = _table_columns(columns, list(data), meta)
+        self.meta = MetaData(**meta)
+
+        if any(len(column) != len(self._data[0]) for column in self._data):
+            raise ValueError('Columns are expected to be of equal length')
+
+    @property
+    def dtype(self):
+        '''Retrieves the data type of table rows, as :class:`.QTable`.'''
+        return numpy.dtype([(self.columns[i], self._data[i].dtype) for i in range(len(self.columns))])
+
+    def __len__(self):
+        return len(self._data[0]) if self._data else 0
+
+    def __contains__(self, column):
+        return column in self.columns
+
+    def __iter__(self):
+        return iter(zip(*self._data))
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            try:
+                return self._data[self.columns.index(key)]
+            except ValueError:
+                raise KeyError(key)
+        elif isinstance(key, (int, numpy.integer)):
+            return tuple(column[key] for column in self._data)
+
+        # sliced directly, temporal vectors convert only single items
+        table = QColumnarTable(self.columns, [numpy.ndarray.__getitem__(column, key) for column in self._data])
+        table.meta = MetaData(**self.meta.as_dict())
+        return table
+
+    def __eq__(self, other):
+        return isinstance(other, (QTable, QColumnarTable)) and self.dtype.names == other.dtype.names and \
+               all(numpy.array_equal(self[column], other[column]) for column in self.columns)
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __array__(self, dtype = None, copy = None):
+        table = self.to_table()
+        return table if dtype is None else table.astype(dtype)
+
+    def __str__(self, *args, **kwargs):
+        return str(self.to_table())
+
+    def __repr__(self, *args, **kwargs):
+        return 'QColumnarTable(%s rows, columns: %s)' % (len(self), ', '.join(self.columns))
+
+    def to_table(self):
+        '''Copies the columns into a :class:`.QTable` (record array).
+
+        :returns: :class:`.QTable` - row-major representation of the table
+        '''
+        return qtable(self.columns, list(self._data), **self.meta.as_dict())
+
+
+
+class QLazyTable(object):
+    '''Represents a q table whose columns are decoded on first access.
+
+    :class:`.QLazyTable` is created by :class:`.QReader` when the 
+    `lazy_tables` option is set. The message is only scanned to locate the 
+    columns, the data stays in the retained message buffer until a column is
+    accessed:
+
+        >>> trades = q.sendSync('select from trade', lazy_tables = True)
+        >>> print(trades.columns)
+        ['date', 'time', 'sym', 'price', 'size', ...]
+        >>> print(trades['price'])
+        [ 98.5  98.6  98.5 ...]
+
+    :Parameters:
+     - `columns` (`list` of `string`) - table column names
+     - `meta` (`MetaData`) - qtype for particular columns
+     - `length` (`integer`) - number of rows
+     - `decode` (`callable`) - function decoding a column by its index
+     - `assemble` (`callable`) - function creating a table out of the decoded
+       columns
+    '''
+    def __init__(self, columns, meta, length, decode, assemble):
+        self.columns = columns
+        self.meta = meta
+        self._length = length
+        self._decode = decode
+        self._assemble = assemble
+        self._data = {}
+
+    def __len__(self):
+        return self._length
+
+    def __contains__(self, column):
+        return column in self.columns
+
+    def __iter__(self):
+        return iter(self.columns)
+
+    def __getitem__(self, column):
+        if column not in self._data:
+            try:
+                index = self.columns.index(column)
+            except ValueError:
+                raise KeyError(column)
+            self._data[column] = self._decode(index)
+        return self._data[column]
+
+    def __str__(self, *args, **kwargs):
+        return 'QLazyTable(%s rows, columns: %s)' % (self._length, ', '.join(self.columns))
+
+    def __repr__(self, *args, **kwargs):
+        return self.__str__()
+
+    def materialize(self):
+        '''Decodes all columns and creates a table.
+
+        :returns: :class:`.QTable` or `pandas.DataFrame` if table has been
+                  read in `pandas` mode
+        '''
+        return self._assemble([self[column] for column in self.columns])
 
-    table = numpy.core.records.fromarrays(data, dtype = dtypes)
-    table = table.view(QTable)
 
-    table._meta_init(**meta)
-    return table
+
+class _KeyIndex(object):
+    '''Index over key columns of a keyed table.
+
+    Keys are encoded as codes of unique (composite) keys, so batches of keys
+    are resolved with binary searches over sorted unique values of the key
+    columns. Single keys are resolved with a hash map built on first use.
+    '''
+    def __init__(self, keys):
+        self.names = list(keys.dtype.names)
+        self.qtypes = [keys.meta[name] for name in self.names]
+        self.dtypes, self.columns = [], []
+        for name in self.names:
+            column = numpy.asarray(keys[name])
+            self.dtypes.append(column.dtype)
+            # temporal keys are compared by their integer representation
+            self.columns.append(column.view(numpy.int64) if column.dtype.kind in 'Mm' else column)
+
+        self._uniques, self._combined = [], []
+        codes = None
+        for column in self.columns:
+            uniques, inverse = numpy.unique(column, return_inverse = True)
+            self._uniques.append(uniques)
+            if codes is None:
+                codes = inverse.ravel()
+            else:
+                combined, codes = numpy.unique(codes * len(uniques) + inverse.ravel(), return_inverse = True)
+                self._combined.append(combined)
+                codes = codes.ravel()
+
+        # first row of each unique key
+        self._first = numpy.unique(codes, return_index = True)[1] if codes is not None else numpy.zeros(0, dtype = numpy.intp)
+        self._rows = None
+        self._sorted = None
+
+    def _normalize(self, i, values):
+        '''Converts looked up values to the representation of the key column.'''
+        values = numpy.asarray(values)
+        if values.dtype.kind == 'O' and values.size and isinstance(values.flat[0], QTemporal):
+            values = numpy.array([value.raw for value in values.flat])
+
+        dtype, qtype = self.dtypes[i], self.qtypes[i]
+        if dtype.kind in 'Mm':
+            return values.astype(dtype).view(numpy.int64)
+        if values.dtype.kind in 'Mm' and qtype is not None and -abs(qtype) in TEMPORAL_Q_TYPE:
+            return array_to_raw_qtemporal(values, qtype).view(numpy.ndarray)
+        if dtype.kind == 'S' and values.dtype.kind == 'U':
+            return numpy.char.encode(values, 'utf-8')
+        return values
+
+    @staticmethod
+    def _search(uniques, values):
+        try:
+            positions = numpy.searchsorted(uniques, values)
+        except TypeError:
+            # values not comparable with the key column
+            return numpy.zeros(len(values), dtype = numpy.intp), numpy.zeros(len(values), dtype = bool)
+
+        found = positions < len(uniques)
+        found[found] = uniques[positions[found]] == values[found]
+        positions[~found] = 0
+        return positions, found
+
+    def columns_of(self, keys):
+        '''Splits a batch of keys into key columns.'''
+        if isinstance(keys, QColumnarTable) or isinstance(keys, numpy.ndarray) and keys.dtype.names:
+            return [keys[name] for name in self.names]
+        if len(self.names) == 1:
+            return [keys]
+
+        columns = list(zip(*keys)) if len(keys) else [[]] * len(self.names)
+        if len(columns) != len(self.names):
+            raise ValueError('Keys are expected to consist of %d columns: %s' % (len(self.names), ', '.join(self.names)))
+        return columns
+
+    def find(self, columns):
+        '''Resolves keys given as columns to positions of the first matching
+        rows, ``-1`` for missing keys.'''
+        found, codes = None, None
+        for i, values in enumerate(columns):
+            positions, matched = self._search(self._uniques[i], self._normalize(i, values).ravel())
+            if codes is None:
+                codes, found = positions, matched
+            else:
+                codes, combined = self._search(self._combined[i - 1], codes * len(self._uniques[i]) + positions)
+                found &= matched & combined
+
+        if not len(self._first):
+            return numpy.full(len(codes), -1, dtype = numpy.intp)
+        positions = self._first[codes]
+        positions[~found] = -1
+        return positions
+
+    def find_one(self, key):
+        '''Resolves a single key to the position of the first matching row.
+
+        :raises: `KeyError`
+        '''
+        if isinstance(key, numpy.void):
+            key = tuple(key)
+        key = key if isinstance(key, tuple) else (key, )
+        if len(key) != len(self.names):
+            raise KeyError('QKeyedTable doesn`t contain key: %s' % (key, ))
+
+        if self._rows is None:
+            rows = list(zip(*[column.tolist() for column in self.columns]))
+            try:
+                self._rows = dict(zip(rows[::-1], range(len(rows) - 1, -1, -1)))
+            except TypeError:
+                # unhashable keys are looked up via the columns index
+                self._rows = False
+
+        if self._rows is not False:
+            try:
+                position = self._rows.get(tuple(self._scalar(i, value) for i, value in enumerate(key)))
+            except TypeError:
+                position = None
+        else:
+            position = self.find([[value] for value in key])[0]
+
+        if position is None or position < 0:
+            raise KeyError('QKeyedTable doesn`t contain key: %s' % (key if len(key) > 1 else key[0], ))
+        return position
+
+    def _scalar(self, i, value):
+        if isinstance(value, (int, float, bytes, numpy.number)) and self.dtypes[i].kind not in 'Mm':
+            return value
+        return self._normalize(i, [value]).tolist()[0]
+
+    def between(self, lower, upper):
+        '''Locates rows with the first key column within the closed range.
+
+        :returns: `slice` if the key column is sorted, positions of the rows
+                  otherwise
+        '''
+        column = self.columns[0]
+        lower, upper = self._normalize(0, [lower]), self._normalize(0, [upper])
+        if self._sorted is None:
+            self._sorted = bool(numpy.all(column[:-1] <= column[1:]))
+
+        if self._sorted:
+            return slice(int(numpy.searchsorted(column, lower[0], 'left')), int(numpy.searchsorted(column, upper[0], 'right')))
+        return numpy.flatnonzero((column >= lower[0]) & (column <= upper[0]))
+
+
+
+class _KeyedTableLocator(object):
+    '''Implements lookups of :attr:`.QKeyedTable.loc`.'''
+    def __init__(self, table):
+        self._table = table
+
+    def __getitem__(self, key):
+        index = self._table._key_index()
+        if not isinstance(key, (list, numpy.ndarray, QColumnarTable)):
+            return self._table.values[index.find_one(key)]
+
+        positions = index.find(index.columns_of(key))
+        if (positions < 0).any():
+            raise KeyError('QKeyedTable doesn`t contain %d of %d keys' % ((positions < 0).sum(), len(positions)))
+        return self._table.values[positions]
+
+
+
+def _null_value(column, qtype):
+    '''Retrieves null value for the column of a table.'''
+    kind = column.dtype.kind
+    if kind in 'Mm':
+        return numpy.array('NaT', dtype = column.dtype)
+    if kind == 'f':
+        return numpy.nan
+    if kind != 'V' and qtype is not None and -abs(qtype) in QNULLMAP:
+        return qnull(-abs(qtype))
+    return None if kind == 'O' else numpy.zeros((), dtype = column.dtype)
 
 
 
@@ -430,17 +965,102 @@ class QKeyedTable(object):
     :raises: `ValueError`
     '''
     def __init__(self, keys, values):
-        if not isinstance(keys, QTable):
-            raise ValueError('Keys array is required to be of type: QTable')
+        if not isinstance(keys, (QTable, QColumnarTable)):
+            raise ValueError('Keys array is required to be of type: QTable or QColumnarTable')
 
-        if not isinstance(values, QTable):
-            raise ValueError('Values array is required to be of type: QTable')
+        if not isinstance(values, (QTable, QColumnarTable)):
+            raise ValueError('Values array is required to be of type: QTable or QColumnarTable')
 
         if len(keys) != len(values):
             raise ValueError('Keys and value arrays cannot have different length')
         self.keys = keys
         self.values = values
 
+    @property
+    def keys(self):
+        '''Table keys. Keys are copied and indexed on the first lookup, the
+        table keeps the read-only copy afterwards. Replace the keys instead of
+        modifying them in place.'''
+        return self._keys
+
+    @keys.setter
+    def keys(self, keys):
+        self._keys = keys
+        self._index = None
+
+    def _key_index(self):
+        if self._index is None:
+            self._keys = _private_keys(self._keys)
+            self._index = _KeyIndex(self._keys)
+        return self._index
+
+    @property
+    def loc(self):
+        '''Retrieves rows of values by keys.
+
+        Single keys are given as atoms or, for composite keys, as tuples and
+        return a single row. Batches of keys are given as lists, `numpy`
+        arrays or tables with the key columns and return a table of rows:
+
+            >>> t = QKeyedTable(qtable(['eid'], [qlist(numpy.array([1001, 1002, 1003]), qtype = QLONG_LIST)]),
+            ...                 qtable(['pos'], [qlist(numpy.array(['d1', 'd2', 'd3']), qtype = QSYMBOL_LIST)]))
+            >>> print(t.loc[1002])
+            (b'd2',)
+            >>> print(t.loc[numpy.array([1003, 1001])])
+            [(b'd3',) (b'd1',)]
+
+        The index over the key columns is built on the first lookup.
+
+        :raises: `KeyError`
+        '''
+        return _KeyedTableLocator(self)
+
+    def join(self, keys):
+        '''Retrieves rows of values for a batch of keys, as q ``lj``. Rows of
+        missing keys are filled with nulls.
+
+        :Parameters:
+         - `keys` (`list`, `numpy.ndarray` or table) - keys to be joined,
+           tables and `numpy` structured arrays are matched by key column
+           names
+
+        :returns: values table with a row for each of the `keys`
+        '''
+        index = self._key_index()
+        positions = index.find(index.columns_of(keys))
+        missing = positions < 0
+        if not missing.any():
+            return self.values[positions]
+
+        if len(self.values):
+            values = self.values[numpy.where(missing, 0, positions)]
+        else:
+            values = numpy.zeros(len(positions), dtype = self.values.dtype).view(QTable)
+            values._meta_init(**self.values.meta.as_dict())
+            if isinstance(self.values, QColumnarTable):
+                values = QColumnarTable(self.values.columns, [values[name] for name in self.values.columns], **self.values.meta.as_dict())
+
+        for name in values.dtype.names:
+            column = values[name]
+            numpy.ndarray.__setitem__(column, missing, _null_value(column, values.meta[name]))
+        return values
+
+    def between(self, lower, upper):
+        '''Retrieves rows with the first key column within the closed range
+        from `lower` to `upper`, as q ``within``.
+
+        Rows of a keyed table sorted by the key column are located with
+        a binary search and returned as views, other tables are scanned.
+
+        :Parameters:
+         - `lower` - lower bound of the key
+         - `upper` - upper bound of the key
+
+        :returns: :class:`.QKeyedTable` with the matching rows
+        '''
+        rows = self._key_index().between(lower, upper)
+        return QKeyedTable(self.keys[rows], self.values[rows])
+
     def __str__(self, *args, **kwargs):
         return '%s!%s' % (self.keys, self.values)
 
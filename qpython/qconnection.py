@@ -14,12 +14,19 @@
 #  limitations under the License.
 #
 
+import random
+import select
 import socket
 import struct
+import sys
+import time
+
+from collections import deque
+from concurrent.futures import Future
 
 from qpython import MetaData, CONVERSION_OPTIONS
 from qpython.qtype import QException
-from qpython.qreader import QReader, QReaderException
+from qpython.qreader import QReader, QReaderException, QStreamClosedException
 from qpython.qwriter import QWriter, QWriterException
 
 
@@ -36,6 +43,16 @@ class QAuthenticationException(QConnectionException):
 
 
 
+class QTimeoutException(Exception):
+    '''Raised when a response hasn't been received before the deadline.
+    
+    The connection remains usable, the late response is discarded once it
+    arrives.
+    '''
+    pass
+
+
+
 class MessageType(object):
     '''Enumeration defining IPC protocol message types.'''
     ASYNC = 0
@@ -44,6 +61,93 @@ class MessageType(object):
 
 
 
+UNIX_SOCKET_SCHEME = 'unix://'
+
+
+
+class ReconnectPolicy(object):
+    '''Defines how a :class:`.QConnection` is re-established after the
+    connection to the q service has been lost.
+
+    Consecutive connection attempts are delayed exponentially. With `jitter`
+    enabled, each delay is drawn uniformly from ``[0, delay]``, so clients 
+    disconnected at the same time (e.g. by a gateway restart) don't reconnect 
+    in lockstep.
+
+    :Parameters:
+     - `max_attempts` (`integer` or `None`) - maximum number of connection
+       attempts, ``None`` retries indefinitely
+     - `initial_delay` (`nonnegative float`) - delay (in seconds) before the 
+       first attempt
+     - `max_delay` (`nonnegative float`) - upper bound for the delay
+     - `multiplier` (`float`) - factor the delay grows by after each 
+       failed attempt
+     - `jitter` (`boolean`) - if ``True`` delays are randomized
+     - `replay` (`boolean`) - if ``True`` queries marked as `idempotent` are
+       resent once the connection has been re-established
+    '''
+
+    def __init__(self, max_attempts = 5, initial_delay = 0.1, max_delay = 30.0, multiplier = 2.0, jitter = True, replay = True):
+        self.max_attempts = max_attempts
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.replay = replay
+
+
+    def delays(self):
+        '''Generates delays preceding consecutive connection attempts.
+
+        :returns: generator of `float` -- delay in seconds
+        '''
+        attempt = 0
+        delay = min(self.initial_delay, self.max_delay)
+        while self.max_attempts is None or attempt < self.max_attempts:
+            yield random.uniform(0, delay) if self.jitter else delay
+            delay = min(delay * self.multiplier, self.max_delay)
+            attempt += 1
+
+
+
+def _unix_socket_addresses(host, port, unix_socket):
+    '''Resolves the Unix domain socket addresses to be tried for a q service
+    or returns ``None`` if the service should be reached via TCP.'''
+    if host and host.startswith(UNIX_SOCKET_SCHEME):
+        path = host[len(UNIX_SOCKET_SCHEME):]
+    elif unix_socket is True:
+        # kdb+ listens on /tmp/kx.<port>, on Linux in the abstract namespace
+        path = '/tmp/kx.%s' % port
+        return ['\0' + path, path] if sys.platform.startswith('linux') else [path]
+    elif unix_socket:
+        path = unix_socket
+    else:
+        return None
+
+    return ['\0' + path[1:]] if path.startswith('@') else [path]
+
+
+
+def _frame_size(frame):
+    '''Retrieves the size of a message from its header or ``None`` if the
+    header hasn't been received yet.'''
+    if len(frame) < 8:
+        return None
+    return struct.unpack('<I' if frame[0] == 1 else '>I', frame[4:8])[0] + (frame[3] << 32)
+
+
+
+def _describe(host, port, username = None, unix_socket = None):
+    '''Formats the address of a q service, e.g. ``user@:localhost:5000``.'''
+    addresses = _unix_socket_addresses(host, port, unix_socket)
+    if addresses is not None:
+        address = UNIX_SOCKET_SCHEME + addresses[-1].replace('\0', '@')
+    else:
+        address = ':%s:%s' % (host, port)
+    return '%s@%s' % (username, address) if username else address
+
+
+
 class QConnection(object):
     '''Connector class for interfacing with the q service.
     
@@ -57,7 +161,8 @@ class QConnection(object):
             print(q('{`int$ til x}', 10))
     
     :Parameters:
-     - `host` (`string`) - q service hostname
+     - `host` (`string`) - q service hostname, or ``unix://<path>`` to
+       connect via a Unix domain socket
      - `port` (`integer`) - q service port
      - `username` (`string` or `None`) - username for q authentication/authorization
      - `password` (`string` or `None`) - password for q authentication/authorization
@@ -65,6 +170,16 @@ class QConnection(object):
      - `encoding` (`string`) - string encoding for data deserialization
      - `reader_class` (subclass of `QReader`) - data deserializer
      - `writer_class` (subclass of `QWriter`) - data serializer
+     - `zero_copy` (`boolean`) - if ``True`` messages are received with
+       ``socket.recv_into`` directly into a reusable buffer and vectors are
+       exposed as views over the received bytes, without intermediate copies
+     - `unix_socket` (`string`, `boolean` or `None`) - path of the Unix
+       domain socket to connect to (``@`` prefix denotes the Linux abstract
+       namespace), ``True`` connects to the socket a co-located q service
+       listens on (``/tmp/kx.<port>``)
+     - `reconnect` (:class:`.ReconnectPolicy`, `boolean` or `None`) - policy
+       used to re-establish a lost connection, ``True`` uses the default 
+       :class:`.ReconnectPolicy`, ``None`` disables reconnecting
     :Options: 
      - `raw` (`boolean`) - if ``True`` returns raw data chunk instead of parsed 
        data, **Default**: ``False``
@@ -73,23 +188,61 @@ class QConnection(object):
        :class:`.QTemporal`) instances, otherwise are represented as 
        `numpy datetime64`/`timedelta64` arrays and atoms,
        **Default**: ``False``
+     - `numpy_guids` (`boolean`) - if ``True`` guid vectors are represented
+       as :class:`.QGuidList` instances backed by raw 16 bytes values and
+       converted to `uuid.UUID` on element access, otherwise as arrays of
+       `uuid.UUID`, ignored in pandas mode, **Default**: ``False``
+     - `arrow` (`boolean`) - if ``True`` vectors and tables are represented
+       as `pyarrow` arrays and tables, requires `pyarrow`. When set for the
+       connection, :class:`._arrow.ArrowQReader` is used as the default
+       reader, **Default**: ``False``
      - `single_char_strings` (`boolean`) - if ``True`` single char Python 
        strings are encoded as q strings instead of chars, **Default**: ``False``
+     - `categorical_symbols` (`boolean`) - if ``True`` and `pandas` is 
+       enabled, symbol vectors are represented as `pandas.Categorical` backed 
+       by a symbol domain of the connection, each distinct symbol is decoded 
+       only once, **Default**: ``False``
+     - `lazy_tables` (`boolean`) - if ``True`` tables are represented as
+       :class:`.QLazyTable` instances decoding columns on first access,
+       **Default**: ``False``
+     - `columnar_tables` (`boolean`) - if ``True`` tables are represented as
+       :class:`.QColumnarTable` instances keeping a separate vector for each
+       column instead of a record array, **Default**: ``False``
+     - `columns` (`list` of `string` or `None`) - if set, only the listed
+       columns of received tables are decoded, remaining columns are skipped
+       without being allocated, **Default**: ``None``
+     - `compress` (`boolean`) - if ``True`` outgoing messages larger than
+       `compress_threshold` bytes are compressed, **Default**: ``False``
+     - `compress_threshold` (`integer`) - minimal size of an outgoing message
+       to be compressed, **Default**: ``2000``
+     - `compress_adaptive` (`boolean`) - if ``True`` compression is skipped
+       for large messages whose prefix doesn't compress well, 
+       **Default**: ``False``
     '''
 
     MAX_PROTOCOL_VERSION = 6
 
-    def __init__(self, host, port, username = None, password = None, timeout = None, encoding = 'latin-1', reader_class = None, writer_class = None, **options):
+    def __init__(self, host, port, username = None, password = None, timeout = None, encoding = 'latin-1', reader_class = None, writer_class = None, zero_copy = False, unix_socket = None, reconnect = None, **options):
         self.host = host
         self.port = port
         self.username = username
         self.password = password
+        self.unix_socket = unix_socket
+        self.reconnect_policy = ReconnectPolicy() if reconnect is True else reconnect or None
 
         self._connection = None
         self._connection_file = None
         self._protocol_version = None
+        self._connection_lost = False
+        self._reconnect_hooks = []
+        # partially received message, messages received while writing and
+        # number of responses to be discarded
+        self._frame = bytearray()
+        self._backlog = deque()
+        self._discard = 0
 
         self.timeout = timeout
+        self.zero_copy = zero_copy
 
         self._encoding = encoding
 
@@ -103,6 +256,11 @@ class QConnection(object):
             self._reader_class = QReader
             self._writer_class = QWriter
 
+        if self._options.arrow:
+            # arrow mode requires pyarrow, the reader is used only on request
+            from qpython._arrow import ArrowQReader
+            self._reader_class = ArrowQReader
+
         if reader_class:
             self._reader_class = reader_class
 
@@ -138,21 +296,26 @@ class QConnection(object):
         :raises: :class:`.QConnectionException`, :class:`.QAuthenticationException` 
         '''
         if not self._connection:
-            if not self.host:
+            if not self.host and not self.unix_socket:
                 raise QConnectionException('Host cannot be None')
 
             self._init_socket()
             self._initialize()
 
             self._writer = self._writer_class(self._connection, protocol_version = self._protocol_version, encoding = self._encoding)
-            self._reader = self._reader_class(self._connection_file, encoding = self._encoding)
+            self._reader = self._reader_class(self._connection if self.zero_copy else self._connection_file, encoding = self._encoding)
+            self._frame_reader = self._reader_class(None, encoding = self._encoding)
 
 
     def _init_socket(self):
         '''Initialises the socket used for communicating with a q service,'''
         try:
-            self._connection = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self._connection.connect((self.host, self.port))
+            addresses = _unix_socket_addresses(self.host, self.port, self.unix_socket)
+            if addresses is None:
+                self._connection = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                self._connection.connect((self.host, self.port))
+            else:
+                self._connection = self._connect_unix_socket(addresses)
             self._connection.settimeout(self.timeout)
             self._connection_file = self._connection.makefile('b')
         except:
@@ -161,8 +324,24 @@ class QConnection(object):
             raise
 
 
+    def _connect_unix_socket(self, addresses):
+        for address in addresses:
+            connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                connection.connect(address)
+                return connection
+            except OSError:
+                connection.close()
+                if address is addresses[-1]:
+                    raise
+
+
     def close(self):
         '''Closes connection with the q service.'''
+        self._connection_lost = False
+        self._frame = bytearray()
+        self._backlog.clear()
+        self._discard = 0
         if self._connection:
             self._connection_file.close()
             self._connection_file = None
@@ -183,6 +362,71 @@ class QConnection(object):
         return True if self._connection else False
 
 
+    def add_reconnect_hook(self, hook):
+        '''Registers a callable invoked with the connection instance each time
+        the connection has been re-established, e.g. to restore subscriptions:
+
+            >>> q.add_reconnect_hook(lambda q: q.sendAsync('.u.sub', numpy.string_('trade'), numpy.string_('')))
+
+        :Parameters:
+         - `hook` (`callable`) - function accepting the :class:`.QConnection`
+        '''
+        self._reconnect_hooks.append(hook)
+
+
+    def remove_reconnect_hook(self, hook):
+        '''Unregisters a callable added via :func:`.add_reconnect_hook`.
+
+        :Parameters:
+         - `hook` (`callable`) - previously registered function
+        '''
+        self._reconnect_hooks.remove(hook)
+
+
+    def reconnect(self):
+        '''Closes and re-establishes the connection with the q service 
+        following the reconnect policy, then invokes the reconnect hooks.
+
+        If no :class:`.ReconnectPolicy` has been set, a single attempt is made.
+
+        :raises: :class:`.QConnectionException`, :class:`.QAuthenticationException`
+        '''
+        policy = self.reconnect_policy or ReconnectPolicy(max_attempts = 1, initial_delay = 0)
+        self.close()
+
+        error = None
+        for delay in policy.delays():
+            time.sleep(delay)
+            try:
+                self.open()
+                break
+            except QAuthenticationException:
+                raise
+            except (OSError, QConnectionException) as e:
+                # drop a partially initialised connection
+                self.close()
+                error = e
+        else:
+            self._connection_lost = True
+            raise QConnectionException('Unable to reconnect to %s: %s' % (self, error))
+
+        for hook in self._reconnect_hooks:
+            hook(self)
+
+
+    def _is_connection_lost(self, error):
+        '''Checks whether the error indicates broken connection which should 
+        be re-established.'''
+        if not self.reconnect_policy or isinstance(error, socket.timeout):
+            return False
+        return isinstance(error, (OSError, QStreamClosedException))
+
+
+    def _ensure_connection(self):
+        if self._connection_lost:
+            self.reconnect()
+
+
     def _initialize(self):
         '''Performs a IPC protocol handshake.'''
         credentials = (self.username if self.username else '') + ':' + (self.password if self.password else '')
@@ -204,7 +448,7 @@ class QConnection(object):
 
 
     def __str__(self):
-        return '%s@:%s:%s' % (self.username, self.host, self.port) if self.username else ':%s:%s' % (self.host, self.port)
+        return _describe(self.host, self.port, self.username, self.unix_socket)
 
 
     def query(self, msg_type, query, *parameters, **options):
@@ -294,20 +538,34 @@ class QConnection(object):
          - `single_char_strings` (`boolean`) - if ``True`` single char Python 
            strings are encoded as q strings instead of chars, 
            **Default**: ``False``
+         - `idempotent` (`boolean`) - if ``True`` the query is resent when the
+           connection has been lost and re-established while waiting for the
+           response, **Default**: ``False``
+         - `timeout` (`nonnegative float` or `None`) - time limit (in seconds)
+           for the response, when exceeded :class:`.QTimeoutException` is 
+           raised and the late response is discarded once it arrives,
+           **Default**: ``None``
 
         :returns: query result parsed to Python data structures
         
         :raises: :class:`.QConnectionException`, :class:`.QWriterException`, 
-                 :class:`.QReaderException`
+                 :class:`.QReaderException`, :class:`.QTimeoutException`
         '''
-        self.query(MessageType.SYNC, query, *parameters, **options)
-        response = self.receive(data_only = False, **options)
+        idempotent = options.pop('idempotent', False)
+        timeout = options.pop('timeout', None)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        self._ensure_connection()
 
-        if response.type == MessageType.RESPONSE:
-            return response.data
-        else:
-            self._writer.write(QException('nyi: qPython expected response message'), MessageType.ASYNC if response.type == MessageType.ASYNC else MessageType.RESPONSE)
-            raise QReaderException('Received message of type: %s where response was expected')
+        try:
+            return self._query_sync(deadline, query, *parameters, **options)
+        except QTimeoutException:
+            raise
+        except Exception as e:
+            if not self._is_connection_lost(e):
+                raise
+            self._recover(e, idempotent)
+            # replay the query over the new connection once
+            return self._query_sync(deadline, query, *parameters, **options)
 
 
     def sendAsync(self, query, *parameters, **options):
@@ -333,10 +591,169 @@ class QConnection(object):
          - `single_char_strings` (`boolean`) - if ``True`` single char Python 
            strings are encoded as q strings instead of chars, 
            **Default**: ``False``
+         - `idempotent` (`boolean`) - if ``True`` the query is resent when the
+           connection has been lost and re-established while sending it,
+           **Default**: ``False``
         
         :raises: :class:`.QConnectionException`, :class:`.QWriterException`
         '''
-        self.query(MessageType.ASYNC, query, *parameters, **options)
+        idempotent = options.pop('idempotent', False)
+        self._ensure_connection()
+
+        try:
+            self.query(MessageType.ASYNC, query, *parameters, **options)
+        except Exception as e:
+            if not self._is_connection_lost(e):
+                raise
+            self._recover(e, idempotent)
+            self.query(MessageType.ASYNC, query, *parameters, **options)
+
+
+    def _query_sync(self, deadline, query, *parameters, **options):
+        self.query(MessageType.SYNC, query, *parameters, **options)
+        return self._read_response(deadline, **options)
+
+
+    def _read_response(self, deadline = None, **options):
+        '''Reads the response to a synchronous query which has been written.'''
+        try:
+            response = self._read(deadline, **options)
+        except QTimeoutException:
+            # the response is still on its way
+            self._skip_responses(1)
+            raise
+
+        if response.type == MessageType.RESPONSE:
+            return response.data
+        else:
+            self._reject(response)
+            raise QReaderException('Received message of type: %s where response was expected')
+
+
+    def _skip_responses(self, count):
+        '''Discards the next `count` responses once they arrive, e.g. the ones
+        of timed out or cancelled queries.'''
+        self._discard += count
+
+
+    def _reject(self, message):
+        '''Answers a message received where a response was expected.'''
+        self._writer.write(QException('nyi: qPython expected response message'), MessageType.ASYNC if message.type == MessageType.ASYNC else MessageType.RESPONSE)
+
+
+    def _send_pipelined(self, data):
+        '''Writes a batch of messages.
+
+        Messages received while writing are buffered, so the write doesn't
+        stall when the q service is blocked sending responses to the already
+        written queries.
+        '''
+        data = memoryview(data)
+        while data:
+            readable, writable, _ = select.select([self._connection], [self._connection], [], self.timeout)
+            if not readable and not writable:
+                raise socket.timeout('timed out')
+
+            if readable:
+                self._receive_available()
+            if writable:
+                self._connection.settimeout(0)
+                try:
+                    data = data[self._connection.send(data):]
+                except BlockingIOError:
+                    pass
+                finally:
+                    self._connection.settimeout(self.timeout)
+
+
+    def _receive_available(self):
+        '''Reads the data available on the socket and queues the complete
+        messages.'''
+        chunk = self._read_available(1 << 16)
+        if chunk is None:
+            return
+        if not chunk:
+            raise QStreamClosedException('Error while reading data')
+
+        frame = self._frame
+        frame += chunk
+        size = _frame_size(frame)
+        while size is not None and len(frame) >= size:
+            self._backlog.append(frame[:size])
+            del frame[:size]
+            size = _frame_size(frame)
+
+
+    def _read(self, deadline = None, **options):
+        '''Reads the next message skipping responses of timed out or cancelled
+        queries.'''
+        options = self._options.union_dict(**options)
+        if deadline is None and not self._discard and not self._frame and not self._backlog:
+            return self._reader.read(**options)
+
+        while True:
+            frame = self._backlog.popleft() if self._backlog else self._read_frame(deadline)
+            if self._discard and frame[1] == MessageType.RESPONSE:
+                self._discard -= 1
+                continue
+            return self._frame_reader.read(source = frame, **options)
+
+
+    def _read_frame(self, deadline):
+        '''Reads a complete message into a buffer.
+        
+        Socket is read without blocking and bytes received before the deadline
+        expires are kept, so an interrupted message is resumed by the next 
+        read and the stream stays consistent.
+        '''
+        frame = self._frame
+        while True:
+            size = _frame_size(frame)
+            if size is None:
+                size = 8
+            elif len(frame) >= size:
+                break
+
+            chunk = self._read_available(size - len(frame))
+            if not chunk:
+                timeout = self.timeout if deadline is None else max(0., deadline - time.monotonic())
+                readable, _, _ = select.select([self._connection], [], [], timeout)
+                if not readable:
+                    if deadline is None:
+                        raise socket.timeout('timed out')
+                    raise QTimeoutException('Message not received before the deadline')
+
+                chunk = self._read_available(size - len(frame))
+                if not chunk:
+                    raise QStreamClosedException('Error while reading data')
+            frame += chunk
+
+        self._frame = bytearray()
+        return frame
+
+
+    def _read_available(self, size):
+        '''Reads up to `size` bytes which can be read without blocking.'''
+        self._connection.settimeout(0)
+        try:
+            if self.zero_copy:
+                return self._connection.recv(size)
+            # data buffered by the file object is returned first
+            return self._connection_file.read1(size)
+        except BlockingIOError:
+            return None
+        finally:
+            self._connection.settimeout(self.timeout)
+
+
+    def _recover(self, error, idempotent):
+        '''Re-establishes lost connection, raises if the interrupted query 
+        cannot be replayed.'''
+        self._connection_lost = True
+        self.reconnect()
+
+        if not (idempotent and self.reconnect_policy.replay):
+            raise QConnectionException('Connection to %s has been re-established, query has not been replayed: %s' % (self, error))
 
 
     def receive(self, data_only = True, **options):
@@ -373,14 +790,245 @@ class QConnection(object):
            :class:`.QTemporal`) instances, otherwise are represented as 
            `numpy datetime64`/`timedelta64` arrays and atoms,
            **Default**: ``False``
+         - `timeout` (`nonnegative float` or `None`) - time limit (in seconds)
+           for receiving the message, **Default**: ``None``
+        
+        If the connection has been lost and a reconnect policy is set, the 
+        connection is re-established (and the reconnect hooks are invoked) 
+        before the :class:`.QConnectionException` is raised, so the caller can 
+        continue receiving messages.
+        
+        With the `timeout` option set, :class:`.QTimeoutException` is raised if
+        no complete message has been received in time. A partially received
+        message is completed by the next call.
         
         :returns: depending on parameter flags: :class:`.QMessage` instance, 
                   parsed message, raw data 
-        :raises: :class:`.QReaderException`
+        :raises: :class:`.QReaderException`, :class:`.QConnectionException`,
+                 :class:`.QTimeoutException`
         '''
-        result = self._reader.read(**self._options.union_dict(**options))
+        timeout = options.pop('timeout', None)
+        self._ensure_connection()
+
+        try:
+            result = self._read(None if timeout is None else time.monotonic() + timeout, **options)
+        except QTimeoutException:
+            raise
+        except Exception as e:
+            if not self._is_connection_lost(e):
+                raise
+            self._recover(e, False)
+
         return result.data if data_only else result
 
 
+    def pipeline(self, window = None, timeout = None):
+        '''Creates a :class:`.QPipeline` bound to this connection.
+
+        Pipelined synchronous queries are written back-to-back and the
+        responses are collected afterwards, in order, so a batch of queries
+        costs a single network round trip:
+
+            >>> with q.pipeline() as p:
+            ...     f1 = p.sendSync('{til x}', 3)
+            ...     f2 = p.sendSync('{x+y}', 1, 2)
+            >>> print(f1.result(), f2.result())
+            [0 1 2] 3
+
+        :Parameters:
+         - `window` (`integer` or `None`) - maximum number of synchronous
+           queries written before their responses are collected, ``None``
+           writes all queries at once, responses arriving in the meantime are
+           buffered
+         - `timeout` (`nonnegative float` or `None`) - time limit (in seconds)
+           for collecting all responses, when exceeded pending futures fail 
+           with :class:`.QTimeoutException`
+
+        :returns: :class:`.QPipeline` -- pipeline for this connection
+        '''
+        return QPipeline(self, window = window, timeout = timeout)
+
+
     def __call__(self, *parameters, **options):
         return self.sendSync(parameters[0], *parameters[1:], **options)
+
+
+
+class QPipeline(object):
+    '''Batches queries sent over a single :class:`.QConnection`.
+
+    q processes synchronous messages received over one handle in order, hence
+    responses can be matched with the requests without waiting for each of
+    them separately. Queries are buffered until :func:`.execute` is called,
+    the :class:`.QPipeline` class provides a context manager API which
+    executes pending queries on exit::
+
+        with q.pipeline() as p:
+            futures = [p.sendSync('{x * x}', i) for i in range(100)]
+        print([f.result() for f in futures])
+
+    :Parameters:
+     - `connection` (:class:`.QConnection`) - opened connection
+     - `window` (`integer` or `None`) - maximum number of synchronous queries
+       written before their responses are collected, ``None`` writes all
+       queries at once, responses arriving in the meantime are buffered
+     - `timeout` (`nonnegative float` or `None`) - time limit (in seconds)
+       for collecting all responses
+    
+    Queries can be cancelled via `Future.cancel` of the futures returned by
+    :func:`.sendSync` until their responses are collected. Cancelled queries
+    are not sent, or their responses are discarded if they have already been 
+    sent.
+    '''
+
+    def __init__(self, connection, window = None, timeout = None):
+        self._connection = connection
+        self._window = window
+        self._timeout = timeout
+        self._requests = []
+        self._writer = None
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            # errors returned by q are available via futures
+            self._flush()
+        else:
+            self.discard()
+
+
+    def __len__(self):
+        return len(self._requests)
+
+
+    def _serialize(self, msg_type, query, *parameters, **options):
+        connection = self._connection
+        if not connection.is_connected():
+            raise QConnectionException('Connection is not established.')
+
+        if parameters and len(parameters) > 8:
+            raise QWriterException('Too many parameters.')
+
+        if not self._writer:
+            self._writer = connection._writer_class(None, protocol_version = connection.protocol_version, encoding = connection._encoding)
+
+        options = connection._options.union_dict(**options)
+        if not parameters or len(parameters) == 0:
+            return self._writer.write(query, msg_type, **options)
+        else:
+            return self._writer.write([query] + list(parameters), msg_type, **options)
+
+
+    def sendSync(self, query, *parameters, **options):
+        '''Queues a synchronous query.
+
+        See :func:`.QConnection.sendSync` for description of the parameters
+        and options.
+
+        :returns: `concurrent.futures.Future` -- future resolved with the query
+                  result when the pipeline is executed
+
+        :raises: :class:`.QConnectionException`, :class:`.QWriterException`
+        '''
+        future = Future()
+        self._requests.append((future, self._serialize(MessageType.SYNC, query, *parameters, **options), options))
+        return future
+
+
+    def sendAsync(self, query, *parameters, **options):
+        '''Queues an asynchronous query.
+
+        See :func:`.QConnection.sendAsync` for description of the parameters
+        and options.
+
+        :raises: :class:`.QConnectionException`, :class:`.QWriterException`
+        '''
+        self._requests.append((None, self._serialize(MessageType.ASYNC, query, *parameters, **options), options))
+
+
+    def discard(self):
+        '''Drops all queued queries without sending them.'''
+        for future, _, _ in self._requests:
+            if future:
+                future.cancel()
+        self._requests = []
+
+
+    def execute(self):
+        '''Writes all queued queries and collects responses of synchronous
+        ones.
+
+        Responses are assigned to the futures returned by :func:`.sendSync`,
+        errors returned by the q service are set as future exceptions.
+
+        :returns: `list` -- results of synchronous queries in the order of
+                  submission, ``None`` for cancelled queries
+
+        :raises: :class:`.QConnectionException`, :class:`.QReaderException`,
+                 :class:`.QTimeoutException`, 
+                 :class:`.QException` (the first error returned by q)
+        '''
+        return [None if future.cancelled() else future.result() for future in self._flush()]
+
+
+    def _flush(self):
+        requests, self._requests = self._requests, []
+        futures = [future for future, _, _ in requests if future]
+        connection = self._connection
+        deadline = None if self._timeout is None else time.monotonic() + self._timeout
+
+        start = 0
+        while start < len(requests):
+            end = start
+            sync_count = 0
+            while end < len(requests) and (self._window is None or sync_count < self._window):
+                if requests[end][0]:
+                    sync_count += 1
+                end += 1
+
+            # cancelled queries are not sent
+            batch = [request for request in requests[start:end] if not (request[0] and request[0].cancelled())]
+            collected = 0
+            try:
+                connection._send_pipelined(b''.join(message for _, message, _ in batch))
+                for future, _, options in batch:
+                    if future:
+                        self._collect(future, options, deadline)
+                    collected += 1
+            except Exception as e:
+                if isinstance(e, QTimeoutException):
+                    # responses of the queries already sent are discarded on arrival
+                    connection._skip_responses(sum(1 for future, _, _ in batch[collected:] if future))
+                for future, _, _ in requests[start:]:
+                    if future and not future.done():
+                        future.set_exception(e)
+                raise
+
+            start = end
+
+        return futures
+
+
+    def _collect(self, future, options, deadline):
+        connection = self._connection
+        if not future.set_running_or_notify_cancel():
+            # the query has been cancelled after being sent
+            connection._skip_responses(1)
+            return
+
+        while True:
+            try:
+                response = connection._read(deadline, **options)
+            except QException as e:
+                future.set_exception(e)
+                return
+
+            if response.type == MessageType.RESPONSE:
+                future.set_result(response.data)
+                return
+
+            connection._reject(response)
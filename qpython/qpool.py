@@ -0,0 +1,644 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import select
+import threading
+import time
+
+from collections import deque
+from contextlib import contextmanager
+
+from qpython import MetaData
+from qpython.qconnection import QConnection, QConnectionException, QTimeoutException, MessageType, _describe
+from qpython.qreader import QReaderException, QStreamClosedException
+from qpython.qtype import QException
+
+
+
+class QConnectionPoolException(QConnectionException):
+    '''Raised when a connection cannot be acquired from the pool.'''
+    pass
+
+
+
+class QConnectionPool(object):
+    '''Thread-safe pool of pre-authenticated connections to a single q service.
+
+    All connections are opened (socket created and IPC handshake performed)
+    when the pool is opened, so acquiring a connection doesn't add any connect
+    or handshake latency to the request path. Each call to :func:`.sendSync`
+    or :func:`.sendAsync` borrows one idle connection for the duration of the
+    call, therefore the pool can be shared freely between threads.
+
+    Connections idle for longer than `idle_check_interval` are checked before
+    being handed out. Broken connections (closed by the remote side or failed
+    with an IPC/socket error) are discarded and replaced with new ones.
+
+    The :class:`.QConnectionPool` class provides a context manager API::
+
+        with qpool.QConnectionPool(host = 'localhost', port = 5000, size = 8) as pool:
+            print(pool.sendSync('{til x}', 10))
+            print(pool.stats)
+
+    :Parameters:
+     - `host` (`string`) - q service hostname
+     - `port` (`integer`) - q service port
+     - `size` (`integer`) - number of connections kept in the pool
+     - `acquire_timeout` (`nonnegative float` or `None`) - maximum time to wait
+       for an idle connection, ``None`` waits indefinitely
+     - `idle_check_interval` (`nonnegative float` or `None`) - connections
+       idle for longer than this number of seconds are health-checked before
+       use, ``None`` disables the check
+     - `connection_class` (subclass of `QConnection`) - connection factory
+    :Kwargs:
+     - any other keyword argument (`username`, `password`, `timeout`,
+       `encoding`, conversion options, ...) is passed to the
+       :class:`.QConnection` constructor
+    '''
+
+    def __init__(self, host, port, size = 4, acquire_timeout = None, idle_check_interval = 5.0, connection_class = QConnection, **kwargs):
+        if size < 1:
+            raise ValueError('Pool size has to be positive, got: %s' % size)
+
+        self.host = host
+        self.port = port
+        self.size = size
+        self.acquire_timeout = acquire_timeout
+        self.idle_check_interval = idle_check_interval
+
+        self._connection_class = connection_class
+        self._kwargs = kwargs
+
+        self._lock = threading.Condition()
+        self._idle = deque()
+        self._in_use = 0
+        self._is_open = False
+
+        self._reset_stats()
+
+
+    def __enter__(self):
+        self.open()
+        return self
+
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+    def __str__(self):
+        return 'pool(%s)%s' % (self.size, _describe(self.host, self.port, self._kwargs.get('username'), self._kwargs.get('unix_socket')))
+
+
+    def _new_connection(self):
+        return self._connection_class(self.host, self.port, **self._kwargs)
+
+
+    def _reset_stats(self):
+        self._opened_at = time.monotonic()
+        self._acquisitions = 0
+        self._wait_time_total = 0.
+        self._wait_time_max = 0.
+        self._busy_time_total = 0.
+        self._replaced = 0
+
+
+    def open(self):
+        '''Opens all connections in the pool.
+
+        Every connection performs the handshake with the q service up front.
+
+        :raises: :class:`.QConnectionException`, :class:`.QAuthenticationException`
+        '''
+        with self._lock:
+            if self._is_open:
+                return
+
+            connections = []
+            try:
+                for _ in range(self.size):
+                    connection = self._new_connection()
+                    connection.open()
+                    connections.append(connection)
+            except:
+                for connection in connections:
+                    connection.close()
+                raise
+
+            now = time.monotonic()
+            self._idle.extend((connection, now) for connection in connections)
+            self._is_open = True
+            self._reset_stats()
+
+
+    def close(self):
+        '''Closes all idle connections and marks the pool as closed.
+
+        Connections currently in use are closed as soon as they are released.
+        '''
+        with self._lock:
+            self._is_open = False
+            while self._idle:
+                connection, _ = self._idle.popleft()
+                connection.close()
+            self._lock.notify_all()
+
+
+    def is_connected(self):
+        '''Checks whether the pool has been opened.
+
+        :returns: `boolean` -- ``True`` if pool is open, ``False`` otherwise
+        '''
+        return self._is_open
+
+
+    @property
+    def stats(self):
+        '''Retrieves pool usage statistics which can be used for sizing the
+        pool.
+
+        Following attributes are reported:
+         - `size` - configured number of connections
+         - `idle` - number of idle connections
+         - `in_use` - number of connections currently borrowed
+         - `acquisitions` - number of successful acquisitions
+         - `wait_time_total`, `wait_time_max`, `wait_time_mean` - time (in
+           seconds) callers spent waiting for an idle connection
+         - `utilization` - fraction of the available connection time spent
+           serving requests since the pool has been opened
+         - `replaced` - number of broken connections replaced
+
+        :returns: `MetaData` -- pool statistics
+        '''
+        with self._lock:
+            elapsed = time.monotonic() - self._opened_at
+            return MetaData(size = self.size,
+                            idle = len(self._idle),
+                            in_use = self._in_use,
+                            acquisitions = self._acquisitions,
+                            wait_time_total = self._wait_time_total,
+                            wait_time_max = self._wait_time_max,
+                            wait_time_mean = self._wait_time_total / self._acquisitions if self._acquisitions else 0.,
+                            utilization = self._busy_time_total / (elapsed * self.size) if elapsed > 0 else 0.,
+                            replaced = self._replaced)
+
+
+    def acquire(self, timeout = None):
+        '''Borrows an idle connection from the pool.
+
+        Connection has to be returned to the pool with :func:`.release`.
+
+        :Parameters:
+         - `timeout` (`nonnegative float` or `None`) - maximum time to wait
+           for an idle connection, if ``None`` the pool `acquire_timeout` is used
+
+        :returns: :class:`.QConnection` -- opened connection
+
+        :raises: :class:`.QConnectionPoolException`, :class:`.QConnectionException`
+        '''
+        timeout = self.acquire_timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = None if timeout is None else started + timeout
+
+        with self._lock:
+            while True:
+                if not self._is_open:
+                    raise QConnectionPoolException('Connection pool is not open.')
+                if self._idle:
+                    break
+
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise QConnectionPoolException('Timeout while waiting for an idle connection.')
+                self._lock.wait(remaining)
+
+            connection, idle_since = self._idle.pop()
+            self._in_use += 1
+
+            waited = time.monotonic() - started
+            self._acquisitions += 1
+            self._wait_time_total += waited
+            self._wait_time_max = max(self._wait_time_max, waited)
+
+        try:
+            if not self._is_healthy(connection, idle_since):
+                connection = self._replace(connection)
+        except:
+            # keep the (closed) connection in the pool, so it can be reopened
+            # on the next acquisition
+            with self._lock:
+                self._in_use -= 1
+                self._idle.appendleft((connection, idle_since))
+                self._lock.notify()
+            raise
+
+        connection._pool_acquired_at = time.monotonic()
+        return connection
+
+
+    def release(self, connection, broken = False):
+        '''Returns a connection to the pool.
+
+        :Parameters:
+         - `connection` (:class:`.QConnection`) - connection acquired via
+           :func:`.acquire`
+         - `broken` (`boolean`) - if ``True`` the connection is closed and
+           replaced with a new one on next acquisition
+        '''
+        now = time.monotonic()
+        if broken:
+            connection.close()
+
+        with self._lock:
+            self._in_use -= 1
+            self._busy_time_total += now - getattr(connection, '_pool_acquired_at', now)
+
+            if self._is_open:
+                self._idle.append((connection, now))
+                self._lock.notify()
+            else:
+                connection.close()
+
+
+    @contextmanager
+    def connection(self, timeout = None):
+        '''Borrows a connection for the duration of a ``with`` block.
+
+        Useful for interactions spanning multiple messages::
+
+            with pool.connection() as q:
+                q.sendAsync('{x}', 10)
+                print(q.receive())
+
+        :Parameters:
+         - `timeout` (`nonnegative float` or `None`) - maximum time to wait
+           for an idle connection
+        '''
+        connection = self.acquire(timeout)
+        broken = False
+        try:
+            yield connection
+        except (QConnectionException, QReaderException, OSError):
+            broken = True
+            raise
+        finally:
+            self.release(connection, broken = broken)
+
+
+    def _is_healthy(self, connection, idle_since):
+        if not connection.is_connected():
+            return False
+
+        if self.idle_check_interval is None or time.monotonic() - idle_since < self.idle_check_interval:
+            return True
+
+        # an idle connection shouldn't have any pending data, readable socket
+        # indicates either closed connection or an unexpected message
+        try:
+            readable, _, _ = select.select([connection._connection], [], [], 0)
+        except (OSError, ValueError):
+            return False
+
+        return not readable
+
+
+    def _replace(self, connection):
+        connection.close()
+        connection = self._new_connection()
+        connection.open()
+
+        with self._lock:
+            self._replaced += 1
+
+        return connection
+
+
+    def sendSync(self, query, *parameters, **options):
+        '''Performs a synchronous query on one of the pooled connections and
+        returns parsed data. See :func:`.QConnection.sendSync` for details.
+
+        :returns: query result parsed to Python data structures
+
+        :raises: :class:`.QConnectionPoolException`,
+                 :class:`.QConnectionException`, :class:`.QWriterException`,
+                 :class:`.QReaderException`
+        '''
+        with self.connection() as connection:
+            return connection.sendSync(query, *parameters, **options)
+
+
+    def sendAsync(self, query, *parameters, **options):
+        '''Performs an asynchronous query on one of the pooled connections.
+        See :func:`.QConnection.sendAsync` for details.
+
+        :raises: :class:`.QConnectionPoolException`,
+                 :class:`.QConnectionException`, :class:`.QWriterException`
+        '''
+        with self.connection() as connection:
+            connection.sendAsync(query, *parameters, **options)
+
+
+    def __call__(self, *parameters, **options):
+        return self.sendSync(parameters[0], *parameters[1:], **options)
+
+
+
+class RoutingPolicy(object):
+    '''Enumeration defining policies of routing queries across endpoints.'''
+    ROUND_ROBIN = 0
+    LEAST_OUTSTANDING = 1
+    LATENCY = 2
+
+
+
+class _Endpoint(object):
+    '''Routing state of a single q service.'''
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.latency = None
+        self.ejected_until = None
+
+
+
+def _parse_endpoint(endpoint):
+    if isinstance(endpoint, str):
+        host, port = endpoint.rsplit(':', 1)
+        return host, int(port)
+    return endpoint
+
+
+
+class QBalancedConnection(object):
+    '''Routes queries across replicas of a q service.
+
+    Each endpoint is backed by a :class:`.QConnectionPool`, each query is
+    routed to one of the endpoints according to the routing `policy`:
+     - :attr:`.RoutingPolicy.ROUND_ROBIN` - endpoints are used in turns,
+     - :attr:`.RoutingPolicy.LEAST_OUTSTANDING` - endpoint with the lowest
+       number of queries in progress is used,
+     - :attr:`.RoutingPolicy.LATENCY` - endpoint with the lowest measured
+       (exponentially smoothed) response time is used. Timed out queries are
+       measured with the time spent waiting for the response.
+
+    Endpoints failing with connection errors `max_failures` times in a row are
+    ejected for `eject_interval` seconds and afterwards tried again. Queries
+    which couldn't be sent are routed to another endpoint, queries interrupted
+    while waiting for the response are resent only if marked as `idempotent`.
+
+    The :class:`.QBalancedConnection` class provides a context manager API::
+
+        with qpool.QBalancedConnection(['rdb1:5000', 'rdb2:5000'], policy = qpool.RoutingPolicy.LATENCY) as q:
+            print(q.sendSync('{til x}', 10))
+
+    :Parameters:
+     - `endpoints` (`list`) - q services given as ``(host, port)`` tuples or
+       ``host:port`` strings
+     - `policy` (one of the constants defined in :class:`.RoutingPolicy`) -
+       routing policy
+     - `size` (`integer`) - number of connections kept open to each endpoint
+     - `max_failures` (`integer`) - number of consecutive failures after
+       which an endpoint is ejected
+     - `eject_interval` (`nonnegative float`) - time (in seconds) an ejected
+       endpoint is excluded from routing
+     - `latency_smoothing` (`float`) - weight of the latest response time in
+       the measured latency of an endpoint
+     - `pool_class` (subclass of `QConnectionPool`) - pool factory
+    :Kwargs:
+     - any other keyword argument is passed to the :class:`.QConnectionPool`
+       constructor
+    '''
+
+    def __init__(self, endpoints, policy = RoutingPolicy.ROUND_ROBIN, size = 1, max_failures = 1, eject_interval = 30.0, latency_smoothing = 0.2, pool_class = QConnectionPool, **kwargs):
+        if not endpoints:
+            raise ValueError('At least one endpoint is required')
+
+        self.policy = policy
+        self.max_failures = max_failures
+        self.eject_interval = eject_interval
+        self.latency_smoothing = latency_smoothing
+
+        self._endpoints = [_Endpoint(pool_class(host, port, size = size, **kwargs)) for host, port in map(_parse_endpoint, endpoints)]
+        self._lock = threading.Lock()
+        self._next = 0
+
+
+    def __enter__(self):
+        self.open()
+        return self
+
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+    def __str__(self):
+        return 'balanced(%s)' % ', '.join(str(endpoint.pool) for endpoint in self._endpoints)
+
+
+    def open(self):
+        '''Opens connections to all endpoints.
+
+        Endpoints which cannot be reached are ejected.
+
+        :raises: :class:`.QConnectionException` if none of the endpoints can be
+                 reached, :class:`.QAuthenticationException`
+        '''
+        errors = []
+        for endpoint in self._endpoints:
+            try:
+                endpoint.pool.open()
+            except (OSError, QConnectionException) as e:
+                self._complete(endpoint, e, reserved = False)
+                errors.append('%s: %s' % (endpoint.pool, e))
+
+        if len(errors) == len(self._endpoints):
+            raise QConnectionException('Unable to connect to any endpoint: %s' % '; '.join(errors))
+
+
+    def close(self):
+        '''Closes connections to all endpoints.'''
+        for endpoint in self._endpoints:
+            endpoint.pool.close()
+
+
+    def is_connected(self):
+        '''Checks whether connection to at least one endpoint has been
+        established.
+
+        :returns: `boolean` -- ``True`` if any endpoint is connected,
+                  ``False`` otherwise
+        '''
+        return any(endpoint.pool.is_connected() for endpoint in self._endpoints)
+
+
+    @property
+    def stats(self):
+        '''Retrieves routing statistics of all endpoints.
+
+        Following attributes are reported for each endpoint:
+         - `endpoint` - description of the endpoint
+         - `outstanding` - number of queries in progress
+         - `requests` - number of routed queries
+         - `failures` - number of connection failures
+         - `latency` - smoothed response time (in seconds) or ``None``
+         - `ejected` - ``True`` if the endpoint is currently excluded
+
+        :returns: `list` of `MetaData` -- endpoint statistics
+        '''
+        now = time.monotonic()
+        with self._lock:
+            return [MetaData(endpoint = str(endpoint.pool),
+                             outstanding = endpoint.outstanding,
+                             requests = endpoint.requests,
+                             failures = endpoint.failures,
+                             latency = endpoint.latency,
+                             ejected = endpoint.ejected_until is not None and endpoint.ejected_until > now)
+                    for endpoint in self._endpoints]
+
+
+    def _select(self, excluded):
+        '''Picks an endpoint according to the routing policy and reserves
+        it for a query, returns ``None`` if no endpoint is available.'''
+        now = time.monotonic()
+        with self._lock:
+            count = len(self._endpoints)
+            # rotate the candidates, so ties are resolved in round-robin order
+            candidates = [self._endpoints[(self._next + i) % count] for i in range(count)]
+            candidates = [endpoint for endpoint in candidates
+                          if endpoint not in excluded and (endpoint.ejected_until is None or endpoint.ejected_until <= now)]
+            if not candidates:
+                return None
+
+            if self.policy == RoutingPolicy.LEAST_OUTSTANDING:
+                endpoint = min(candidates, key = lambda endpoint: endpoint.outstanding)
+            elif self.policy == RoutingPolicy.LATENCY:
+                # endpoints without measurements are tried first
+                endpoint = min(candidates, key = lambda endpoint: endpoint.latency or 0.)
+            else:
+                endpoint = candidates[0]
+
+            self._next = (self._endpoints.index(endpoint) + 1) % count
+            endpoint.outstanding += 1
+            return endpoint
+
+
+    def _complete(self, endpoint, error, elapsed = None, reserved = True):
+        with self._lock:
+            if reserved:
+                endpoint.outstanding -= 1
+                endpoint.requests += 1
+
+            if error is not None:
+                endpoint.failures += 1
+                endpoint.consecutive_failures += 1
+                if endpoint.consecutive_failures >= self.max_failures:
+                    endpoint.ejected_until = time.monotonic() + self.eject_interval
+            else:
+                endpoint.consecutive_failures = 0
+                endpoint.ejected_until = None
+
+            if elapsed is not None:
+                endpoint.latency = elapsed if endpoint.latency is None else endpoint.latency + self.latency_smoothing * (elapsed - endpoint.latency)
+
+
+    def _execute(self, send, receive, idempotent):
+        excluded = []
+        error = None
+        while True:
+            endpoint = self._select(excluded)
+            if endpoint is None:
+                raise error if error else QConnectionPoolException('No healthy endpoint available.')
+
+            started = time.monotonic()
+            sent = False
+            try:
+                if not endpoint.pool.is_connected():
+                    # ejected endpoint which couldn't be opened before
+                    endpoint.pool.open()
+                with endpoint.pool.connection() as connection:
+                    send(connection)
+                    # the query has been written, it may be executed by q
+                    sent = True
+                    result = receive(connection) if receive else None
+            except QConnectionPoolException as e:
+                # pool is exhausted, the endpoint itself is healthy
+                self._complete(endpoint, None)
+                raise
+            except (OSError, QConnectionException, QStreamClosedException) as e:
+                self._complete(endpoint, e)
+                if sent and not idempotent:
+                    raise
+                excluded.append(endpoint)
+                error = e
+                continue
+            except QTimeoutException:
+                # the endpoint hasn't answered yet, the elapsed time is the
+                # lower bound of its response time
+                self._complete(endpoint, None, time.monotonic() - started)
+                raise
+            except (QException, QReaderException):
+                # errors returned by q, the response has been received
+                self._complete(endpoint, None, time.monotonic() - started)
+                raise
+            except:
+                # e.g. the query couldn't be serialized, nothing was measured
+                self._complete(endpoint, None)
+                raise
+
+            self._complete(endpoint, None, time.monotonic() - started)
+            return result
+
+
+    def sendSync(self, query, *parameters, **options):
+        '''Performs a synchronous query on one of the endpoints and returns
+        parsed data. See :func:`.QConnection.sendSync` for details.
+
+        :Options:
+         - `idempotent` (`boolean`) - if ``True`` the query is resent to
+           another endpoint when the connection has been lost while waiting
+           for the response, **Default**: ``False``
+
+        :returns: query result parsed to Python data structures
+
+        :raises: :class:`.QConnectionPoolException`,
+                 :class:`.QConnectionException`, :class:`.QWriterException`,
+                 :class:`.QReaderException`, :class:`.QTimeoutException`
+        '''
+        idempotent = options.pop('idempotent', False)
+        timeout = options.pop('timeout', None)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        return self._execute(lambda connection: connection.query(MessageType.SYNC, query, *parameters, **options),
+                             lambda connection: connection._read_response(deadline, **options), idempotent)
+
+
+    def sendAsync(self, query, *parameters, **options):
+        '''Performs an asynchronous query on one of the endpoints.
+        See :func:`.QConnection.sendAsync` for details.
+
+        :raises: :class:`.QConnectionPoolException`,
+                 :class:`.QConnectionException`, :class:`.QWriterException`
+        '''
+        idempotent = options.pop('idempotent', False)
+        self._execute(lambda connection: connection.sendAsync(query, *parameters, **options), None, idempotent)
+
+
+    def __call__(self, *parameters, **options):
+        return self.sendSync(parameters[0], *parameters[1:], **options)
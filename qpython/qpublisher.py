@@ -0,0 +1,343 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import threading
+import time
+
+import numpy
+
+from qpython import MetaData
+from qpython.qtype import PY_TYPE, TEMPORAL_Q_TYPE, QGENERAL_LIST
+from qpython.qcollection import qlist
+
+
+
+class _TableBuffer(object):
+    '''Preallocated column buffers of a single table.'''
+
+    def __init__(self, name, qtypes, capacity):
+        self.name = name
+        self.qtypes = [-abs(qtype) for qtype in qtypes]
+        self.columns = [numpy.empty(capacity, dtype = self._dtype(qtype)) for qtype in self.qtypes]
+        self.size = 0
+        # time of the oldest buffered row
+        self.started = None
+
+
+    @staticmethod
+    def _dtype(qtype):
+        if qtype == QGENERAL_LIST:
+            return numpy.object_
+        if qtype in TEMPORAL_Q_TYPE:
+            return numpy.dtype(TEMPORAL_Q_TYPE[qtype])
+        dtype = PY_TYPE[qtype]
+        # symbols are kept as objects, so both str and bytes can be buffered
+        return numpy.object_ if dtype is numpy.bytes_ else dtype
+
+
+    def to_columns(self):
+        '''Returns buffered data as q vectors backed by the buffers.'''
+        columns = []
+        for column, qtype in zip(self.columns, self.qtypes):
+            data = column[:self.size]
+            columns.append(list(data) if qtype == QGENERAL_LIST else qlist(data, qtype = qtype))
+        return columns
+
+
+
+class QPublisher(object):
+    '''Publishes updates to a q service (e.g. a tickerplant) in micro-batches.
+
+    Rows and column chunks are appended to preallocated `numpy` column buffers
+    of each table. Buffered data is sent as a single asynchronous columnar
+    update message (``(`.u.upd; `table; columns)``) when `batch_size` rows
+    have been buffered or when the oldest buffered row is `flush_interval`
+    seconds old.
+
+    Asynchronous messages are not acknowledged by the q service. If
+    `ack_every` is set, a synchronous query is sent after the given number of
+    update messages, which bounds the amount of data in flight to the
+    q service processing speed.
+
+    The :class:`.QPublisher` class provides a context manager API, which
+    flushes the remaining data on exit::
+
+        q = qconnection.QConnection(host = 'localhost', port = 17010)
+        q.open()
+
+        with qpublisher.QPublisher(q, batch_size = 10000, flush_interval = 0.05, ack_every = 100) as publisher:
+            publisher.add_table('ask', [QTIME_LIST, QSYMBOL_LIST, QSYMBOL_LIST, QFLOAT_LIST])
+            publisher.publish('ask', (numpy.timedelta64(1000, 'ms'), 'instr_1', 'qPython', 12.5))
+            publisher.publish_columns('ask', [times, instruments, sources, asks])
+
+    Publishing methods can be called from many threads. The connection is
+    used exclusively by the publisher while it is running. An error raised
+    while flushing in the background is stored in the `error` attribute and
+    raised by the next call of :func:`.publish`, :func:`.publish_columns` or
+    :func:`.flush`.
+
+    :Parameters:
+     - `connection` (:class:`.QConnection`) - connection to the q service
+     - `batch_size` (`integer`) - maximum number of rows sent in a single
+       update message
+     - `flush_interval` (`positive float` or `None`) - maximum time (in
+       seconds) a row waits in the buffer, ``None`` flushes only complete
+       batches
+     - `ack_every` (`integer` or `None`) - number of update messages after
+       which the q service is queried synchronously
+     - `update_function` (`string`) - name of the update function
+     - `ack_query` (`string`) - query sent to acknowledge the updates
+    :Options:
+     - conversion options applied while serializing update messages, see
+       :class:`.QConnection`
+    '''
+
+    def __init__(self, connection, batch_size = 10000, flush_interval = 0.05, ack_every = None, update_function = '.u.upd', ack_query = '::', **options):
+        if batch_size < 1:
+            raise ValueError('Batch size has to be positive, got: %s' % batch_size)
+        if flush_interval is not None and flush_interval <= 0:
+            raise ValueError('Flush interval has to be positive, got: %s' % flush_interval)
+
+        self.connection = connection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.ack_every = ack_every
+        self.update_function = update_function
+        self.ack_query = ack_query
+
+        self._options = options
+        self._tables = {}
+        self._lock = threading.RLock()
+        self._stopping = threading.Event()
+        self._flusher = None
+        self._unacknowledged = 0
+
+        self.error = None
+        self._rows = 0
+        self._messages = 0
+        self._acks = 0
+
+
+    def __enter__(self):
+        self.start()
+        return self
+
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+    @property
+    def stats(self):
+        '''Retrieves publisher statistics.
+
+        Following attributes are reported:
+         - `rows` - number of published rows
+         - `messages` - number of sent update messages
+         - `acks` - number of acknowledgements received from the q service
+         - `buffered` - number of rows waiting in buffers
+
+        :returns: `MetaData` -- publisher statistics
+        '''
+        with self._lock:
+            return MetaData(rows = self._rows,
+                            messages = self._messages,
+                            acks = self._acks,
+                            buffered = sum(table.size for table in self._tables.values()))
+
+
+    def add_table(self, table, qtypes):
+        '''Registers a table and preallocates its column buffers.
+
+        :Parameters:
+         - `table` (`string`) - table name
+         - `qtypes` (`list` of `integer`) - q types of the table columns, e.g.
+           ``[QTIMESPAN_LIST, QSYMBOL_LIST, QFLOAT_LIST]``, `QGENERAL_LIST`
+           for columns of strings or nested lists
+        '''
+        with self._lock:
+            if table in self._tables:
+                self._flush(self._tables[table])
+            self._tables[table] = _TableBuffer(table, qtypes, self.batch_size)
+
+
+    def publish(self, table, row):
+        '''Appends a single row to the table buffer.
+
+        :Parameters:
+         - `table` (`string`) - table name
+         - `row` (`tuple` or `list`) - values of all columns
+
+        :raises: `ValueError`, :class:`.QConnectionException`,
+                 :class:`.QWriterException`
+        '''
+        with self._lock:
+            self._raise_error()
+            buffer = self._get_buffer(table)
+            if len(row) != len(buffer.columns):
+                raise ValueError('Number of values: %d doesn`t match number of columns: %d' % (len(row), len(buffer.columns)))
+
+            if buffer.size == self.batch_size:
+                # previous flush failed
+                self._flush(buffer)
+            if buffer.size == 0:
+                buffer.started = time.monotonic()
+
+            for column, value in zip(buffer.columns, row):
+                column[buffer.size] = value
+            buffer.size += 1
+            self._rows += 1
+
+            if buffer.size == self.batch_size:
+                self._flush(buffer)
+
+
+    def publish_columns(self, table, columns):
+        '''Appends a chunk of rows given as columns to the table buffer.
+
+        Chunks larger than the remaining buffer capacity are split between
+        update messages.
+
+        :Parameters:
+         - `table` (`string`) - table name
+         - `columns` (`list`) - arrays of equal length, one per column
+
+        :raises: `ValueError`, :class:`.QConnectionException`,
+                 :class:`.QWriterException`
+        '''
+        with self._lock:
+            self._raise_error()
+            buffer = self._get_buffer(table)
+            if len(columns) != len(buffer.columns):
+                raise ValueError('Number of columns: %d doesn`t match number of table columns: %d' % (len(columns), len(buffer.columns)))
+
+            size = len(columns[0])
+            if any(len(column) != size for column in columns):
+                raise ValueError('Columns are expected to be of equal length')
+
+            offset = 0
+            while offset < size:
+                if buffer.size == self.batch_size:
+                    self._flush(buffer)
+                if buffer.size == 0:
+                    buffer.started = time.monotonic()
+
+                count = min(self.batch_size - buffer.size, size - offset)
+                for target, column in zip(buffer.columns, columns):
+                    target[buffer.size:buffer.size + count] = column[offset:offset + count]
+                buffer.size += count
+                offset += count
+                self._rows += count
+
+            if buffer.size == self.batch_size:
+                self._flush(buffer)
+
+
+    def flush(self):
+        '''Sends all buffered rows.
+
+        :raises: :class:`.QConnectionException`, :class:`.QWriterException`
+        '''
+        with self._lock:
+            self._raise_error()
+            for buffer in self._tables.values():
+                self._flush(buffer)
+
+
+    def acknowledge(self):
+        '''Sends all buffered rows and waits until the q service processes
+        them.
+
+        :raises: :class:`.QConnectionException`, :class:`.QWriterException`,
+                 :class:`.QReaderException`
+        '''
+        with self._lock:
+            self.flush()
+            self._acknowledge()
+
+
+    def start(self):
+        '''Starts the thread flushing buffers older than `flush_interval`.'''
+        if self._flusher or self.flush_interval is None:
+            return
+
+        self._stopping.clear()
+        self._flusher = threading.Thread(target = self._flush_loop, name = 'QPublisher-flusher', daemon = True)
+        self._flusher.start()
+
+
+    def stop(self):
+        '''Stops the flushing thread and sends the remaining rows. Pending
+        updates are acknowledged if `ack_every` is set. The connection is
+        left open.'''
+        if self._flusher:
+            self._stopping.set()
+            self._flusher.join()
+            self._flusher = None
+
+        if self.ack_every:
+            self.acknowledge()
+        else:
+            self.flush()
+
+
+    def _get_buffer(self, table):
+        try:
+            return self._tables[table]
+        except KeyError:
+            raise ValueError('Table %s has not been registered' % table)
+
+
+    def _raise_error(self):
+        '''Raises the error of the flushing thread, once.'''
+        error, self.error = self.error, None
+        if error:
+            raise error
+
+
+    def _flush(self, buffer):
+        if buffer.size == 0:
+            return
+
+        table = numpy.bytes_(buffer.name.encode(self.connection._encoding))
+        # data is serialized before sendAsync returns, the buffers can be reused
+        self.connection.sendAsync(self.update_function, table, buffer.to_columns(), **self._options)
+        buffer.size = 0
+        buffer.started = None
+        self._messages += 1
+        self._unacknowledged += 1
+
+        if self.ack_every and self._unacknowledged >= self.ack_every:
+            self._acknowledge()
+
+
+    def _acknowledge(self):
+        if self._unacknowledged:
+            self.connection.sendSync(self.ack_query)
+            self._unacknowledged = 0
+            self._acks += 1
+
+
+    def _flush_loop(self):
+        while not self._stopping.wait(self.flush_interval / 4):
+            try:
+                with self._lock:
+                    now = time.monotonic()
+                    for buffer in self._tables.values():
+                        if buffer.started is not None and now - buffer.started >= self.flush_interval:
+                            self._flush(buffer)
+            except Exception as e:
+                self.error = e
@@ -14,6 +14,7 @@
 #  limitations under the License.
 #
 
+import copy
 import struct
 import sys
 if sys.version > '3':
@@ -22,7 +23,7 @@ if sys.version > '3':
 
 from qpython import MetaData, CONVERSION_OPTIONS
 from qpython.qtype import * 
-from qpython.qcollection import qlist, QDictionary, qtable, QTable, QKeyedTable
+from qpython.qcollection import qlist, QDictionary, qtable, QTable, QColumnarTable, QKeyedTable, QLazyTable
 from qpython.qtemporal import qtemporal, from_raw_qtemporal, array_from_raw_qtemporal
 
 
@@ -31,6 +32,14 @@ try:
 except:
     from qpython.utils import uncompress
 
+try:
+    from qpython.fastutils import decode_object
+except:
+    decode_object = None
+
+# minimal length of a symbol list decoded with vectorized operations
+SYMBOL_VECTORIZATION_THRESHOLD = 128
+
 class QReaderException(Exception):
     '''
     Indicates an error raised during data deserialization.
@@ -39,6 +48,15 @@ class QReaderException(Exception):
 
 
 
+class QStreamClosedException(QReaderException):
+    '''
+    Indicates that the stream has been closed before a complete message has
+    been read.
+    '''
+    pass
+
+
+
 class QMessage(object):
     '''
     Represents a single message parsed from q protocol.
@@ -108,11 +126,21 @@ class QReader(object):
     _reader_map = {}
     parse = Mapper(_reader_map)
 
+    # q types decoded by the compiled decoder unless their parsers are overridden
+    _NATIVE_TYPES = (QBOOL, QGUID, QBYTE, QSHORT, QINT, QLONG, QFLOAT, QDOUBLE, QCHAR, QSYMBOL, QERROR,
+                     QGENERAL_LIST, QDICTIONARY, QTABLE) + tuple(range(QBOOL_LIST, QTIME_LIST + 1))
+    _native_cache = {}
+
 
     def __init__(self, stream, encoding = 'latin-1'):
         self._stream = stream
         self._buffer = QReader.BytesBuffer()
         self._encoding = encoding
+        # sockets are read directly into a reusable receive buffer and vectors
+        # are exposed as views over it (zero-copy mode)
+        self._is_socket = hasattr(stream, 'recv_into')
+        self._recv_buffer = None
+        self._native = None
 
 
     def read(self, source = None, **options):
@@ -192,13 +220,14 @@ class QReader(object):
         :returns: read data (parsed or raw byte form)
         '''
         self._options = MetaData(**CONVERSION_OPTIONS.union_dict(**options))
+        self._native = self._native_types() if decode_object else None
 
         if compression_mode > 0:
             comprHeaderLen = 4 if compression_mode == 1 else 8
             if self._stream:
                 self._buffer.wrap(self._read_bytes(comprHeaderLen))
             uncompressed_size = -8 + (self._buffer.get_uint() if compression_mode == 1 else self._buffer.get_long())
-            compressed_data = self._read_bytes(message_size - (8+comprHeaderLen)) if self._stream else self._buffer.raw(message_size - (8+comprHeaderLen))
+            compressed_data = self._read_bytes(message_size - (8+comprHeaderLen)) if self._stream else self._buffer.view(message_size - (8+comprHeaderLen))
 
             raw_data = numpy.frombuffer(compressed_data, dtype = numpy.uint8)
             if  uncompressed_size <= 0:
@@ -210,6 +239,9 @@ class QReader(object):
         elif self._stream:
             raw_data = self._read_bytes(message_size - 8)
             self._buffer.wrap(raw_data)
+            if self._options.raw:
+                # raw data is handed over to the caller, don't reuse it
+                self._recv_buffer = None
         if not self._stream and self._options.raw:
             raw_data = self._buffer.raw(message_size - 8)
 
@@ -217,8 +249,13 @@ class QReader(object):
 
 
     def _read_object(self):
-        qtype = self._buffer.get_byte()
+        if self._native is not None:
+            return decode_object(self, self._native)
+
+        return self._parse_object(self._buffer.get_byte())
 
+
+    def _parse_object(self, qtype):
         reader = self._get_reader(qtype)
 
         if reader:
@@ -235,6 +272,31 @@ class QReader(object):
         return self._reader_map.get(qtype, None)
 
 
+    def _native_types(self, reference = None):
+        '''Retrieves flags of q types decoded by the compiled decoder, indexed
+        by the q type byte.
+
+        Types whose parsers differ from the ones of the `reference` class are
+        decoded in Python.'''
+        cls, reference = type(self), reference or QReader
+        eager = not self._options.lazy_tables and self._options.columns is None
+        key = (cls, reference, eager)
+        if key not in self._native_cache:
+            flags = bytearray(256)
+            for qtype in self._NATIVE_TYPES:
+                if qtype in (QDICTIONARY, QTABLE) and not eager:
+                    continue
+                if qtype in reference._reader_map:
+                    native = cls._reader_map.get(qtype) is reference._reader_map[qtype]
+                elif qtype >= QBOOL_LIST:
+                    native = cls._read_list is reference._read_list
+                else:
+                    native = cls._read_atom is reference._read_atom
+                flags[qtype & 0xff] = native
+            self._native_cache[key] = bytes(flags)
+        return self._native_cache[key]
+
+
     @parse(QERROR)
     def _read_error(self, qtype = QERROR):
         raise QException(self._read_symbol())
@@ -290,17 +352,23 @@ class QReader(object):
         conversion = PY_TYPE.get(-qtype, None)
 
         if qtype == QSYMBOL_LIST:
-            symbols = self._buffer.get_symbols(length)
-            data = numpy.array(symbols, dtype = numpy.bytes_)
+            data = self._buffer.get_symbol_array(length)
             return qlist(data, qtype = qtype, adjust_dtype = False)
         elif qtype == QGUID_LIST:
-            data = numpy.array([self._read_guid() for x in range(length)])
+            raw = self._read_vector_bytes(length * 16)
+            if self._options.numpy_guids:
+                return qlist(numpy.frombuffer(raw, dtype = GUID_RAW_TYPE), qtype = qtype, adjust_dtype = False)
+
+            raw = bytes(raw)
+            data = numpy.empty(length, dtype = numpy.object_)
+            for i in range(length):
+                data[i] = uuid.UUID(bytes = raw[i * 16 : i * 16 + 16])
             return qlist(data, qtype = qtype, adjust_dtype = False)
         elif conversion:
-            raw = self._buffer.raw(length * ATOM_SIZE[qtype])
+            raw = self._read_vector_bytes(length * ATOM_SIZE[qtype])
             data = numpy.frombuffer(raw, dtype = conversion)
             if not self._is_native:
-                data.byteswap(True)
+                data = data.byteswap(data.flags.writeable)
 
             if qtype >= QTIMESTAMP_LIST and qtype <= QTIME_LIST and self._options.numpy_temporals:
                 data = array_from_raw_qtemporal(data, qtype)
@@ -312,26 +380,170 @@ class QReader(object):
 
     @parse(QDICTIONARY)
     def _read_dictionary(self, qtype = QDICTIONARY):
-        keys = self._read_object()
-        values = self._read_object()
+        keys, values = self._read_dictionary_items()
 
-        if isinstance(keys, QTable):
+        if isinstance(keys, (QTable, QColumnarTable)):
             return QKeyedTable(keys, values)
         else:
             return QDictionary(keys, values)
 
 
+    def _read_dictionary_items(self):
+        # keyed tables are decoded eagerly, key columns are never skipped
+        lazy_tables, self._options.lazy_tables = self._options.lazy_tables, False
+        columns, self._options.columns = self._options.columns, None
+        try:
+            keys = self._read_object()
+            self._options.columns = columns
+            return keys, self._read_object()
+        finally:
+            self._options.lazy_tables = lazy_tables
+            self._options.columns = columns
+
+
     @parse(QTABLE)
     def _read_table(self, qtype = QTABLE):
         self._buffer.skip()  # ignore attributes
         self._buffer.skip()  # ignore dict type stamp
 
         columns = self._read_object()
-        data = self._read_object()
+        if self._options.lazy_tables:
+            return self._read_lazy_table(columns)
+
+        columns, data = self._read_table_data(columns)
+        return self._assemble_table(columns, data)
+
+
+    def _read_table_data(self, columns):
+        '''Reads table columns, columns not selected via the `columns` option
+        are skipped without being decoded.'''
+        self._buffer.skip()  # ignore generic list type indicator
+        self._buffer.skip()  # ignore attributes
+        count = self._buffer.get_int()
+
+        selection = self._column_selection()
+        if selection is None:
+            return columns, [self._read_column() for x in range(count)]
+
+        names, data = [], []
+        for column in columns:
+            name = column if isinstance(column, str) else column.decode('utf-8')
+            if name in selection:
+                names.append(name)
+                data.append(self._read_column())
+            else:
+                self._skip_column()
+        return names, data
 
+
+    def _read_column(self):
+        '''Reads a single table column.'''
+        return self._read_object()
+
+
+    def _column_selection(self):
+        selection = self._options.columns
+        if selection is None:
+            return None
+        return set([selection] if isinstance(selection, str) else selection)
+
+
+    def _skip_column(self):
+        position = self._buffer._position
+        if self._skip_object() is None:
+            # decode and drop columns which cannot be skipped
+            self._buffer._position = position
+            self._read_object()
+
+
+    def _assemble_table(self, columns, data):
+        if self._options.columnar_tables:
+            return QColumnarTable(columns, data, qtype = QTABLE)
         return qtable(columns, data, qtype = QTABLE)
 
 
+    def _read_lazy_table(self, columns):
+        '''Scans table columns and creates a :class:`.QLazyTable` decoding
+        them from the retained message buffer on first access.'''
+        self._buffer.skip()  # ignore generic list type indicator
+        self._buffer.skip()  # ignore attributes
+        count = self._buffer.get_int()
+
+        selection = self._column_selection()
+        names = []
+        meta = MetaData(qtype = QTABLE)
+        positions, decoded, length = [], {}, 0
+        for column in columns:
+            name = column if isinstance(column, str) else column.decode('utf-8')
+            if selection is not None and name not in selection:
+                self._skip_column()
+                continue
+
+            i = len(names)
+            names.append(name)
+            position = self._buffer._position
+            scanned = self._skip_object()
+            if scanned is None:
+                # columns which cannot be skipped are decoded right away
+                self._buffer._position = position
+                decoded[i] = self._read_object()
+                qtype, column_length = getattr(getattr(decoded[i], 'meta', None), 'qtype', QGENERAL_LIST), len(decoded[i])
+            else:
+                qtype, column_length = scanned
+
+            positions.append(position)
+            meta[names[i]] = -abs(qtype)
+            length = column_length if i == 0 else length
+
+        reader = copy.copy(self)
+        reader._buffer = QReader.BytesBuffer()
+        reader._buffer.wrap(self._buffer._data)
+        reader._buffer.endianness = self._buffer.endianness
+        # keep the buffer exported, so the receive buffer isn't reused
+        reader._recv_buffer = memoryview(self._buffer._data)
+
+        def decode(index):
+            if index in decoded:
+                return decoded[index]
+            reader._buffer._position = positions[index]
+            return reader._read_object()
+
+        return QLazyTable(names, meta, length, decode, lambda data: reader._assemble_table(names, data))
+
+
+    def _skip_object(self):
+        '''Skips a vector or an atom without decoding it.
+
+        :returns: q type and length of the skipped object or ``None`` if the
+                  object type cannot be skipped
+        '''
+        qtype = self._buffer.get_byte()
+
+        if qtype == QGENERAL_LIST:
+            self._buffer.skip()  # ignore attributes
+            length = self._buffer.get_int()
+            for _ in range(length):
+                if self._skip_object() is None:
+                    return None
+        elif qtype >= QBOOL_LIST and qtype <= QTIME_LIST:
+            attr = self._buffer.get_byte()
+            length = self._buffer.get_long() if attr & 0x80 != 0 else self._buffer.get_uint()
+            if qtype == QSYMBOL_LIST:
+                self._buffer.get_symbol_offsets(length)
+            else:
+                self._buffer.skip(length * ATOM_SIZE[qtype])
+        elif qtype <= QBOOL and qtype >= QTIME:
+            length = 1
+            if qtype == QSYMBOL:
+                self._buffer.get_symbol()
+            else:
+                self._buffer.skip(ATOM_SIZE[-qtype])
+        else:
+            return None
+
+        return qtype, length
+
+
     @parse(QGENERAL_LIST)
     def _read_general_list(self, qtype = QGENERAL_LIST):
         self._buffer.skip()  # ignore attributes
@@ -380,17 +592,64 @@ class QReader(object):
         return QProjection(parameters)
 
 
+    def _read_vector_bytes(self, length):
+        '''Reads data of a vector, as a view over the receive buffer in the
+        zero-copy mode or as a copy otherwise, so the vector doesn't keep the
+        whole message alive.'''
+        return self._buffer.view(length) if self._is_socket else self._buffer.raw(length)
+
+
     def _read_bytes(self, length):
         if not self._stream:
             raise QReaderException('There is no input data. QReader requires either stream or data chunk')
 
         if length == 0:
             return b''
+        elif self._is_socket:
+            return self._recv_bytes(length)
         else:
             data = self._stream.read(length)
 
         if len(data) == 0:
-            raise QReaderException('Error while reading data')
+            raise QStreamClosedException('Error while reading data')
+        return data
+
+
+    def _recv_bytes(self, length):
+        '''Reads `length` bytes from the wrapped socket straight into the
+        receive buffer.
+
+        The buffer is reused between messages unless parsed data still refers
+        to it (e.g. vectors are exposed as views over the received bytes), in
+        which case a new buffer is allocated.
+        '''
+        if length <= 8:
+            # message and compression headers, don't shrink the receive buffer
+            data = bytearray(length)
+        else:
+            data = self._recv_buffer
+            if data is None or len(data) < length:
+                data = bytearray(length)
+            else:
+                try:
+                    # resizing fails if the buffer is still exported
+                    data.append(0)
+                    del data[length:]
+                except BufferError:
+                    data = bytearray(length)
+            self._recv_buffer = data
+
+        view = memoryview(data)
+        received = 0
+        try:
+            while received < length:
+                count = self._stream.recv_into(view[received:], length - received)
+                if count == 0:
+                    raise QStreamClosedException('Error while reading data')
+                received += count
+        finally:
+            view.release()
+
         return data
 
 
@@ -464,11 +723,37 @@ class QReader(object):
             if new_position > self._size:
                 raise QReaderException('Attempt to read data out of buffer bounds')
 
-            raw = self._data[self._position : new_position]
+            raw = self._slice(self._position, new_position)
             self._position = new_position
             return raw
 
 
+        def view(self, offset):
+            '''
+            Gets `offset` number of bytes as a `memoryview` over the wrapped
+            data, without copying.
+
+            :Parameters:
+             - `offset` (`integer`) - number of bytes to be retrieved
+
+            :returns: `memoryview` over the wrapped data
+            '''
+            new_position = self._position + offset
+
+            if new_position > self._size:
+                raise QReaderException('Attempt to read data out of buffer bounds')
+
+            view = memoryview(self._data)[self._position : new_position]
+            self._position = new_position
+            return view
+
+
+        def _slice(self, start, end):
+            if isinstance(self._data, bytes):
+                return self._data[start : end]
+            return bytes(memoryview(self._data)[start : end])
+
+
         def get(self, fmt, offset = None):
             '''
             Gets bytes from the buffer according to specified format or `offset`.
@@ -481,7 +766,14 @@ class QReader(object):
             '''
             fmt = self.endianness + fmt
             offset = offset if offset else struct.calcsize(fmt)
-            return struct.unpack(fmt, self.raw(offset))[0]
+            new_position = self._position + offset
+
+            if new_position > self._size:
+                raise QReaderException('Attempt to read data out of buffer bounds')
+
+            value = struct.unpack_from(fmt, self._data, self._position)[0]
+            self._position = new_position
+            return value
 
 
         def get_byte(self):
@@ -531,7 +823,7 @@ class QReader(object):
             if new_position < 0:
                 raise QReaderException('Failed to read symbol from stream')
 
-            raw = self._data[self._position : new_position]
+            raw = self._slice(self._position, new_position)
             self._position = new_position + 1
             return raw
 
@@ -560,9 +852,88 @@ class QReader(object):
                 c += 1
                 new_position += 1
 
-            raw = self._data[self._position : new_position - 1]
+            raw = self._slice(self._position, new_position - 1)
             self._position = new_position
 
             return raw.split(b'\x00')
 
 
+        def get_symbol_offsets(self, count):
+            '''
+            Locates ``count`` ``\\x00`` terminated strings in the buffer.
+
+            Null terminators are searched with vectorized `numpy` comparisons
+            over windows of growing size, so no Python objects are created
+            per string.
+
+            :Parameters:
+             - `count` (`integer`) - number of strings to be read
+
+            :returns: tuple of `uint8` array with the strings data, start and
+                      end offsets of the strings in the array
+            '''
+            data = numpy.frombuffer(self._data, dtype = numpy.uint8, count = self._size - self._position, offset = self._position)
+            if count == 0:
+                return data[:0], numpy.zeros(0, dtype = numpy.int64), numpy.zeros(0, dtype = numpy.int64)
+
+            nulls, found, scanned = [], 0, 0
+            window = count * 8 + 64
+            while found < count:
+                if scanned >= len(data):
+                    raise QReaderException('Failed to read symbol from stream')
+
+                end = min(len(data), scanned + window)
+                chunk = numpy.flatnonzero(data[scanned:end] == 0)
+                chunk += scanned
+                nulls.append(chunk)
+                found += len(chunk)
+                scanned = end
+                window *= 2
+
+            ends = (nulls[0] if len(nulls) == 1 else numpy.concatenate(nulls))[:count]
+            starts = numpy.empty_like(ends)
+            starts[:1] = 0
+            starts[1:] = ends[:-1] + 1
+
+            self._position += int(ends[-1]) + 1 if count else 0
+            return data, starts, ends
+
+
+        def get_symbol_array(self, count):
+            '''
+            Gets ``count`` ``\\x00`` terminated strings from the buffer as a
+            `numpy` array of fixed width bytes, equivalent to
+            ``numpy.array(get_symbols(count), dtype = numpy.bytes_)``.
+
+            :Parameters:
+             - `count` (`integer`) - number of strings to be read
+
+            :returns: `numpy.ndarray` of ``\\x00`` terminated strings read
+                      from the buffer
+            '''
+            if count < SYMBOL_VECTORIZATION_THRESHOLD:
+                return numpy.array(self.get_symbols(count), dtype = numpy.bytes_)
+
+            data, starts, ends = self.get_symbol_offsets(count)
+            lengths = ends - starts
+            width = max(1, int(lengths.max()))
+
+            if width <= 8:
+                # short strings (e.g. tickers) are copied column by column
+                symbols = numpy.zeros((count, width), dtype = numpy.uint8)
+                rows = None
+                for column in range(width):
+                    if rows is None and lengths.min() > column:
+                        symbols[:, column] = data[starts + column]
+                        continue
+                    rows = numpy.flatnonzero(lengths > column) if rows is None else rows[lengths[rows] > column]
+                    symbols[rows, column] = data[starts[rows] + column]
+            else:
+                # scatter bytes of each string into its fixed width slot
+                positions = numpy.flatnonzero(data[:ends[-1]])
+                symbols = numpy.zeros(count * width, dtype = numpy.uint8)
+                symbols[positions + numpy.repeat(numpy.arange(count) * width - starts, lengths)] = data[positions]
+
+            return symbols.view('S%d' % width).reshape(count)
+
+
@@ -0,0 +1,215 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy
+
+try:
+    import pandas
+except ImportError:
+    pandas = None
+
+from qpython.qtype import QKEYED_TABLE
+from qpython.qcollection import QList, QTable, QColumnarTable, QKeyedTable
+
+
+
+class QScatterException(Exception):
+    '''Raised when a query fails on some of the shards.
+
+    :Attributes:
+     - `results` (`list`) - results of the shards, ``None`` for failed ones
+     - `errors` (`dict`) - exceptions of the failed shards by shard index
+    '''
+
+    def __init__(self, message, results, errors):
+        super(QScatterException, self).__init__(message)
+        self.results = results
+        self.errors = errors
+
+
+
+def merge(results):
+    '''Concatenates query results returned by multiple shards.
+
+    Data is copied once with a single `numpy.concatenate` call per table or
+    column:
+     - :class:`.QTable` instances are concatenated into a :class:`.QTable`,
+     - :class:`.QColumnarTable` instances are concatenated column by column
+       into a :class:`.QColumnarTable`,
+     - :class:`.QKeyedTable` instances are merged by keys and values,
+     - `pandas.DataFrame` instances are concatenated via `pandas.concat`, the
+       index is kept only for keyed tables,
+     - :class:`.QList` and `numpy` arrays are concatenated,
+     - Python lists are joined.
+
+    Other results (e.g. atoms) are returned as a `list`.
+
+    :Parameters:
+     - `results` (`list`) - results of the shards
+
+    :returns: merged result or ``None`` if `results` is empty
+    '''
+    if not results:
+        return None
+
+    first = results[0]
+    if isinstance(first, QTable):
+        table = numpy.concatenate(results).view(QTable)
+        table._meta_init(**first.meta.as_dict())
+        return table
+    elif isinstance(first, QColumnarTable):
+        table = QColumnarTable(first.columns, [merge([result[column] for result in results]) for column in first.columns])
+        table.meta = first.meta
+        return table
+    elif isinstance(first, QKeyedTable):
+        return QKeyedTable(merge([result.keys for result in results]), merge([result.values for result in results]))
+    elif pandas is not None and isinstance(first, pandas.DataFrame):
+        keyed = hasattr(first, 'meta') and first.meta.qtype == QKEYED_TABLE
+        frame = pandas.concat(results, ignore_index = not keyed)
+        if hasattr(first, 'meta'):
+            frame.meta = first.meta
+        return frame
+    elif isinstance(first, numpy.ndarray):
+        array = numpy.concatenate(results)
+        if isinstance(first, QList):
+            array = array.view(type(first))
+            array._meta_init(**first.meta.as_dict())
+        return array
+    elif isinstance(first, list):
+        return [item for result in results for item in result]
+
+    return list(results)
+
+
+
+class QScatterGather(object):
+    '''Executes queries on many q services concurrently and merges the results.
+
+    Suitable for querying shards of a partitioned database, e.g. HDBs on many
+    hosts, so the wall time approaches the response time of the slowest shard
+    instead of the sum of all of them::
+
+        shards = [qconnection.QConnection(host = host, port = 5000) for host in hosts]
+        for shard in shards:
+            shard.open()
+
+        with qscatter.QScatterGather(shards, timeout = 30) as scatter:
+            # the same query sent to all shards
+            trades = scatter.sendSync('{select from trade where date = x}', numpy.datetime64('2020-01-02', 'D'), numpy_temporals = True)
+
+            # per shard parameters
+            trades = scatter.execute('{select from trade where date = x}', [(date, ) for date in dates])
+
+    :Parameters:
+     - `connections` (`list`) - opened :class:`.QConnection` instances (or
+       any objects providing the :func:`sendSync` method, e.g.
+       :class:`.QConnectionPool`), one per shard
+     - `timeout` (`nonnegative float` or `None`) - default time limit (in
+       seconds) for each shard to respond, passed to :func:`sendSync` of the
+       connections, so connections of slow shards remain usable
+     - `max_workers` (`integer` or `None`) - number of worker threads,
+       ``None`` starts one thread per shard
+    '''
+
+    def __init__(self, connections, timeout = None, max_workers = None):
+        if not connections:
+            raise ValueError('At least one connection is required')
+
+        self.connections = list(connections)
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers = max_workers or len(self.connections))
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+    def close(self):
+        '''Stops the worker threads. Connections are left open.'''
+        self._executor.shutdown(wait = False)
+
+
+    def execute(self, query, parameters = None, timeout = None, merge_results = True, partial = False, **options):
+        '''Executes a query on all shards concurrently.
+
+        :Parameters:
+         - `query` (`string`) - query to be executed
+         - `parameters` (`list` or `None`) - parameters of the query, one
+           `tuple` for each shard
+         - `timeout` (`nonnegative float` or `None`) - time limit (in
+           seconds) for each shard to respond, if ``None`` the default
+           `timeout` is used
+         - `merge_results` (`boolean`) - if ``True`` results are merged via
+           :func:`.merge`, otherwise a `list` of results is returned
+         - `partial` (`boolean`) - if ``True`` failed shards are skipped,
+           otherwise :class:`.QScatterException` is raised
+        :Options:
+         - see :func:`.QConnection.sendSync`
+
+        :returns: merged result or `list` of results in the order of shards
+
+        :raises: :class:`.QScatterException`
+        '''
+        if parameters is None:
+            parameters = [()] * len(self.connections)
+        elif len(parameters) != len(self.connections):
+            raise ValueError('Number of parameters doesn`t match the number of shards. %s vs %s' % (len(parameters), len(self.connections)))
+
+        timeout = self.timeout if timeout is None else timeout
+        if timeout is not None:
+            options['timeout'] = timeout
+
+        futures = [self._executor.submit(connection.sendSync, query, *shard_parameters, **options)
+                   for connection, shard_parameters in zip(self.connections, parameters)]
+
+        results, errors = [], {}
+        for index, future in enumerate(futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append(None)
+                errors[index] = e
+
+        if errors and not partial:
+            raise QScatterException('Query failed on %s of %s shards: %s' % (len(errors), len(futures), '; '.join('%s: %s' % item for item in errors.items())), results, errors)
+
+        if not merge_results:
+            return results
+
+        return merge([result for index, result in enumerate(results) if index not in errors])
+
+
+    def sendSync(self, query, *parameters, **options):
+        '''Executes the same query on all shards concurrently and returns the
+        merged result.
+
+        See :func:`.execute` for the list of supported options.
+
+        :returns: merged result
+
+        :raises: :class:`.QScatterException`
+        '''
+        return self.execute(query, [parameters] * len(self.connections), **options)
+
+
+    def __call__(self, *parameters, **options):
+        return self.sendSync(parameters[0], *parameters[1:], **options)
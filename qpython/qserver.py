@@ -0,0 +1,468 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import selectors
+import socket
+import struct
+import threading
+
+from qpython import MetaData, CONVERSION_OPTIONS
+from qpython.qtype import QException
+from qpython.qconnection import MessageType
+from qpython.qreader import QReader
+from qpython.qwriter import QWriter
+
+
+
+class QServerClient(object):
+    '''Represents a client connected to the :class:`.QServer`.
+
+    :Attributes:
+     - `address` - address of the client
+     - `username` (`string`) - username sent by the client
+     - `protocol_version` (`integer`) - negotiated version of the IPC protocol
+    '''
+
+    def __init__(self, server, connection, address):
+        self.address = address
+        self.username = None
+        self.protocol_version = None
+
+        self._server = server
+        self._connection = connection
+        self._inbound = bytearray()
+        self._outbound = bytearray()
+        self._writer = None
+        self._events = selectors.EVENT_READ
+        self._closed = False
+        self._lock = threading.RLock()
+
+
+    def __str__(self):
+        return '%s@%s' % (self.username, self.address) if self.username else str(self.address)
+
+
+    def is_connected(self):
+        '''Checks whether the client is still connected.
+
+        :returns: `boolean` -- ``True`` if the client is connected,
+                  ``False`` otherwise
+        '''
+        return not self._closed
+
+
+    def sendAsync(self, query, *parameters, **options):
+        '''Sends an asynchronous message to the client, e.g. a published
+        update. Can be called from any thread.
+
+        :Parameters:
+         - `query` - function name or data to be sent
+         - `parameters` (`list` or `None`) - parameters of the function
+        :Options:
+         - see :func:`.QWriter.write`
+        '''
+        self._send(([query] + list(parameters)) if parameters else query, MessageType.ASYNC, **options)
+
+
+    def _send(self, data, msg_type, **options):
+        # the writer keeps the state of the message being serialized, so
+        # responses and messages sent from other threads are written one by one
+        with self._lock:
+            if self._closed:
+                return
+
+            message = self._writer.write(data, msg_type, **self._server._options.union_dict(**options))
+            self._server._enqueue(self, message)
+
+
+
+class QServer(object):
+    '''In-process server speaking the kdb+ IPC protocol.
+
+    Accepts connections from :class:`.QConnection` (or q processes), performs
+    the server side of the handshake and dispatches received messages to
+    Python functions. Clients are served by a single thread multiplexing all
+    sockets with `selectors`.
+
+    Messages are dispatched as follows:
+     - if the message is a function name or a list starting with a function
+       name registered via :func:`.register`, the function is called with
+       the remaining list items as arguments,
+     - otherwise the `handler` is called with the :class:`.QServerClient`
+       and the decoded message.
+
+    The result of a synchronous message is sent back as the response, an
+    exception raised by the function is sent as a q error. The client which
+    sent the message being processed is available as :attr:`client`
+    (counterpart of q ``.z.w``).
+
+    The :class:`.QServer` class provides a context manager API which runs
+    the server in a background thread::
+
+        with qserver.QServer(port = 5000) as server:
+            server.register('add', lambda x, y: x + y)
+            with qconnection.QConnection('localhost', server.port) as q:
+                print(q.sendSync('add', 1, 2))
+
+    :Parameters:
+     - `host` (`string`) - interface to listen on
+     - `port` (`integer`) - port to listen on, ``0`` picks a free port
+     - `handler` (`callable` or `None`) - function called with the client and
+       the decoded message for messages not matching any registered function
+     - `authenticate` (`callable` or `None`) - function called with the
+       username and password of a connecting client, the connection is
+       rejected if it returns ``False``
+     - `encoding` (`string`) - string encoding for data serialization
+     - `reader_class` (subclass of `QReader`) - data deserializer
+     - `writer_class` (subclass of `QWriter`) - data serializer
+     - `on_connect` (`callable` or `None`) - function called with the
+       :class:`.QServerClient` once the handshake has been completed
+     - `on_disconnect` (`callable` or `None`) - function called with the
+       :class:`.QServerClient` once the connection has been closed
+    :Options:
+     - conversion options applied while decoding and encoding messages, see
+       :class:`.QConnection`
+    '''
+
+    MAX_PROTOCOL_VERSION = 6
+
+    def __init__(self, host = 'localhost', port = 0, handler = None, authenticate = None, encoding = 'latin-1', reader_class = QReader, writer_class = QWriter, on_connect = None, on_disconnect = None, **options):
+        self.host = host
+        self.port = port
+        self.handler = handler
+        self.authenticate = authenticate
+        self.on_connect = on_connect
+        self.on_disconnect = on_disconnect
+        self.client = None
+
+        self._encoding = encoding
+        self._reader = reader_class(None, encoding = encoding)
+        self._writer_class = writer_class
+        self._options = MetaData(**CONVERSION_OPTIONS.union_dict(**options))
+
+        self._functions = {}
+        self._clients = set()
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._selector = None
+        self._server = None
+        self._wakeup = None
+        self._thread = None
+        self._running = False
+
+
+    def __enter__(self):
+        self.start()
+        return self
+
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+    def __str__(self):
+        return 'QServer(:%s:%s)' % (self.host, self.port)
+
+
+    @property
+    def clients(self):
+        '''Retrieves connected clients.
+
+        :returns: `list` of :class:`.QServerClient`
+        '''
+        with self._lock:
+            return list(self._clients)
+
+
+    def register(self, name, function):
+        '''Registers a function callable by clients.
+
+        :Parameters:
+         - `name` (`string`) - name of the function, e.g. ``'.u.upd'``
+         - `function` (`callable`) - Python function
+        '''
+        self._functions[name] = function
+
+
+    def open(self):
+        '''Starts listening for connections.
+
+        If `port` is ``0`` the actual port is available via `port` attribute
+        afterwards.
+        '''
+        if self._server:
+            return
+
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind((self.host, self.port))
+        self._server.listen(128)
+        self._server.setblocking(False)
+        self.port = self._server.getsockname()[1]
+
+        # wakes up the loop when messages are queued by other threads
+        self._wakeup, self._wakeup_writer = socket.socketpair()
+        self._wakeup.setblocking(False)
+        self._wakeup_writer.setblocking(False)
+
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self._server, selectors.EVENT_READ)
+        self._selector.register(self._wakeup, selectors.EVENT_READ)
+
+
+    def start(self):
+        '''Starts serving clients in a background thread.'''
+        self.open()
+        self._running = True
+        self._thread = threading.Thread(target = self.serve_forever, name = 'QServer', daemon = True)
+        self._thread.start()
+
+
+    def stop(self):
+        '''Stops the server and disconnects all clients.'''
+        self._running = False
+        if self._thread:
+            self._wake()
+            self._thread.join()
+            self._thread = None
+        self.close()
+
+
+    def close(self):
+        '''Closes the listening socket and all client connections.'''
+        for client in self.clients:
+            self._disconnect(client)
+
+        if self._server:
+            self._selector.close()
+            self._server.close()
+            self._wakeup.close()
+            self._wakeup_writer.close()
+            self._server = None
+            self._selector = None
+
+
+    def serve_forever(self):
+        '''Serves clients until :func:`.stop` is called.'''
+        self.open()
+        self._running = True
+        while self._running:
+            self.serve_once()
+
+
+    def serve_once(self, timeout = None):
+        '''Processes pending network events.
+
+        :Parameters:
+         - `timeout` (`nonnegative float` or `None`) - maximum time to wait
+           for an event, ``None`` waits indefinitely
+        '''
+        for key, events in self._selector.select(timeout):
+            if key.fileobj is self._server:
+                self._accept()
+            elif key.fileobj is self._wakeup:
+                self._drain_wakeup()
+            else:
+                client = key.data
+                if events & selectors.EVENT_READ:
+                    self._read(client)
+                if events & selectors.EVENT_WRITE and not client._closed:
+                    self._flush(client)
+
+
+    def _wake(self):
+        try:
+            self._wakeup_writer.send(b'\0')
+        except (AttributeError, OSError):
+            pass
+
+
+    def _drain_wakeup(self):
+        try:
+            while self._wakeup.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+
+        with self._lock:
+            pending, self._pending = self._pending, set()
+        for client in pending:
+            if not client._closed:
+                self._flush(client)
+
+
+    def _accept(self):
+        try:
+            connection, address = self._server.accept()
+        except BlockingIOError:
+            return
+
+        connection.setblocking(False)
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        client = QServerClient(self, connection, address)
+        self._selector.register(connection, selectors.EVENT_READ, client)
+
+
+    def _read(self, client):
+        try:
+            data = client._connection.recv(1 << 16)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b''
+
+        if not data:
+            self._disconnect(client)
+            return
+
+        client._inbound += data
+        if client.protocol_version is None:
+            self._handshake(client)
+
+        while client.protocol_version is not None and not client._closed:
+            message = self._next_message(client)
+            if message is None:
+                break
+            self._dispatch(client, message)
+
+
+    def _handshake(self, client):
+        '''Performs the server side of the IPC protocol handshake.'''
+        end = client._inbound.find(b'\0')
+        if end < 0:
+            return
+
+        credentials = bytes(client._inbound[:end])
+        del client._inbound[:end + 1]
+
+        # capability byte follows the credentials, not sent by old clients
+        version = 0
+        if credentials and credentials[-1] < 32:
+            version = credentials[-1]
+            credentials = credentials[:-1]
+
+        username, _, password = credentials.decode(self._encoding).partition(':')
+        if self.authenticate and not self.authenticate(username, password):
+            self._disconnect(client)
+            return
+
+        client.username = username
+        client.protocol_version = min(version, self.MAX_PROTOCOL_VERSION)
+        client._writer = self._writer_class(None, protocol_version = client.protocol_version, encoding = self._encoding)
+        with self._lock:
+            self._clients.add(client)
+
+        self._enqueue(client, struct.pack('B', client.protocol_version))
+        if self.on_connect:
+            self.on_connect(client)
+
+
+    def _next_message(self, client):
+        inbound = client._inbound
+        if len(inbound) < 8:
+            return None
+
+        size = struct.unpack('<I' if inbound[0] == 1 else '>I', inbound[4:8])[0] + (inbound[3] << 32)
+        if len(inbound) < size:
+            return None
+
+        message = bytes(inbound[:size])
+        del inbound[:size]
+        return message
+
+
+    def _dispatch(self, client, message):
+        msg_type = message[1]
+        self.client = client
+        try:
+            try:
+                data = self._reader.read(source = message, **self._options.as_dict()).data
+                result = self._call(client, data)
+            except Exception as e:
+                result = e if isinstance(e, QException) else QException(str(e))
+        finally:
+            self.client = None
+
+        if msg_type == MessageType.SYNC:
+            try:
+                client._send(result, MessageType.RESPONSE)
+            except Exception as e:
+                client._send(QException('type: %s' % e), MessageType.RESPONSE)
+
+
+    def _call(self, client, data):
+        if isinstance(data, str) and data in self._functions:
+            return self._functions[data]()
+
+        if isinstance(data, list) and data and isinstance(data[0], str) and data[0] in self._functions:
+            return self._functions[data[0]](*data[1:])
+
+        if self.handler:
+            return self.handler(client, data)
+
+        raise QException('nyi')
+
+
+    def _enqueue(self, client, message):
+        with self._lock:
+            client._outbound += message
+
+        if self._thread is threading.current_thread() or not self._running:
+            self._flush(client)
+        else:
+            with self._lock:
+                self._pending.add(client)
+            self._wake()
+
+
+    def _flush(self, client):
+        with self._lock:
+            try:
+                sent = client._connection.send(client._outbound) if client._outbound else 0
+            except BlockingIOError:
+                sent = 0
+            except OSError:
+                sent = -1
+            if sent > 0:
+                del client._outbound[:sent]
+            pending = len(client._outbound) > 0
+
+        if sent < 0:
+            self._disconnect(client)
+        elif not client._closed:
+            events = selectors.EVENT_READ | (selectors.EVENT_WRITE if pending else 0)
+            if events != client._events:
+                client._events = events
+                self._selector.modify(client._connection, events, client)
+
+
+    def _disconnect(self, client):
+        if client._closed:
+            return
+
+        client._closed = True
+        with self._lock:
+            known = client in self._clients
+            self._clients.discard(client)
+
+        try:
+            self._selector.unregister(client._connection)
+        except (KeyError, ValueError):
+            pass
+        client._connection.close()
+
+        if known and self.on_disconnect:
+            self.on_disconnect(client)
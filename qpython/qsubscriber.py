@@ -0,0 +1,363 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import queue
+import socket
+import threading
+import time
+
+import numpy
+
+from qpython import MetaData
+from qpython.qtype import QException, QSYMBOL_LIST
+from qpython.qcollection import qlist
+
+
+
+class OverflowPolicy(object):
+    '''Enumeration defining behaviour of a :class:`.QSubscriber` when its
+    update queue is full.'''
+    # stop reading from the connection until handlers catch up, the publisher
+    # buffers further updates
+    BLOCK = 0
+    # discard the incoming update
+    DROP_NEWEST = 1
+    # discard the oldest queued update
+    DROP_OLDEST = 2
+
+
+
+# marks the end of the update stream
+_STOP = object()
+
+
+
+def _to_name(value, encoding):
+    if isinstance(value, bytes):
+        return value.decode(encoding)
+    return str(value)
+
+
+
+class QSubscriber(object):
+    '''Receives updates published by a q service (e.g. a tickerplant) in the
+    background and delivers them to per-table handlers.
+
+    Messages are read by a receiving thread and passed through a bounded queue
+    to a dispatching thread which invokes handlers. ``upd`` messages
+    (``(`upd; `table; data)``) are routed to the handler registered for the
+    table, all other messages are passed to the `default_handler` with table
+    name ``None``.
+
+    Handlers are called with the table name and a `list` of updates. Updates
+    are grouped into micro-batches of up to `batch_size` updates; with
+    `batch_interval` set, incomplete batches are delivered once their oldest
+    update is `batch_interval` seconds old.
+
+    The :class:`.QSubscriber` class provides a context manager API::
+
+        def on_trade(table, updates):
+            for update in updates:
+                print(update)
+
+        q = qconnection.QConnection(host = 'localhost', port = 17010)
+        q.open()
+        subscriber = qsubscriber.QSubscriber(q, batch_size = 100, batch_interval = 0.05)
+        print(subscriber.subscribe('trade', handler = on_trade))
+
+        with subscriber:
+            ...
+
+    The publisher keeps pushing updates to the subscribed connection, hence
+    stopping the subscriber closes the connection.
+
+    :Parameters:
+     - `connection` (:class:`.QConnection`) - connection to the publisher
+     - `batch_size` (`integer`) - maximum number of updates delivered in a
+       single handler call
+     - `batch_interval` (`nonnegative float` or `None`) - maximum time (in
+       seconds) an update waits for its batch to be completed, ``None``
+       delivers only complete batches
+     - `queue_size` (`integer`) - maximum number of received updates waiting
+       for delivery
+     - `overflow` (one of the constants defined in :class:`.OverflowPolicy`) -
+       behaviour when the queue is full
+     - `default_handler` (`callable` or `None`) - handler for updates of
+       tables without handler and other messages
+     - `update_function` (`string`) - name of the update function used by
+       the publisher
+    :Options:
+     - conversion options applied while parsing received messages, see
+       :class:`.QConnection`
+    '''
+
+    def __init__(self, connection, batch_size = 1, batch_interval = None, queue_size = 10000, overflow = OverflowPolicy.BLOCK, default_handler = None, update_function = 'upd', **options):
+        if batch_size < 1:
+            raise ValueError('Batch size has to be positive, got: %s' % batch_size)
+
+        self.connection = connection
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.overflow = overflow
+        self.default_handler = default_handler
+        self.update_function = update_function
+
+        self._options = options
+        self._handlers = {}
+        self._subscriptions = []
+        self._queue = queue.Queue(queue_size)
+        self._stopping = threading.Event()
+        self._receiver = None
+        self._dispatcher = None
+
+        self.error = None
+        self._received = 0
+        self._delivered = 0
+        self._dropped = 0
+        self._handler_errors = 0
+
+
+    def __enter__(self):
+        self.start()
+        return self
+
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+    def is_running(self):
+        '''Checks whether the subscriber receives updates.
+
+        :returns: `boolean` -- ``True`` if the receiving thread is running,
+                  ``False`` otherwise
+        '''
+        return self._receiver is not None and self._receiver.is_alive()
+
+
+    @property
+    def stats(self):
+        '''Retrieves subscriber statistics.
+
+        Following attributes are reported:
+         - `received` - number of received messages
+         - `delivered` - number of updates passed to handlers
+         - `dropped` - number of updates discarded due to the overflow policy
+         - `queued` - number of updates waiting for delivery
+         - `handler_errors` - number of exceptions raised by handlers
+
+        :returns: `MetaData` -- subscriber statistics
+        '''
+        return MetaData(received = self._received,
+                        delivered = self._delivered,
+                        dropped = self._dropped,
+                        queued = self._queue.qsize(),
+                        handler_errors = self._handler_errors)
+
+
+    def add_handler(self, table, handler):
+        '''Registers a handler for updates of the given table.
+
+        :Parameters:
+         - `table` (`string`) - table name
+         - `handler` (`callable`) - function accepting the table name and a
+           `list` of updates
+        '''
+        self._handlers[table] = handler
+
+
+    def subscribe(self, table, symbols = '', handler = None):
+        '''Subscribes for updates of the given table via ``.u.sub``.
+
+        The subscription is restored whenever the connection is
+        re-established by its reconnect policy.
+
+        :Parameters:
+         - `table` (`string`) - table name, ``''`` subscribes all tables
+         - `symbols` (`string` or `list` of `string`) - symbols to subscribe,
+           ``''`` subscribes all symbols
+         - `handler` (`callable` or `None`) - handler for the table updates
+
+        :returns: ``.u.sub`` response (table name and schema) if the
+                  subscriber hasn't been started yet, otherwise the
+                  subscription is sent asynchronously and ``None`` is returned
+
+        :raises: :class:`.QConnectionException`, :class:`.QWriterException`,
+                 :class:`.QReaderException`
+        '''
+        if handler:
+            self.add_handler(table, handler)
+
+        self._subscriptions.append((table, symbols))
+        if self.is_running():
+            # responses are consumed by the receiving thread
+            self.connection.sendAsync('.u.sub', *self._subscription_parameters(table, symbols))
+        else:
+            return self.connection.sendSync('.u.sub', *self._subscription_parameters(table, symbols))
+
+
+    def _subscription_parameters(self, table, symbols):
+        encoding = self.connection._encoding
+        if isinstance(symbols, str):
+            symbols = numpy.bytes_(symbols.encode(encoding))
+        else:
+            symbols = qlist([symbol.encode(encoding) for symbol in symbols], qtype = QSYMBOL_LIST)
+        return numpy.bytes_(table.encode(encoding)), symbols
+
+
+    def _resubscribe(self, connection):
+        for table, symbols in self._subscriptions:
+            connection.sendAsync('.u.sub', *self._subscription_parameters(table, symbols))
+
+
+    def start(self):
+        '''Starts the receiving and dispatching threads.'''
+        if self._receiver:
+            return
+
+        self._stopping.clear()
+        self.connection.add_reconnect_hook(self._resubscribe)
+
+        self._dispatcher = threading.Thread(target = self._dispatch_loop, name = 'QSubscriber-dispatcher', daemon = True)
+        self._receiver = threading.Thread(target = self._receive_loop, name = 'QSubscriber-receiver', daemon = True)
+        self._dispatcher.start()
+        self._receiver.start()
+
+
+    def stop(self, timeout = None):
+        '''Stops receiving updates, delivers the queued ones and closes the
+        connection.
+
+        :Parameters:
+         - `timeout` (`nonnegative float` or `None`) - maximum time to wait for
+           each of the threads to finish
+        '''
+        if not self._receiver:
+            return
+
+        self._stopping.set()
+        try:
+            # wake up the receiving thread blocked on the socket
+            self.connection._connection.shutdown(socket.SHUT_RDWR)
+        except (AttributeError, OSError):
+            pass
+
+        self._receiver.join(timeout)
+        self._dispatcher.join(timeout)
+        self._receiver = None
+        self._dispatcher = None
+
+        self.connection.remove_reconnect_hook(self._resubscribe)
+        self.connection.close()
+
+
+    def _receive_loop(self):
+        connection = self.connection
+        try:
+            while not self._stopping.is_set():
+                try:
+                    # frames left by timed out queries are handled by the connection
+                    message = connection._read(**self._options)
+                except QException:
+                    # error pushed by the publisher
+                    continue
+                except Exception as e:
+                    if self._stopping.is_set():
+                        break
+                    if not connection._is_connection_lost(e):
+                        raise
+                    connection.reconnect()
+                    continue
+
+                self._received += 1
+                self._enqueue(self._route(message.data))
+        except Exception as e:
+            self.error = e
+        finally:
+            self._queue.put(_STOP)
+
+
+    def _route(self, data):
+        '''Extracts the table name and the update from a received message.'''
+        encoding = self.connection._encoding
+        if isinstance(data, (list, tuple)) and len(data) == 3 and _to_name(data[0], encoding) == self.update_function:
+            return _to_name(data[1], encoding), data[2]
+        return None, data
+
+
+    def _enqueue(self, update):
+        if self.overflow == OverflowPolicy.BLOCK:
+            self._queue.put(update)
+            return
+
+        while True:
+            try:
+                self._queue.put_nowait(update)
+                return
+            except queue.Full:
+                self._dropped += 1
+                if self.overflow == OverflowPolicy.DROP_NEWEST:
+                    return
+
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                pass
+
+
+    def _dispatch_loop(self):
+        # table -> (time of the oldest update, updates)
+        batches = {}
+        while True:
+            timeout = None
+            if self.batch_interval is not None and batches:
+                oldest = min(started for started, _ in batches.values())
+                timeout = max(0., oldest + self.batch_interval - time.monotonic())
+
+            try:
+                update = self._queue.get(timeout = timeout)
+            except queue.Empty:
+                update = None
+
+            if update is _STOP:
+                for table in list(batches):
+                    self._deliver(table, batches.pop(table)[1])
+                return
+
+            if update is not None:
+                table, data = update
+                batch = batches.setdefault(table, (time.monotonic(), []))[1]
+                batch.append(data)
+                if len(batch) >= self.batch_size:
+                    self._deliver(table, batches.pop(table)[1])
+
+            if self.batch_interval is not None:
+                now = time.monotonic()
+                for table in [table for table, (started, _) in batches.items() if now - started >= self.batch_interval]:
+                    self._deliver(table, batches.pop(table)[1])
+
+
+    def _deliver(self, table, updates):
+        handler = self._handlers.get(table, self.default_handler)
+        self._delivered += len(updates)
+        if not handler:
+            return
+
+        try:
+            handler(table, updates)
+        except Exception as e:
+            self._handler_errors += 1
+            self.error = e
@@ -157,6 +157,9 @@ QERROR              = -0x80
 
 ATOM_SIZE = ( 0, 1, 16, 0, 1, 2, 4, 8, 4, 8, 1, 0, 8, 4, 4, 8, 8, 4, 4, 4 )
 
+# raw representation of guid vectors
+GUID_RAW_TYPE = numpy.dtype('V16')
+
 
 
 # mapping of q atoms to corresponding Python types
@@ -22,10 +22,16 @@ except ImportError:
 
 from qpython import MetaData, CONVERSION_OPTIONS
 from qpython.qtype import *  # @UnusedWildImport
-from qpython.qcollection import qlist, QList, QTemporalList, QDictionary, QTable, QKeyedTable, get_list_qtype
+from qpython.qcollection import qlist, QList, QTemporalList, QGuidList, QDictionary, QTable, QColumnarTable, QKeyedTable, get_list_qtype
 from qpython.qtemporal import QTemporal, to_raw_qtemporal, array_to_raw_qtemporal
 
 
+try:
+    from qpython.fastutils import compress
+except:
+    from qpython.utils import compress
+
+
 class QWriterException(Exception):
     '''
     Indicates an error raised during data serialization.
@@ -36,6 +42,23 @@ class QWriterException(Exception):
 
 ENDIANNESS = '\1' if sys.byteorder == 'little' else '\0'
 
+# size of the message prefix compressed to estimate compression ratio
+COMPRESSION_SAMPLE_SIZE = 64 * 1024
+
+# maximal size of a message supported by kdb+ prior to v4.0 (protocol
+# version 6), larger messages are compressed with compression mode 2
+MAX_MESSAGE_SIZE = 2 ** 31 - 1
+
+# size of chunks in which large vectors are serialized and messages are sent
+CHUNK_SIZE = 64 * 1024 * 1024
+
+
+def _pack_size(size):
+    '''Packs message size: the size extension byte followed by lower 32 bits
+    of the size.'''
+    return struct.pack('=BI', size >> 32, size & 0xffffffff)
+
+
 
 class QWriter(object):
     '''
@@ -72,9 +95,21 @@ class QWriter(object):
          - `single_char_strings` (`boolean`) - if ``True`` single char Python 
            strings are encoded as q strings instead of chars, 
            **Default**: ``False``
+         - `compress` (`boolean`) - if ``True`` messages larger than
+           `compress_threshold` are compressed with the kdb+ IPC compression
+           algorithm, **Default**: ``False``
+         - `compress_threshold` (`integer`) - minimal size of a message (in
+           bytes) to be compressed, **Default**: ``2000``
+         - `compress_adaptive` (`boolean`) - if ``True`` a prefix of the
+           message is compressed first and compression is skipped if the
+           sample doesn't compress well, **Default**: ``False``
+        
+        Messages larger than 2GB require protocol version 6 (kdb+ v4.0+).
         
         :returns: if wraped stream is ``None`` serialized data, 
                   otherwise ``None`` 
+        
+        :raises: :class:`.QWriterException`
         '''
         self._buffer = BytesIO()
 
@@ -87,14 +122,48 @@ class QWriter(object):
 
         # update message size
         data_size = self._buffer.tell()
-        self._buffer.seek(4)
-        self._buffer.write(struct.pack('i', data_size))
+        self._buffer.seek(3)
+        self._buffer.write(_pack_size(data_size))
+
+        # avoid copying the serialized message when sending it to the socket
+        data = self._buffer.getbuffer() if self._stream else self._buffer.getvalue()
+        if self._options.compress and data_size > self._options.compress_threshold:
+            data = self._compress(data)
+
+        # the limit applies to the message being sent
+        if len(data) > MAX_MESSAGE_SIZE and self._protocol_version < 6:
+            raise QWriterException('kdb+ protocol version violation: messages larger than 2GB not supported pre kdb+ v4.0')
 
         # write data to socket
         if self._stream:
-            self._stream.sendall(self._buffer.getvalue())
+            self._send(data)
         else:
-            return self._buffer.getvalue()
+            return data
+
+
+    def _compress(self, data):
+        '''Compresses serialized message, returns the message unchanged if it
+        cannot be compressed at least by half.'''
+        message = numpy.frombuffer(data, dtype = numpy.uint8)
+        if len(message) > MAX_MESSAGE_SIZE and self._protocol_version < 6:
+            # uncompressed size doesn't fit the header of compression mode 1
+            return data
+
+        if self._options.compress_adaptive and len(message) > 2 * COMPRESSION_SAMPLE_SIZE:
+            sample = numpy.array(message[:COMPRESSION_SAMPLE_SIZE])
+            sample[3:8] = numpy.frombuffer(_pack_size(COMPRESSION_SAMPLE_SIZE), dtype = numpy.uint8)
+            if compress(sample) is None:
+                return data
+
+        compressed = compress(message, 2 if len(message) > MAX_MESSAGE_SIZE else 1)
+        return data if compressed is None else compressed.tobytes()
+
+
+    def _send(self, data):
+        '''Sends serialized message to the wrapped stream in chunks.'''
+        data = memoryview(data)
+        for offset in range(0, len(data), CHUNK_SIZE):
+            self._stream.sendall(data[offset:offset + CHUNK_SIZE])
 
 
     def _write(self, data):
@@ -238,7 +307,7 @@ class QWriter(object):
         self._write(data.values)
 
 
-    @serialize(QTable)
+    @serialize(QTable, QColumnarTable)
     def _write_table(self, data):
         self._buffer.write(struct.pack('=bxb', QTABLE, QDICTIONARY))
         self._write(qlist(numpy.array(data.dtype.names), qtype = QSYMBOL_LIST))
@@ -247,7 +316,7 @@ class QWriter(object):
             self._write_list(data[column], data.meta[column])
 
 
-    @serialize(numpy.ndarray, QList, QTemporalList)
+    @serialize(numpy.ndarray, QList, QTemporalList, QGuidList)
     def _write_list(self, data, qtype = None):
         if qtype is not None:
             qtype = -abs(qtype)
@@ -277,8 +346,24 @@ class QWriter(object):
                 if self._protocol_version < 3:
                     raise QWriterException('kdb+ protocol version violation: Guid not supported pre kdb+ v3.0')
 
-                for guid in data:
-                    self._buffer.write(guid.bytes)
+                if data.dtype == GUID_RAW_TYPE:
+                    self._write_array(data)
+                else:
+                    self._buffer.write(b''.join(guid.bytes for guid in data))
             else:
-                self._buffer.write(data.tobytes())
+                self._write_array(data)
+
+
+    def _write_array(self, data):
+        '''Writes raw vector data. Contiguous vectors are written directly,
+        other vectors (e.g. columns of :class:`.QTable`) are copied, in chunks
+        for large vectors to avoid a temporary copy of the whole vector.'''
+        if data.flags.c_contiguous:
+            self._buffer.write(data.data)
+        elif data.nbytes <= CHUNK_SIZE:
+            self._buffer.write(data.tobytes())
+        else:
+            step = max(1, CHUNK_SIZE // data.itemsize)
+            for offset in range(0, len(data), step):
+                self._buffer.write(data[offset:offset + step].tobytes())
 
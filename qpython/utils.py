@@ -71,3 +71,82 @@ def uncompress(data, uncompressed_size):
             i += i
 
     return uncompressed
+
+
+
+def compress(data, compression_mode = 1):
+    '''Compresses an IPC message according to the kdb+ compression algorithm.
+
+    :Parameters:
+     - `data` (`numpy.ndarray` of `uint8`) - serialized message including
+       the 8 bytes header
+     - `compression_mode` (`int`) - 1 for messages <2GB, 2 for larger ones
+       (the uncompressed size is stored as a 64-bit integer)
+
+    :returns: `numpy.ndarray` of `uint8` - compressed message including the
+              header or ``None`` if compression doesn't reduce the message
+              size at least by half
+    '''
+    y = data.tobytes()
+    t = len(y)
+    e = t // 2
+    compressed = numpy.zeros(e, dtype = numpy.uint8)
+    compressed[:4] = data[:4]
+    compressed[2] = compression_mode
+
+    ptrs = [0] * 256
+    c, d, s = (12, 12, 8) if compression_mode == 1 else (16, 16, 8)
+    f, h, h0, s0, i = 0, 0, 0, 0, 0
+
+    while s < t:
+        if i == 0:
+            if d > e - 17:
+                return None
+            i = 1
+            compressed[c] = f
+            c = d
+            d += 1
+            f = 0
+
+        g = s > t - 3
+        if not g:
+            h = y[s] ^ y[s + 1]
+            p = ptrs[h]
+            g = p == 0 or y[s] != y[p]
+
+        if s0 > 0:
+            ptrs[h0] = s0
+            s0 = 0
+
+        if g:
+            h0 = h
+            s0 = s
+            compressed[d] = y[s]
+            d += 1
+            s += 1
+        else:
+            ptrs[h] = s
+            f |= i
+            p += 2
+            s += 2
+            r = s
+            q = min(s + 255, t)
+            while y[s] == y[p]:
+                s += 1
+                if s >= q:
+                    break
+                p += 1
+            compressed[d] = h
+            compressed[d + 1] = s - r
+            d += 2
+
+        i = (i << 1) & 0xff
+
+    compressed[c] = f
+    compressed[3] = d >> 32
+    compressed[4:8] = numpy.frombuffer(numpy.uint32(d & 0xffffffff).tobytes(), dtype = numpy.uint8)
+    if compression_mode == 1:
+        compressed[8:12] = numpy.frombuffer(numpy.int32(t).tobytes(), dtype = numpy.uint8)
+    else:
+        compressed[8:16] = numpy.frombuffer(numpy.int64(t).tobytes(), dtype = numpy.uint8)
+    return compressed[:d]
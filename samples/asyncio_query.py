@@ -0,0 +1,39 @@
+# 
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+# 
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+# 
+#    http://www.apache.org/licenses/LICENSE-2.0
+# 
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+# 
+
+import asyncio
+import numpy
+
+from qpython.qasyncconnection import AsyncQConnection
+
+
+async def main():
+    async with AsyncQConnection(host = 'localhost', port = 5000) as q:
+        print(q)
+        print('IPC version: %s. Is connected: %s' % (q.protocol_version, q.is_connected()))
+
+        # queries are written back-to-back and responses are matched in order
+        results = await asyncio.gather(*[q.sendSync('{x * til 3}', numpy.int64(x)) for x in range(10)])
+        for data in results:
+            print('type: %s, numpy.dtype: %s, meta.qtype: %s, data: %s ' % (type(data), data.dtype, data.meta.qtype, data))
+
+        # subscribe and receive messages pushed by the q service
+        await q.sendAsync('{[x] (neg .z.w) x}', numpy.int64(42))
+        print(await q.receive())
+
+
+if __name__ == '__main__':
+    asyncio.get_event_loop().run_until_complete(main())
@@ -0,0 +1,49 @@
+# 
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+# 
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+# 
+#    http://www.apache.org/licenses/LICENSE-2.0
+# 
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+# 
+
+import numpy
+import time
+
+from qpython import qconnection, qserver
+from qpython.qcollection import qlist
+from qpython.qtype import QLONG_LIST
+
+
+if __name__ == '__main__':
+    # in-process stand-in for a q service
+    with qserver.QServer(port = 0) as server:
+        server.register('echo', lambda x: x)
+
+        with qconnection.QConnection(host = 'localhost', port = server.port) as q:
+            print(q)
+            print('IPC version: %s. Is connected: %s' % (q.protocol_version, q.is_connected()))
+
+            for size in (1, 1000, 1000000):
+                data = qlist(numpy.arange(size), qtype = QLONG_LIST)
+                count = max(10, 100000 // size)
+
+                started = time.perf_counter()
+                for _ in range(count):
+                    q.sendSync('echo', data)
+                elapsed = time.perf_counter() - started
+                print('sendSync %8s longs: %8.1f us/query, %8.1f MB/s' % (size, elapsed / count * 1e6, 2 * 8 * size * count / elapsed / 1e6))
+
+                started = time.perf_counter()
+                with q.pipeline(window = 100) as p:
+                    for _ in range(count):
+                        p.sendSync('echo', data)
+                elapsed = time.perf_counter() - started
+                print('pipeline %8s longs: %8.1f us/query' % (size, elapsed / count * 1e6))
@@ -0,0 +1,136 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import datetime
+import socket
+
+from qpython.qtype import *  # @UnusedWildImport
+from qpython.qcollection import qlist, qtable, QList, QDictionary, QKeyedTable
+from qpython.qwriter import QWriter
+
+
+
+try:
+    import pyarrow
+    from qpython._arrow import ArrowQReader
+
+    def read(data, **options):
+        return ArrowQReader(None).read(source = QWriter(None, 3).write(data, 1), arrow = True, **options).data
+
+
+    def test_reading_vectors():
+        assert read(qlist(numpy.array([1, qnull(QLONG), 3]), qtype = QLONG_LIST)).to_pylist() == [1, None, 3]
+        assert read(qlist(numpy.array([1, qnull(QSHORT)], dtype = numpy.int16), qtype = QSHORT_LIST)).type == pyarrow.int16()
+        assert read(qlist(numpy.array([1.5, numpy.nan]), qtype = QDOUBLE_LIST)).to_pylist() == [1.5, None]
+        assert read(qlist(numpy.array([True, False]), qtype = QBOOL_LIST)).to_pylist() == [True, False]
+        assert read(qlist(numpy.array([1, -1], dtype = numpy.int8), qtype = QBYTE_LIST)).to_pylist() == [1, 255]
+
+        guid = uuid.UUID('8c680a01-5a49-5aab-5a65-d4bfddb6a661')
+        assert read(qlist(numpy.array([guid, qnull(QGUID)]), qtype = QGUID_LIST)).to_pylist() == [guid.bytes, None]
+
+        symbols = read(qlist(numpy.array([b'b', b'', b'a', b'b']), qtype = QSYMBOL_LIST))
+        assert isinstance(symbols, pyarrow.DictionaryArray)
+        assert symbols.to_pylist() == ['b', None, 'a', 'b'] and len(symbols.dictionary) == 3
+
+        strings = read([b'abc', b'', b'de'])
+        assert isinstance(strings, pyarrow.StringArray) and strings.to_pylist() == ['abc', '', 'de']
+        # mixed lists are kept as lists
+        assert read([b'abc', numpy.int64(1)])[1] == 1
+
+        assert read(numpy.int64(5)) == 5
+
+
+    def test_reading_temporals():
+        assert read(qlist(numpy.array([366, qnull(QDATE)]), qtype = QDATE_LIST)).to_pylist() == [datetime.date(2001, 1, 1), None]
+        assert read(qlist(numpy.array([1, qnull(QMONTH)]), qtype = QMONTH_LIST)).to_pylist() == [datetime.date(2000, 2, 1), None]
+        assert read(qlist(numpy.array([0.5, numpy.nan]), qtype = QDATETIME_LIST)).to_pylist() == [datetime.datetime(2000, 1, 1, 12), None]
+        assert read(qlist(numpy.array([61, qnull(QMINUTE)]), qtype = QMINUTE_LIST)).to_pylist() == [datetime.time(1, 1), None]
+        assert read(qlist(numpy.array([61, qnull(QSECOND)]), qtype = QSECOND_LIST)).to_pylist() == [datetime.time(0, 1, 1), None]
+        assert read(qlist(numpy.array([61001, qnull(QTIME)]), qtype = QTIME_LIST)).to_pylist() == [datetime.time(0, 1, 1, 1000), None]
+
+        timestamps = read(qlist(numpy.array([10 ** 9, qnull(QTIMESTAMP)]), qtype = QTIMESTAMP_LIST))
+        assert timestamps.type == pyarrow.timestamp('ns') and timestamps.null_count == 1
+        assert timestamps.cast(pyarrow.int64())[0].as_py() == (10957 * 86400 + 1) * 10 ** 9
+
+        timespans = read(qlist(numpy.array([10 ** 9, qnull(QTIMESPAN)]), qtype = QTIMESPAN_LIST))
+        assert timespans.type == pyarrow.duration('ns') and timespans.to_pylist() == [datetime.timedelta(seconds = 1), None]
+
+
+    def test_reading_tables():
+        table = qtable(['sym', 'price', 'size', 'comment', 'levels'],
+                       [qlist(numpy.array([b'AAPL', b'MSFT', b'AAPL']), qtype = QSYMBOL_LIST),
+                        qlist(numpy.array([1.5, numpy.nan, 3.5]), qtype = QDOUBLE_LIST),
+                        qlist(numpy.array([100, 200, qnull(QLONG)]), qtype = QLONG_LIST),
+                        [b'first', b'', b'third'],
+                        [qlist(numpy.array([1, 2]), qtype = QLONG_LIST), qlist(numpy.array([3]), qtype = QLONG_LIST), qlist(numpy.array([], dtype = numpy.int64), qtype = QLONG_LIST)]])
+        message = QWriter(None, 3).write(table, 1)
+
+        result = ArrowQReader(None).read(source = message, arrow = True).data
+        assert isinstance(result, pyarrow.Table)
+        assert result.column_names == ['sym', 'price', 'size', 'comment', 'levels']
+        assert result.to_pydict() == {'sym': ['AAPL', 'MSFT', 'AAPL'], 'price': [1.5, None, 3.5], 'size': [100, 200, None],
+                                      'comment': ['first', '', 'third'], 'levels': [[1, 2], [3], []]}
+
+        # fixed width columns wrap the receive buffer in the zero-copy mode
+        left, right = socket.socketpair()
+        try:
+            left.sendall(message)
+            reader = ArrowQReader(right)
+            address = reader.read(arrow = True).data.column('price').chunk(0).buffers()[1].address
+            buffer = numpy.frombuffer(reader._recv_buffer, dtype = numpy.uint8)
+            assert buffer.ctypes.data <= address < buffer.ctypes.data + len(buffer)
+        finally:
+            left.close()
+            right.close()
+
+        assert ArrowQReader(None).read(source = message, arrow = True, columns = ['size']).data.column_names == ['size']
+        assert ArrowQReader(None).read(source = message, arrow = True, lazy_tables = True).data['price'].to_pylist() == [1.5, None, 3.5]
+
+        keyed = QKeyedTable(qtable(['id'], [qlist(numpy.array([1, 2]), qtype = QLONG_LIST)]),
+                            qtable(['name'], [qlist(numpy.array([b'a', b'b']), qtype = QSYMBOL_LIST)]))
+        result = read(keyed)
+        assert result.to_pydict() == {'id': [1, 2], 'name': ['a', 'b']}
+        assert result.schema.metadata[b'keys'] == b'["id"]'
+
+        dictionary = read(QDictionary(qlist(numpy.array([1, 2]), qtype = QLONG_LIST), qlist(numpy.array([b'a', b'b']), qtype = QSYMBOL_LIST)))
+        assert isinstance(dictionary, QDictionary) and list(dictionary.keys) == [1, 2] and list(dictionary.values) == ['a', 'b']
+
+        # general lists of short atoms at the end of the message
+        assert read([True, False]) == [True, False]
+        assert read([numpy.int8(1), numpy.bytes_(b'a')]) == [1, 'a']
+
+        # arrow mode is disabled by default
+        assert isinstance(ArrowQReader(None).read(source = message).data['price'], numpy.ndarray)
+        assert isinstance(ArrowQReader(None).read(source = QWriter(None, 3).write(qlist(numpy.array([1, 2]), qtype = QLONG_LIST), 1)).data, QList)
+
+
+    def test_reader_selection():
+        from qpython.qconnection import QConnection
+        from qpython.qasyncconnection import AsyncQConnection
+
+        # the arrow reader is used only if the arrow mode is requested
+        for connection_class in (QConnection, AsyncQConnection):
+            assert not issubclass(connection_class(host = 'localhost', port = 5000)._reader_class, ArrowQReader)
+            assert connection_class(host = 'localhost', port = 5000, arrow = True)._reader_class is ArrowQReader
+            assert connection_class(host = 'localhost', port = 5000, reader_class = ArrowQReader)._reader_class is ArrowQReader
+
+
+    test_reading_vectors()
+    test_reading_temporals()
+    test_reading_tables()
+    test_reader_selection()
+except ImportError:
+    pyarrow = None
@@ -26,8 +26,9 @@ from collections import OrderedDict
 from qpython import MetaData
 from qpython._pandas import PandasQReader, PandasQWriter
 from qpython.qtype import *  # @UnusedWildImport
-from qpython.qcollection import qlist, QList, QTemporalList, QDictionary
+from qpython.qcollection import qlist, qtable, QList, QTemporalList, QDictionary
 from qpython.qtemporal import QTemporal
+from qpython.qwriter import QWriter
 
 
 
@@ -337,8 +338,71 @@ try:
             print('')
 
 
+    def test_categorical_symbols():
+        w = PandasQWriter(None, 3)
+        r = PandasQReader(None)
+
+        first = pandas.DataFrame(OrderedDict((('sym', pandas.Series(['AAPL', 'MSFT', 'AAPL', ''] * 50)), ('px', pandas.Series(numpy.arange(200.))))))
+        second = pandas.DataFrame(OrderedDict((('sym', pandas.Series(['IBM', 'MSFT', 'AAPL', 'IBM'] * 50)), ('px', pandas.Series(numpy.arange(200.))))))
+
+        result = r.read(source = w.write(first, 1), pandas = True, categorical_symbols = True).data
+        assert isinstance(result['sym'].dtype, pandas.CategoricalDtype)
+        assert list(result['sym']) == list(first['sym'])
+        assert result.meta.sym == QSYMBOL
+        assert set(r.symbol_domain.symbols) == set(['', 'AAPL', 'MSFT', 'sym', 'px'])
+
+        # only new symbols are added to the domain
+        result = r.read(source = w.write(second, 1), pandas = True, categorical_symbols = True).data
+        assert list(result['sym']) == list(second['sym'])
+        assert len(r.symbol_domain) == 6 and r.symbol_domain.symbols[-1] == 'IBM'
+        assert list(result['sym'].cat.categories) == r.symbol_domain.symbols
+
+        # symbol vectors
+        symbols = qlist(numpy.array([b'x%d' % (i % 7) for i in range(300)]), qtype = QSYMBOL_LIST)
+        result = r.read(source = w.write(symbols, 1), pandas = True, categorical_symbols = True).data
+        assert list(result) == [symbol.decode() for symbol in symbols]
+
+        # dictionaries
+        dictionary = QDictionary(qlist(numpy.array([b'a', b'b']), qtype = QSYMBOL_LIST), qlist(numpy.array([1, 2]), qtype = QLONG_LIST))
+        result = r.read(source = w.write(dictionary, 1), pandas = True, categorical_symbols = True).data
+        assert list(result.keys) == ['a', 'b'] and list(result.values) == [1, 2]
+
+        # categorical columns are serialized as symbols
+        assert w.write(r.read(source = w.write(second, 1), pandas = True, categorical_symbols = True).data, 1) == w.write(second, 1)
+        series = pandas.Series(pandas.Categorical(['a', None, 'b']))
+        assert w.write(series, 1) == w.write(qlist(numpy.array([b'a', b'', b'b']), qtype = QSYMBOL_LIST), 1)
+
+
+    def test_reading_table_columns():
+        table = qtable(['sym', 'size', 'price', 'id', 'comment', 'levels'],
+                       [qlist(numpy.array([b'AAPL', b'', b'AAPL']), qtype = QSYMBOL_LIST),
+                        qlist(numpy.array([100, qnull(QINT), 300], dtype = numpy.int32), qtype = QINT_LIST),
+                        qlist(numpy.array([1.5, numpy.nan, 3.5]), qtype = QDOUBLE_LIST),
+                        qlist(numpy.array([uuid.UUID(int = 1), qnull(QGUID), uuid.UUID(int = 3)]), qtype = QGUID_LIST),
+                        [b'first', b'', b'third'],
+                        [qlist(numpy.array([1, 2]), qtype = QLONG_LIST), qlist(numpy.array([3, 4]), qtype = QLONG_LIST), qlist(numpy.array([5, 6]), qtype = QLONG_LIST)]])
+        result = PandasQReader(None).read(source = QWriter(None, 3).write(table, 1), pandas = True).data
+
+        assert list(result['sym']) == ['AAPL', '', 'AAPL']
+        assert result['size'].dtype == numpy.float64 and numpy.isnan(result['size'][1]) and list(result['size'][[0, 2]]) == [100, 300]
+        assert result['price'].dtype == numpy.float64 and numpy.isnan(result['price'][1])
+        assert result['id'][0] == uuid.UUID(int = 1) and numpy.isnan(result['id'][1])
+        # strings are decoded to str, nested lists are kept as objects
+        assert list(result['comment']) == ['first', '', 'third'] and type(result['comment'][0]) is str
+        assert [list(level) for level in result['levels']] == [[1, 2], [3, 4], [5, 6]]
+        assert result.meta.sym == QSYMBOL and result.meta.size == QINT_LIST and result.meta.comment == QGENERAL_LIST and result.meta.levels == QGENERAL_LIST
+
+        # char vectors are split into single characters, blanks are nulls
+        table = qtable(['grade'], [b'a c'])
+        result = PandasQReader(None).read(source = QWriter(None, 3).write(table, 1), pandas = True).data
+        assert result['grade'][0] == 'a' and type(result['grade'][0]) is str and numpy.isnan(result['grade'][1])
+        assert result.meta.grade == QSTRING
+
+
     init()
     test_reading_pandas()
     test_writing_pandas()
+    test_categorical_symbols()
+    test_reading_table_columns()
 except ImportError:
     pandas = None
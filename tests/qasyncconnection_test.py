@@ -0,0 +1,139 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import asyncio
+import time
+
+from qpython.qasyncconnection import AsyncQConnection
+from qpython.qconnection import MessageType, QConnectionException, QAuthenticationException, QTimeoutException
+from qpython.qreader import QReader
+from qpython.qwriter import QWriter
+from qpython.qserver import QServer
+from qpython.qtype import *  # @UnusedWildImport
+
+
+
+def connect(server, **kwargs):
+    return AsyncQConnection(host = 'localhost', port = server.port, reader_class = QReader, writer_class = QWriter, **kwargs)
+
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+
+def test_async_connection():
+    updates = []
+    with QServer() as server:
+        server.register('add', lambda x, y: x + y)
+        server.register('slow', lambda x: time.sleep(0.3) or x)
+        server.register('upd', lambda table, data: updates.append((table, data)))
+        server.register('sub', lambda: server.client.sendAsync('upd', numpy.bytes_(b'trade'), numpy.int64(42)))
+
+        responses = []
+        dispatch = server._dispatch
+        server._dispatch = lambda client, message: responses.append(message) if message[1] == MessageType.RESPONSE else dispatch(client, message)
+
+        async def main():
+            async with connect(server, username = 'user') as q:
+                assert q.is_connected()
+                assert q.protocol_version == QServer.MAX_PROTOCOL_VERSION
+                assert str(q) == 'user@:localhost:%s' % server.port
+                assert server.clients[0].username == 'user'
+
+                assert await q.sendSync('add', numpy.int64(1), numpy.int64(2)) == 3
+                # concurrent queries are matched with their responses
+                results = await asyncio.gather(*[q.sendSync('add', numpy.int64(i), numpy.int64(1)) for i in range(50)])
+                assert results == list(range(1, 51))
+
+                await q.sendAsync('upd', numpy.bytes_(b'quote'), numpy.int64(7))
+                await q.sendAsync('sub')
+                assert await asyncio.wait_for(q.receive(), 5) == ['upd', 'trade', 42]
+                assert updates == [('quote', 7)]
+
+                # synchronous requests from the q service are answered with an error
+                server.register('ask', lambda: server.client._send(numpy.bytes_(b'status'), MessageType.SYNC))
+                await q.sendAsync('ask')
+                await q.sendAsync('sub')
+                assert await asyncio.wait_for(q.receive(), 5) == ['upd', 'trade', 42]
+                # the server handles messages in order, the error has arrived before the result
+                assert await q.sendSync('add', numpy.int64(1), numpy.int64(1)) == 2
+                try:
+                    QReader(None).read(source = responses[0])
+                    assert False, 'QException expected'
+                except QException as e:
+                    assert str(e) == 'nyi'
+
+                # late response of a timed out query is discarded
+                try:
+                    await q.sendSync('slow', numpy.int64(1), timeout = 0.05)
+                    assert False, 'QTimeoutException expected'
+                except QTimeoutException:
+                    pass
+                assert await q.sendSync('add', numpy.int64(2), numpy.int64(2)) == 4
+
+                # pending queries fail once the connection is closed
+                pending = asyncio.ensure_future(q.sendSync('slow', numpy.int64(5)))
+                await asyncio.sleep(0.05)
+                await q.close()
+                assert not q.is_connected()
+                try:
+                    await pending
+                    assert False, 'QConnectionException expected'
+                except QConnectionException:
+                    pass
+
+        run(main())
+
+    assert str(AsyncQConnection(host = 'unix:///tmp/kx.5000', port = 5000)) == 'unix:///tmp/kx.5000'
+    assert str(AsyncQConnection(host = 'localhost', port = 5000, unix_socket = '@kx.5000', username = 'user')) == 'user@unix://@kx.5000'
+
+
+def test_async_connection_lost():
+    with QServer(authenticate = lambda username, password: password == 'secret') as server:
+        server.register('drop', lambda: server._disconnect(server.client))
+
+        async def main():
+            try:
+                await connect(server, username = 'user', password = 'wrong').open()
+                assert False, 'QAuthenticationException expected'
+            except QAuthenticationException:
+                pass
+
+            q = connect(server, username = 'user', password = 'secret')
+            await q.open()
+            await q.sendAsync('drop')
+            for _ in range(2):
+                try:
+                    await asyncio.wait_for(q.receive(), 5)
+                    assert False, 'QConnectionException expected'
+                except QConnectionException:
+                    pass
+            assert not q.is_connected()
+            await q.close()
+
+        run(main())
+
+
+
+test_async_connection()
+test_async_connection_lost()
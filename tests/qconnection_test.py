@@ -0,0 +1,360 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import os
+import socket
+import struct
+import tempfile
+import threading
+import time
+
+from qpython.qconnection import QConnection, QConnectionException, QTimeoutException, ReconnectPolicy
+from qpython.qpool import QBalancedConnection, RoutingPolicy
+from qpython.qreader import QReader, QStreamClosedException
+from qpython.qwriter import QWriter, QWriterException
+from qpython.qserver import QServer
+from qpython.qtype import *  # @UnusedWildImport
+from qpython.qcollection import qlist
+
+
+
+def _recv_exactly(connection, length):
+    data = b''
+    while len(data) < length:
+        chunk = connection.recv(length - len(data))
+        if not chunk:
+            raise EOFError()
+        data += chunk
+    return data
+
+
+def _serve_one(server, handler):
+    '''Stand-in q service: accepts single client, performs the handshake and
+    answers synchronous messages with the handler result.'''
+    connection, _ = server.accept()
+    try:
+        credentials = b''
+        while not credentials.endswith(b'\0'):
+            credentials += connection.recv(1)
+        connection.sendall(struct.pack('B', 3))
+
+        reader, writer = QReader(None), QWriter(None, 3)
+        while True:
+            header = _recv_exactly(connection, 8)
+            size = struct.unpack('<I', header[4:])[0]
+            message = reader.read(source = header + _recv_exactly(connection, size - 8))
+            connection.sendall(writer.write(handler(message.data), 2))
+    except EOFError:
+        pass
+    finally:
+        connection.close()
+
+
+def test_unix_socket():
+    if not hasattr(socket, 'AF_UNIX'):
+        return
+
+    path = os.path.join(tempfile.mkdtemp(), 'kx.5000')
+    for host, unix_socket in (('unix://' + path, None), ('localhost', path)):
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(path)
+        server.listen(1)
+        thread = threading.Thread(target = _serve_one, args = (server, lambda data: data[1]))
+        thread.start()
+
+        try:
+            with QConnection(host = host, port = 5000, unix_socket = unix_socket) as q:
+                assert q.is_connected()
+                assert str(q) == 'unix://' + path
+                result = q.sendSync('{x}', qlist(numpy.arange(5), qtype = QLONG_LIST))
+                assert numpy.array_equal(result, numpy.arange(5)), 'unexpected result: %s' % result
+        finally:
+            thread.join()
+            server.close()
+            os.remove(path)
+
+
+
+def test_reconnect():
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(('localhost', 0))
+    server.listen(1)
+
+    # first and third query are dropped along with the connection
+    queries = []
+    def handler(data):
+        queries.append(data[1])
+        if len(queries) in (1, 3):
+            raise EOFError()
+        return data[1]
+
+    def serve():
+        for _ in range(3):
+            _serve_one(server, handler)
+
+    thread = threading.Thread(target = serve)
+    thread.start()
+
+    hooks = []
+    try:
+        with QConnection(host = 'localhost', port = server.getsockname()[1], reconnect = ReconnectPolicy(initial_delay = 0.01)) as q:
+            q.add_reconnect_hook(hooks.append)
+
+            assert q.sendSync('{x}', numpy.int64(1), idempotent = True) == 1
+            assert queries == [1, 1], 'query not replayed: %s' % queries
+            assert hooks == [q]
+
+            try:
+                q.sendSync('{x}', numpy.int64(2))
+                assert False, 'QConnectionException expected'
+            except QConnectionException:
+                pass
+
+            assert q.is_connected()
+            assert hooks == [q, q]
+            assert q.sendSync('{x}', numpy.int64(3)) == 3
+            assert queries == [1, 1, 2, 3], 'unexpected queries: %s' % queries
+    finally:
+        thread.join()
+        server.close()
+
+    policy = ReconnectPolicy(max_attempts = 6, initial_delay = 1, max_delay = 10, jitter = False)
+    assert list(policy.delays()) == [1, 2, 4, 8, 10, 10]
+    assert all(0 <= delay <= 4 for delay in ReconnectPolicy(max_attempts = 3, initial_delay = 1).delays())
+
+
+
+def test_balanced_connection():
+    servers, threads, served = [], [], []
+    for index in range(3):
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.bind(('localhost', 0))
+        server.listen(1)
+
+        # the third replica drops the connection on the first query
+        def handler(data, index = index):
+            if index == 2:
+                raise EOFError()
+            served.append(index)
+            return data[1]
+
+        thread = threading.Thread(target = _serve_one, args = (server, handler))
+        thread.start()
+        servers.append(server)
+        threads.append(thread)
+
+    endpoints = [('localhost', server.getsockname()[1]) for server in servers]
+    try:
+        with QBalancedConnection(endpoints, policy = RoutingPolicy.ROUND_ROBIN, eject_interval = 60) as q:
+            for i in range(2):
+                assert q.sendSync('{x}', numpy.int64(i)) == i
+
+            try:
+                q.sendSync('{x}', numpy.int64(2))
+                assert False, 'QStreamClosedException expected'
+            except QStreamClosedException:
+                pass
+
+            # the failed replica has been ejected
+            for i in range(4):
+                assert q.sendSync('{x}', numpy.int64(i), idempotent = True) == i
+
+            assert served == [0, 1, 0, 1, 0, 1], 'unexpected routing: %s' % served
+            stats = q.stats
+            assert [s.requests for s in stats] == [3, 3, 1] and [s.ejected for s in stats] == [False, False, True], stats
+    finally:
+        for thread in threads:
+            thread.join()
+        for server in servers:
+            server.close()
+
+
+
+def test_balanced_connection_rejected_write():
+    class RejectingWriter(QWriter):
+        def write(self, data, msg_type, **options):
+            if self._stream and self._stream.getpeername()[1] == rejected:
+                raise ConnectionResetError('Connection reset by peer')
+            return QWriter.write(self, data, msg_type, **options)
+
+    with QServer() as first, QServer() as second:
+        rejected = first.port
+        for server in (first, second):
+            server.register('add', lambda x, y: x + y)
+
+        endpoints = [('localhost', first.port), ('localhost', second.port)]
+        with QBalancedConnection(endpoints, policy = RoutingPolicy.ROUND_ROBIN, reader_class = QReader, writer_class = RejectingWriter) as q:
+            # query which hasn't been written is routed to another endpoint
+            # even if it isn't idempotent
+            assert q.sendSync('add', numpy.int64(1), numpy.int64(2)) == 3
+            q.sendAsync('add', numpy.int64(1), numpy.int64(2))
+
+            stats = q.stats
+            assert [s.requests for s in stats] == [1, 2] and [s.ejected for s in stats] == [True, False], stats
+
+
+def test_balanced_connection_latency():
+    with QServer() as server:
+        server.register('add', lambda x, y: x + y)
+        server.register('slow', lambda x: time.sleep(0.3) or x)
+
+        with QBalancedConnection([('localhost', server.port)], policy = RoutingPolicy.LATENCY, reader_class = QReader, writer_class = QWriter) as q:
+            assert q.sendSync('add', numpy.int64(1), numpy.int64(2)) == 3
+            latency = q.stats[0].latency
+            assert latency is not None
+
+            # query which couldn't be serialized isn't measured
+            try:
+                q.sendSync('add', object(), numpy.int64(2))
+                assert False, 'QWriterException expected'
+            except QWriterException:
+                pass
+            assert q.stats[0].latency == latency
+
+            # timed out query is measured with the time spent waiting
+            try:
+                q.sendSync('slow', numpy.int64(1), timeout = 0.1)
+                assert False, 'QTimeoutException expected'
+            except QTimeoutException:
+                pass
+            stats = q.stats[0]
+            assert stats.latency >= latency + 0.2 * (0.1 - latency) and stats.failures == 0 and not stats.ejected, stats
+            assert q.sendSync('add', numpy.int64(2), numpy.int64(2)) == 4
+
+
+
+def test_deadlines():
+    # query with parameter 1 is answered after a delay
+    def handler(data):
+        if data[1] == 1:
+            time.sleep(0.3)
+        return data[1]
+
+    for zero_copy in (False, True):
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.bind(('localhost', 0))
+        server.listen(1)
+        thread = threading.Thread(target = _serve_one, args = (server, handler))
+        thread.start()
+
+        try:
+            with QConnection(host = 'localhost', port = server.getsockname()[1], zero_copy = zero_copy) as q:
+                for timeout in (0.1, 0):
+                    try:
+                        q.sendSync('{x}', numpy.int64(1), timeout = timeout)
+                        assert False, 'QTimeoutException expected'
+                    except QTimeoutException:
+                        pass
+
+                # late responses are discarded
+                assert q.sendSync('{x}', numpy.int64(2), timeout = 5) == 2
+                assert q.sendSync('{x}', numpy.int64(3)) == 3
+
+                try:
+                    q.receive(timeout = 0.05)
+                    assert False, 'QTimeoutException expected'
+                except QTimeoutException:
+                    pass
+
+                # cancelled queries are not sent
+                p = q.pipeline()
+                futures = [p.sendSync('{x}', numpy.int64(i)) for i in (4, 5, 6)]
+                futures[1].cancel()
+                assert p.execute() == [4, None, 6]
+
+                p = q.pipeline(timeout = 0.1)
+                futures = [p.sendSync('{x}', numpy.int64(i)) for i in (1, 7)]
+                try:
+                    p.execute()
+                    assert False, 'QTimeoutException expected'
+                except QTimeoutException:
+                    pass
+                assert all(isinstance(future.exception(), QTimeoutException) for future in futures)
+
+                assert q.sendSync('{x}', numpy.int64(8)) == 8
+        finally:
+            thread.join()
+            server.close()
+
+
+def test_pipeline():
+    updates = []
+    with QServer() as server:
+        server.register('add', lambda x, y: x + y)
+        server.register('upd', lambda x: updates.append(x))
+
+        with QConnection(host = 'localhost', port = server.port, reader_class = QReader, writer_class = QWriter) as q:
+            # responses are matched with queries in order of submission
+            for window in (None, 1, 3):
+                with q.pipeline(window = window) as p:
+                    futures = []
+                    for i in range(10):
+                        futures.append(p.sendSync('add', numpy.int64(i), numpy.int64(1)))
+                        p.sendAsync('upd', numpy.int64(i))
+                    assert len(p) == 20
+                assert len(p) == 0
+                assert [future.result() for future in futures] == list(range(1, 11))
+            # asynchronous queries are processed in order with synchronous ones
+            assert q.sendSync('add', numpy.int64(0), numpy.int64(0)) == 0
+            assert updates == list(range(10)) * 3
+
+            # q errors are set on futures, execute raises the first one
+            p = q.pipeline()
+            futures = [p.sendSync('add', numpy.int64(1), numpy.int64(1)), p.sendSync('missing'), p.sendSync('add', numpy.int64(2), numpy.int64(2))]
+            try:
+                p.execute()
+                assert False, 'QException expected'
+            except QException:
+                pass
+            assert futures[0].result() == 2 and isinstance(futures[1].exception(), QException) and futures[2].result() == 4
+
+            # queued queries are dropped when the block fails
+            try:
+                with q.pipeline() as p:
+                    future = p.sendSync('add', numpy.int64(1), numpy.int64(1))
+                    raise ValueError()
+            except ValueError:
+                pass
+            assert future.cancelled() and len(p) == 0
+            assert q.sendSync('add', numpy.int64(3), numpy.int64(3)) == 6
+
+    # writing large batches doesn't stall on the q service blocked sending responses
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(('localhost', 0))
+    server.listen(1)
+    thread = threading.Thread(target = _serve_one, args = (server, lambda data: data[1]))
+    thread.start()
+
+    try:
+        with QConnection(host = 'localhost', port = server.getsockname()[1], timeout = 5) as q:
+            vector = numpy.arange(250000, dtype = numpy.int64)
+            with q.pipeline() as p:
+                futures = [p.sendSync('{x}', vector + i) for i in range(30)]
+            assert all(numpy.array_equal(future.result(), vector + i) for i, future in enumerate(futures))
+            assert q.sendSync('{x}', numpy.int64(1)) == 1
+    finally:
+        thread.join()
+        server.close()
+
+
+
+test_unix_socket()
+test_reconnect()
+test_balanced_connection()
+test_balanced_connection_rejected_write()
+test_balanced_connection_latency()
+test_deadlines()
+test_pipeline()
@@ -0,0 +1,120 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import threading
+import time
+
+from qpython.qconnection import QConnectionException
+from qpython.qpool import QConnectionPool, QConnectionPoolException
+from qpython.qreader import QReader
+from qpython.qwriter import QWriter
+from qpython.qserver import QServer
+from qpython.qtype import *  # @UnusedWildImport
+
+
+
+def pool(server, **kwargs):
+    return QConnectionPool('localhost', server.port, reader_class = QReader, writer_class = QWriter, **kwargs)
+
+
+
+def test_pool():
+    with QServer() as server:
+        server.register('add', lambda x, y: x + y)
+
+        with pool(server, size = 2, username = 'user') as p:
+            assert str(p) == 'pool(2)user@:localhost:%s' % server.port
+            assert len(server.clients) == 2
+            assert p.sendSync('add', numpy.int64(1), numpy.int64(2)) == 3
+
+            # the most recently released connection is reused first
+            first, second = p.acquire(), p.acquire()
+            assert p.stats.in_use == 2 and p.stats.idle == 0
+            p.release(first)
+            p.release(second)
+            assert p.acquire() is second and p.acquire() is first
+            p.release(first)
+            p.release(second)
+
+            # acquisition times out when all connections are in use
+            connections = [p.acquire(), p.acquire()]
+            started = time.monotonic()
+            try:
+                p.acquire(timeout = 0.05)
+                assert False, 'QConnectionPoolException expected'
+            except QConnectionPoolException:
+                pass
+            assert time.monotonic() - started >= 0.05
+            for connection in connections:
+                p.release(connection)
+
+            stats = p.stats
+            assert stats.acquisitions == 7 and stats.in_use == 0 and stats.idle == 2 and stats.replaced == 0, stats
+
+
+def test_pool_replacement():
+    with QServer() as server:
+        server.register('add', lambda x, y: x + y)
+        server.register('drop', lambda: server._disconnect(server.client))
+
+        with pool(server, size = 1, idle_check_interval = 0) as p:
+            # connections failing with connection or socket errors are replaced
+            for error in (QConnectionException('lost'), OSError('reset')):
+                try:
+                    with p.connection() as connection:
+                        raise error
+                except type(error):
+                    pass
+                assert not connection.is_connected()
+
+                replacement = p.acquire()
+                assert replacement is not connection and replacement.is_connected()
+                p.release(replacement)
+            assert p.stats.replaced == 2
+            assert p.sendSync('add', numpy.int64(1), numpy.int64(1)) == 2
+
+            # connections closed by the q service are detected before use
+            with p.connection() as connection:
+                connection.sendAsync('drop')
+            time.sleep(0.1)
+            assert p.sendSync('add', numpy.int64(1), numpy.int64(2)) == 3
+            assert p.stats.replaced == 3
+
+
+def test_pool_concurrency():
+    with QServer() as server:
+        server.register('add', lambda x, y: x + y)
+
+        with pool(server, size = 2) as p:
+            def query(results):
+                results.extend(p.sendSync('add', numpy.int64(i), numpy.int64(1)) for i in range(50))
+
+            results = [[] for _ in range(8)]
+            threads = [threading.Thread(target = query, args = (r, )) for r in results]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            assert all(r == list(range(1, 51)) for r in results)
+            stats = p.stats
+            assert stats.acquisitions == 400 and stats.in_use == 0 and stats.idle == 2 and len(server.clients) == 2, stats
+
+
+
+test_pool()
+test_pool_replacement()
+test_pool_concurrency()
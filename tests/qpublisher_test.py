@@ -0,0 +1,143 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import threading
+import time
+
+from qpython.qconnection import QConnection, QConnectionException
+from qpython.qreader import QReader
+from qpython.qwriter import QWriter
+from qpython.qserver import QServer
+from qpython.qpublisher import QPublisher
+from qpython.qtype import *  # @UnusedWildImport
+
+
+
+def test_publisher():
+    updates = []
+    acks = []
+    with QServer(numpy_temporals = True) as server:
+        server.register('.u.upd', lambda table, columns: updates.append((table, columns)))
+        server.register('::', lambda: acks.append(len(updates)))
+
+        with QConnection(host = 'localhost', port = server.port, reader_class = QReader, writer_class = QWriter) as q:
+            publisher = QPublisher(q, batch_size = 4, flush_interval = None, ack_every = 2)
+            publisher.add_table('trade', [QTIMESPAN_LIST, QSYMBOL_LIST, QFLOAT_LIST, QLONG_LIST])
+            try:
+                publisher.publish('trade', ())
+                assert False, 'ValueError expected'
+            except ValueError:
+                pass
+
+            # full batches are sent
+            for i in range(6):
+                publisher.publish('trade', (numpy.timedelta64(i, 'ns'), 'sym%d' % i, i / 2., i))
+            assert publisher.stats.messages == 1 and publisher.stats.buffered == 2
+
+            # column chunks are split between messages
+            publisher.publish_columns('trade', [numpy.arange(6, 16).astype('timedelta64[ns]'),
+                                                numpy.array(['sym%d' % i for i in range(6, 16)], dtype = object),
+                                                numpy.arange(6, 16) / 2.,
+                                                numpy.arange(6, 16)])
+            publisher.stop()
+
+            assert publisher.stats.rows == 16 and publisher.stats.buffered == 0
+            assert [len(columns[0]) for _, columns in updates] == [4, 4, 4, 4]
+            assert all(table == 'trade' for table, _ in updates)
+            assert numpy.array_equal(numpy.concatenate([columns[3] for _, columns in updates]), numpy.arange(16))
+            assert list(numpy.concatenate([columns[1] for _, columns in updates])) == [b'sym%d' % i for i in range(16)]
+            assert updates[-1][1][0][-1] == numpy.timedelta64(15, 'ns')
+            assert updates[-1][1][2].dtype == numpy.float32 and updates[-1][1][2][-1] == 7.5
+
+            # acknowledgements bound updates in flight
+            assert acks == [2, 4] and publisher.stats.acks == 2
+
+            # incomplete batches are flushed after the interval
+            del updates[:]
+            with QPublisher(q, batch_size = 1000, flush_interval = 0.05) as publisher:
+                publisher.add_table('quote', [QLONG_LIST])
+                publisher.publish('quote', (numpy.int64(1), ))
+                started = time.time()
+                while not updates and time.time() - started < 5:
+                    time.sleep(0.01)
+                assert publisher.stats.messages == 1
+
+                # many producers
+                def produce(offset):
+                    for i in range(500):
+                        publisher.publish('quote', (offset + i, ))
+
+                threads = [threading.Thread(target = produce, args = (offset, )) for offset in range(0, 4000, 1000)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+
+            assert q.sendSync('::') is None
+            assert publisher.stats.rows == 2001 and publisher.error is None
+            received = numpy.concatenate([columns[0] for _, columns in updates])
+            assert len(received) == 2001 and set(received[1:]) == set(i + offset for i in range(500) for offset in range(0, 4000, 1000))
+
+
+def test_publisher_errors():
+    class Connection(object):
+        '''Connection failing to send the next `failures` messages.'''
+        _encoding = 'latin-1'
+
+        def __init__(self, failures):
+            self.failures = failures
+            self.sent = []
+
+        def sendAsync(self, query, *parameters, **options):
+            if self.failures:
+                self.failures -= 1
+                raise QConnectionException('Connection is not established.')
+            self.sent.append(parameters)
+
+    for interval in (0, -1):
+        try:
+            QPublisher(None, flush_interval = interval)
+            assert False, 'ValueError expected'
+        except ValueError:
+            pass
+
+    connection = Connection(0)
+    with QPublisher(connection, flush_interval = 0.02) as publisher:
+        publisher.add_table('quote', [QLONG_LIST])
+
+        # errors of the flushing thread are raised by the next call
+        for call in (lambda: publisher.publish('quote', (numpy.int64(2), )), publisher.flush):
+            connection.failures = 1
+            publisher.publish('quote', (numpy.int64(1), ))
+            started = time.time()
+            while publisher.error is None and time.time() - started < 5:
+                time.sleep(0.01)
+
+            try:
+                call()
+                assert False, 'QConnectionException expected'
+            except QConnectionException:
+                pass
+            assert publisher.error is None
+
+    # buffered rows are sent once the connection recovers
+    assert sum(len(parameters[1][0]) for parameters in connection.sent) == 2
+    assert publisher.stats.rows == 2 and publisher.stats.buffered == 0 and publisher.error is None
+
+
+
+test_publisher()
+test_publisher_errors()
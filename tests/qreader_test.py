@@ -414,6 +414,267 @@ def test_reading_compressed():
 
 
 
+def test_reading_symbol_lists():
+    from qpython.qwriter import QWriter
+
+    writer = QWriter(None, 3)
+    reader = qreader.QReader(None)
+    # below and above the vectorization threshold, short and long symbols
+    for symbols in ([b''], [b'abc', b'', b'de'],
+                    [b'AAPL', b'MSFT', b'IBM', b'', b'GOOG'] * 100,
+                    [b'x' * (i % 37) for i in range(1000)]):
+        expected = qlist(numpy.array(symbols, dtype = numpy.bytes_), qtype = QSYMBOL_LIST)
+        message = writer.write([expected, numpy.int64(1)], 1)
+
+        result = reader.read(source = message).data
+        assert result[0].dtype == expected.dtype and numpy.array_equal(result[0], expected)
+        assert result[1] == 1
+
+    buffer_ = qreader.QReader.BytesBuffer()
+    buffer_.wrap(b'a\0' * 200)
+    try:
+        buffer_.get_symbol_array(201)
+        assert False, 'QReaderException expected'
+    except qreader.QReaderException:
+        pass
+
+
+
+def test_reading_lazy_tables():
+    from qpython.qwriter import QWriter
+    from qpython.qcollection import QLazyTable
+
+    writer = QWriter(None, 3)
+    reader = qreader.QReader(None)
+    table = qtable(qlist(numpy.array(['sym', 'price', 'size', 'comment']), qtype = QSYMBOL_LIST),
+                   [qlist(numpy.array([b'AAPL', b'MSFT', b'IBM'] * 100), qtype = QSYMBOL_LIST),
+                    qlist(numpy.arange(300) / 4., qtype = QDOUBLE_LIST),
+                    qlist(numpy.arange(300), qtype = QINT_LIST),
+                    ['c%d' % i for i in range(300)]])
+    message = writer.write(table, 1)
+
+    result = reader.read(source = message, lazy_tables = True).data
+    assert isinstance(result, QLazyTable)
+    assert result.columns == ['sym', 'price', 'size', 'comment'] and len(result) == 300
+    assert result.meta.sym == QSYMBOL and result.meta.price == QDOUBLE and result.meta.comment == QGENERAL_LIST
+
+    assert numpy.array_equal(result['price'], table['price'])
+    assert result['price'] is result['price']
+    assert numpy.array_equal(result['sym'], table['sym'])
+    try:
+        result['volume']
+        assert False, 'KeyError expected'
+    except KeyError:
+        pass
+
+    # decoding of other messages doesn't affect lazy tables
+    reader.read(source = writer.write(qlist(numpy.arange(1000), qtype = QLONG_LIST), 1))
+    assert numpy.array_equal(result['size'], table['size'])
+    assert compare(reader.read(source = message).data, result.materialize())
+
+    # keyed tables are decoded eagerly
+    keyed = QKeyedTable(qtable(['key'], [qlist(numpy.arange(3), qtype = QLONG_LIST)]), qtable(['value'], [qlist(numpy.arange(3), qtype = QLONG_LIST)]))
+    assert compare(keyed, reader.read(source = writer.write(keyed, 1), lazy_tables = True).data)
+
+
+def test_reading_projected_tables():
+    from qpython.qwriter import QWriter
+
+    writer = QWriter(None, 3)
+    reader = qreader.QReader(None)
+    table = qtable(qlist(numpy.array(['sym', 'price', 'size', 'comment', 'nested']), qtype = QSYMBOL_LIST),
+                   [qlist(numpy.array([b'AAPL', b'MSFT', b'IBM'] * 100), qtype = QSYMBOL_LIST),
+                    qlist(numpy.arange(300) / 4., qtype = QDOUBLE_LIST),
+                    qlist(numpy.arange(300), qtype = QINT_LIST),
+                    ['c%d' % i for i in range(300)],
+                    [[qlist(numpy.arange(i % 5), qtype = QLONG_LIST), numpy.bytes_('x')] for i in range(300)]])
+    message = writer.write(table, 1)
+
+    result = reader.read(source = message, columns = ['size', 'price']).data
+    # columns are kept in the order of the message
+    assert result.dtype.names == ('price', 'size') and len(result) == 300
+    assert result.meta.price == QDOUBLE and result.meta.size == QINT and result.meta.sym is None
+    assert numpy.array_equal(result['price'], table['price'])
+    assert numpy.array_equal(result['size'], table['size'])
+
+    result = reader.read(source = message, columns = 'nested').data
+    assert result.dtype.names == ('nested', ) and len(result) == 300
+
+    result = reader.read(source = message, columns = ['size'], lazy_tables = True).data
+    assert result.columns == ['size'] and numpy.array_equal(result['size'], table['size'])
+
+    # key columns are always decoded
+    keyed = QKeyedTable(qtable(['key'], [qlist(numpy.arange(3), qtype = QLONG_LIST)]),
+                        qtable(['a', 'b'], [qlist(numpy.arange(3), qtype = QLONG_LIST), qlist(numpy.arange(3) / 2., qtype = QDOUBLE_LIST)]))
+    result = reader.read(source = writer.write(keyed, 1), columns = ['b']).data
+    assert compare(result.keys, keyed.keys) and result.values.dtype.names == ('b', )
+
+
+def test_reading_guid_lists():
+    from qpython.qwriter import QWriter
+    from qpython.qcollection import QGuidList
+
+    writer = QWriter(None, 3)
+    reader = qreader.QReader(None)
+    guids = [uuid.UUID(int = i * 0x10203040506070809) for i in range(1000)] + [qnull(QGUID)]
+    expected = qlist(numpy.array(guids), qtype = QGUID_LIST)
+    message = writer.write(expected, 1)
+
+    result = reader.read(source = message).data
+    assert compare(expected, result)
+
+    result = reader.read(source = message, numpy_guids = True).data
+    assert type(result) == QGuidList and result.dtype == GUID_RAW_TYPE and result.meta.qtype == QGUID
+    assert result[1] == guids[1] and result[-1] == qnull(QGUID) and list(result[:3]) == guids[:3]
+    assert list(result.uuids()) == guids
+    assert compare(expected, qlist(result.uuids(), qtype = QGUID_LIST))
+
+    # raw guids are serialized with a single buffer operation
+    assert writer.write(result, 1) == message
+    assert writer.write(numpy.frombuffer(result.tobytes(), dtype = GUID_RAW_TYPE), 1) == message
+
+    result = result.copy()
+    result[0] = guids[2]
+    assert result[0] == guids[2] and type(result) == QGuidList
+
+
+
+def test_reading_columnar_tables():
+    from qpython.qwriter import QWriter
+    from qpython.qcollection import QColumnarTable
+
+    writer = QWriter(None, 3)
+    reader = qreader.QReader(None)
+    table = qtable(qlist(numpy.array(['sym', 'price', 'size']), qtype = QSYMBOL_LIST),
+                   [qlist(numpy.array([b'AAPL', b'MSFT', b'IBM'] * 100), qtype = QSYMBOL_LIST),
+                    qlist(numpy.arange(300) / 4., qtype = QDOUBLE_LIST),
+                    qlist(numpy.arange(300), qtype = QINT_LIST)])
+    message = writer.write(table, 1)
+
+    result = reader.read(source = message, columnar_tables = True).data
+    assert isinstance(result, QColumnarTable)
+    assert result.columns == ['sym', 'price', 'size'] and len(result) == 300
+    assert result.dtype == table.dtype
+    assert result.meta.as_dict() == table.meta.as_dict()
+    assert result == table
+    assert result[1] == tuple(table[1])
+    assert result[10:20] == table[10:20]
+
+    # columns are contiguous vectors, serialized as eager tables
+    assert result['price'].flags.c_contiguous and result['price'].meta.qtype == QDOUBLE
+    assert writer.write(result, 1) == message
+    assert compare(table, result.to_table())
+
+    keyed = QKeyedTable(qtable(['key'], [qlist(numpy.arange(3), qtype = QLONG_LIST)]), qtable(['value'], [qlist(numpy.arange(3), qtype = QLONG_LIST)]))
+    keyed_message = writer.write(keyed, 1)
+    result = reader.read(source = keyed_message, columnar_tables = True).data
+    assert isinstance(result.keys, QColumnarTable) and isinstance(result.values, QColumnarTable)
+    assert compare(keyed, result)
+    assert writer.write(result, 1) == keyed_message
+
+
+def test_reading_compiled():
+    if qreader.decode_object is None:
+        return
+
+    BINARY = OrderedDict()
+
+    with open('tests/QExpressions3.out', 'rb') as f:
+        while True:
+            query = f.readline().strip()
+            binary = f.readline().strip()
+
+            if not binary:
+                break
+
+            BINARY[query] = binary
+
+    def read(message, native, **options):
+        decode_object, qreader.decode_object = qreader.decode_object, qreader.decode_object if native else None
+        try:
+            return qreader.QReader(None).read(source = message, **options).data
+        except Exception as e:
+            return e
+        finally:
+            qreader.decode_object = decode_object
+
+    print('Compiled deserialization')
+    for query, binary in BINARY.items():
+        binary = binascii.unhexlify(binary)
+        message = b'\1\1\0\0' + struct.pack('i', len(binary) + 8) + binary
+        for options in ({}, {'numpy_temporals': True}, {'columnar_tables': True}):
+            expected, result = read(message, False, **options), read(message, True, **options)
+            assert type(expected) == type(result), 'compiled deserialization failed: %s' % query
+            if isinstance(expected, Exception):
+                assert expected.args == result.args, 'compiled deserialization failed: %s' % query
+            elif isinstance(expected, QKeyedTable):
+                assert compare(expected.keys, result.keys) and compare(expected.values, result.values), 'compiled deserialization failed: %s' % query
+            else:
+                assert compare(expected, result), 'compiled deserialization failed: %s' % query
+            assert repr(getattr(expected, 'meta', None)) == repr(getattr(result, 'meta', None)), 'compiled deserialization failed: %s' % query
+
+    # big endian data
+    message = b'\0\1\0\0' + struct.pack('>i', 43) + b'\0\0' + struct.pack('>i', 3) + b'\xfa' + struct.pack('>i', -7) + \
+              b'\x07\0' + struct.pack('>I', 2) + struct.pack('>2q', 1, -2) + b'\xf7' + struct.pack('>d', 2.5)
+    assert str(read(message, False)) == str(read(message, True)) == '[-7, QList([ 1, -2]), 2.5]'
+
+def test_reading_receive_buffer():
+    import socket
+    from qpython.qwriter import QWriter
+
+    writer = QWriter(None, 3)
+    vectors = [qlist(numpy.arange(1000) + i, qtype = QLONG_LIST) for i in range(4)]
+    messages = [writer.write(vector, 2) for vector in vectors]
+
+    def shares_memory(data, buffer):
+        buffer = numpy.frombuffer(buffer, dtype = numpy.uint8)
+        return numpy.shares_memory(data, buffer)
+
+    # vectors are copied unless the zero-copy mode is used
+    reader = qreader.QReader(None)
+    result = reader.read(source = messages[0]).data
+    assert compare(vectors[0], result) and not shares_memory(result, messages[0])
+
+    left, right = socket.socketpair()
+    try:
+        stream = right.makefile('rb')
+        reader = qreader.QReader(stream)
+        left.sendall(messages[0])
+        result = reader.read().data
+        assert compare(vectors[0], result) and reader._recv_buffer is None
+        stream.close()
+
+        # zero-copy mode exposes vectors as views over the receive buffer
+        reader = qreader.QReader(right)
+        left.sendall(b''.join(messages))
+        first = reader.read().data
+        buffer = reader._recv_buffer
+        assert compare(vectors[0], first) and shares_memory(first, buffer)
+
+        # the buffer isn't reused while referenced, results stay valid
+        second = reader.read().data
+        assert reader._recv_buffer is not buffer
+        assert compare(vectors[0], first) and compare(vectors[1], second)
+
+        # released buffer is reused by the next read
+        buffer = reader._recv_buffer
+        del second
+        third = reader.read().data
+        assert reader._recv_buffer is buffer and compare(vectors[2], third)
+        assert compare(vectors[0], first)
+    finally:
+        left.close()
+        right.close()
+
+
+
 test_reading()
 test_reading_numpy_temporals()
 test_reading_compressed()
+test_reading_symbol_lists()
+test_reading_lazy_tables()
+test_reading_projected_tables()
+test_reading_guid_lists()
+test_reading_columnar_tables()
+test_reading_compiled()
+test_reading_receive_buffer()
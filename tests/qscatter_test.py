@@ -0,0 +1,109 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import time
+
+from qpython import MetaData
+from qpython.qconnection import QTimeoutException
+from qpython.qscatter import QScatterGather, QScatterException, merge
+from qpython.qtype import *  # @UnusedWildImport
+from qpython.qcollection import qlist, qtable, QTable, QColumnarTable, QKeyedTable
+
+
+
+class StandInShard(object):
+    '''Answers queries with a table after a delay.'''
+
+    def __init__(self, shard, delay):
+        self.shard = shard
+        self.delay = delay
+
+
+    def sendSync(self, query, *parameters, **options):
+        timeout = options.get('timeout')
+        if timeout is not None and timeout < self.delay:
+            time.sleep(timeout)
+            raise QTimeoutException('Message not received before the deadline')
+        time.sleep(self.delay)
+        size = parameters[0] if parameters else 2
+        return qtable(qlist(numpy.array(['shard', 'x']), qtype = QSYMBOL_LIST),
+                      [qlist(numpy.array([self.shard] * size), qtype = QLONG_LIST),
+                       qlist(numpy.arange(size), qtype = QLONG_LIST)])
+
+
+
+def test_merge():
+    shards = [StandInShard(shard, 0).sendSync('', shard + 1) for shard in range(3)]
+
+    table = merge(shards)
+    assert isinstance(table, QTable) and table.meta.qtype == QTABLE
+    assert numpy.array_equal(table.shard, [0, 1, 1, 2, 2, 2]) and numpy.array_equal(table.x, [0, 0, 1, 0, 1, 2])
+
+    columnar = merge([QColumnarTable(shard.dtype.names, [shard[column] for column in shard.dtype.names]) for shard in shards])
+    assert isinstance(columnar, QColumnarTable) and columnar.meta.x == QLONG and columnar == table
+
+    keyed = merge([QKeyedTable(shard, shard) for shard in shards])
+    assert isinstance(keyed, QKeyedTable) and len(keyed) == 6
+
+    vectors = [qlist(numpy.arange(3), qtype = QLONG_LIST), qlist(numpy.arange(2), qtype = QLONG_LIST)]
+    vector = merge(vectors)
+    assert vector.meta.qtype == vectors[0].meta.qtype and numpy.array_equal(vector, [0, 1, 2, 0, 1])
+
+    assert merge([[1, 2], [3]]) == [1, 2, 3]
+    assert merge([numpy.int64(1), numpy.int64(2)]) == [1, 2]
+    assert merge([]) is None
+
+    try:
+        import pandas
+        frame = merge([pandas.DataFrame({'x': [1, 2]}), pandas.DataFrame({'x': [3]})])
+        assert list(frame['x']) == [1, 2, 3] and list(frame.index) == [0, 1, 2]
+
+        frames = [pandas.DataFrame({'k': [1, 2], 'x': [3, 4]}).set_index('k'), pandas.DataFrame({'k': [5], 'x': [6]}).set_index('k')]
+        for frame in frames:
+            frame.meta = MetaData(qtype = QKEYED_TABLE)
+        keyed = merge(frames)
+        assert list(keyed.index) == [1, 2, 5] and keyed.meta.qtype == QKEYED_TABLE
+    except ImportError:
+        pass
+
+
+def test_scatter_gather():
+    with QScatterGather([StandInShard(shard, 0.2) for shard in range(5)]) as scatter:
+        started = time.monotonic()
+        table = scatter.sendSync('query', 2)
+        elapsed = time.monotonic() - started
+        assert elapsed < 0.6, 'shards queried sequentially: %s' % elapsed
+        assert numpy.array_equal(table.shard, [0, 0, 1, 1, 2, 2, 3, 3, 4, 4])
+
+        table = scatter.execute('query', [(shard, ) for shard in range(5)])
+        assert len(table) == 10
+
+    shards = [StandInShard(0, 0), StandInShard(1, 1.0)]
+    with QScatterGather(shards, timeout = 0.2) as scatter:
+        try:
+            scatter.sendSync('query')
+            assert False, 'QScatterException expected'
+        except QScatterException as e:
+            assert list(e.errors) == [1] and e.results[1] is None
+            assert isinstance(e.errors[1], QTimeoutException)
+
+        table = scatter.sendSync('query', partial = True)
+        assert numpy.array_equal(table.shard, [0, 0])
+
+
+
+test_merge()
+test_scatter_gather()
@@ -0,0 +1,137 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import sys
+import threading
+
+from qpython.qconnection import QConnection, QAuthenticationException
+from qpython.qreader import QReader
+from qpython.qwriter import QWriter
+from qpython.qserver import QServer
+from qpython.qtype import *  # @UnusedWildImport
+from qpython.qcollection import qlist
+
+
+
+def connect(server, **kwargs):
+    return QConnection(host = 'localhost', port = server.port, reader_class = QReader, writer_class = QWriter, **kwargs)
+
+
+
+def test_server():
+    updates = []
+    with QServer(handler = lambda client, data: numpy.int64(len(data))) as server:
+        server.register('add', lambda x, y: x + y)
+        server.register('fail', lambda: 1 / 0)
+        server.register('invalid', lambda: object())
+        server.register('upd', lambda table, data: updates.append((table, data)))
+        server.register('sub', lambda: server.client.sendAsync('upd', numpy.bytes_(b'trade'), numpy.int64(42)))
+
+        with connect(server) as q:
+            assert q.protocol_version == QServer.MAX_PROTOCOL_VERSION
+            assert q.sendSync('add', numpy.int64(1), numpy.int64(2)) == 3
+            vector = q.sendSync('add', qlist(numpy.arange(3), qtype = QLONG_LIST), numpy.int64(1))
+            assert numpy.array_equal(vector, [1, 2, 3])
+            assert q.sendSync('{x}', numpy.int64(5)) == 2
+
+            # results which cannot be serialized are reported as errors
+            try:
+                q.sendSync('invalid')
+                assert False, 'QException expected'
+            except QException as e:
+                assert str(e).startswith('type')
+
+            try:
+                q.sendSync('fail')
+                assert False, 'QException expected'
+            except QException as e:
+                assert 'division' in str(e)
+
+            q.sendAsync('upd', numpy.bytes_(b'quote'), numpy.int64(7))
+            q.sendAsync('sub')
+            assert q.receive() == ['upd', 'trade', 42]
+            assert updates == [('quote', 7)]
+
+            # clients served concurrently
+            def query(results):
+                with connect(server) as q:
+                    results.extend(q.sendSync('add', numpy.int64(i), numpy.int64(1)) for i in range(100))
+
+            results = [[] for _ in range(8)]
+            threads = [threading.Thread(target = query, args = (r, )) for r in results]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            assert all(r == list(range(1, 101)) for r in results)
+
+            # messages pushed from other threads
+            client = [client for client in server.clients if client.address == q._connection.getsockname()][0]
+            client.sendAsync('upd', numpy.bytes_(b'trade'), numpy.int64(43))
+            assert q.receive(timeout = 5) == ['upd', 'trade', 43]
+
+
+def test_server_authentication():
+    with QServer(authenticate = lambda username, password: password == 'secret') as server:
+        with connect(server, username = 'user', password = 'secret') as q:
+            assert server.clients[0].username == 'user'
+
+        try:
+            connect(server, username = 'user', password = 'wrong').open()
+            assert False, 'QAuthenticationException expected'
+        except QAuthenticationException:
+            pass
+
+
+def test_server_concurrent_writes():
+    vector = numpy.arange(10000, dtype = numpy.int64)
+    with QServer() as server:
+        server.register('echo', lambda x: server.client.sendAsync('upd', x))
+
+        with connect(server) as q:
+            client = server.clients[0]
+
+            # messages are sent from the server thread and from many others
+            def publish(offset):
+                for i in range(100):
+                    client.sendAsync('upd', vector + offset + i)
+
+            # switch threads often to interleave serialization
+            interval = sys.getswitchinterval()
+            sys.setswitchinterval(1e-6)
+            try:
+                threads = [threading.Thread(target = publish, args = (offset, )) for offset in range(0, 400, 100)]
+                for thread in threads:
+                    thread.start()
+                for i in range(100):
+                    q.sendAsync('echo', vector + 400 + i)
+                for thread in threads:
+                    thread.join()
+            finally:
+                sys.setswitchinterval(interval)
+
+            received = set()
+            for _ in range(500):
+                name, data = q.receive(timeout = 5)
+                assert name == 'upd' and numpy.array_equal(data, vector + data[0])
+                received.add(int(data[0]))
+            assert received == set(range(500))
+
+
+
+test_server()
+test_server_authentication()
+test_server_concurrent_writes()
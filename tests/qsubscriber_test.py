@@ -0,0 +1,159 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import socket
+import struct
+import threading
+import time
+
+from qpython.qconnection import QConnection, QTimeoutException
+from qpython.qsubscriber import QSubscriber, OverflowPolicy
+from qpython.qreader import QReader
+from qpython.qwriter import QWriter
+from qpython.qserver import QServer
+from qpython.qtype import *  # @UnusedWildImport
+from qpython.qcollection import qlist, qtable
+
+
+
+def _recv_exactly(connection, length):
+    data = b''
+    while len(data) < length:
+        chunk = connection.recv(length - len(data))
+        if not chunk:
+            raise EOFError()
+        data += chunk
+    return data
+
+
+def _publish(server, updates, done):
+    '''Stand-in tickerplant: answers the subscription and publishes updates.'''
+    connection, _ = server.accept()
+    try:
+        credentials = b''
+        while not credentials.endswith(b'\0'):
+            credentials += connection.recv(1)
+        connection.sendall(struct.pack('B', 3))
+
+        reader, writer = QReader(None), QWriter(None, 3)
+        header = _recv_exactly(connection, 8)
+        size = struct.unpack('<I', header[4:])[0]
+        subscription = reader.read(source = header + _recv_exactly(connection, size - 8)).data
+        connection.sendall(writer.write([subscription[1], updates[0][1]], 2))
+
+        for table, update in updates:
+            connection.sendall(writer.write([numpy.bytes_(b'upd'), numpy.bytes_(table.encode()), update], 0))
+        connection.sendall(writer.write(numpy.int64(-1), 0))
+
+        # keep the connection open until the subscriber stops
+        done.wait(5)
+    finally:
+        connection.close()
+
+
+def _trade(index):
+    return qtable(qlist(numpy.array(['sym', 'price']), qtype = QSYMBOL_LIST),
+                  [qlist(numpy.array(['q']), qtype = QSYMBOL_LIST),
+                   qlist(numpy.array([index], dtype = numpy.float64), qtype = QFLOAT_LIST)])
+
+
+def _wait_for(condition, timeout = 5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+
+def test_subscriber():
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(('localhost', 0))
+    server.listen(1)
+
+    updates = [('trade', _trade(i)) for i in range(10)] + [('quote', _trade(100))]
+    done = threading.Event()
+    thread = threading.Thread(target = _publish, args = (server, updates, done))
+    thread.start()
+
+    trades, others = [], []
+    try:
+        q = QConnection(host = 'localhost', port = server.getsockname()[1], reader_class = QReader, writer_class = QWriter)
+        q.open()
+
+        subscriber = QSubscriber(q, batch_size = 4, batch_interval = 0.5, default_handler = lambda table, batch: others.append((table, batch)))
+        response = subscriber.subscribe('trade', handler = lambda table, batch: trades.append(len(batch)))
+        assert response[0] == 'trade', 'unexpected subscription response: %s' % response
+
+        with subscriber:
+            assert _wait_for(lambda: sum(trades) == 10 and len(others) == 2)
+
+        assert trades == [4, 4, 2], 'unexpected batches: %s' % trades
+        assert others[0][0] == 'quote' and len(others[0][1]) == 1
+        assert others[1] == (None, [-1])
+        assert subscriber.stats.received == 12 and subscriber.stats.dropped == 0
+        assert not q.is_connected()
+    finally:
+        done.set()
+        thread.join()
+        server.close()
+
+
+def test_subscriber_overflow():
+    subscriber = QSubscriber(None, queue_size = 2, overflow = OverflowPolicy.DROP_OLDEST)
+    for i in range(5):
+        subscriber._enqueue((None, i))
+    assert [subscriber._queue.get_nowait()[1] for _ in range(2)] == [3, 4]
+    assert subscriber.stats.dropped == 3
+
+    subscriber = QSubscriber(None, queue_size = 2, overflow = OverflowPolicy.DROP_NEWEST)
+    for i in range(5):
+        subscriber._enqueue((None, i))
+    assert [subscriber._queue.get_nowait()[1] for _ in range(2)] == [0, 1]
+    assert subscriber.stats.dropped == 3
+
+
+def test_subscriber_late_response():
+    trades, others = [], []
+    with QServer() as server:
+        def subscribe(table, symbols):
+            for i in range(3):
+                server.client.sendAsync(numpy.bytes_(b'upd'), numpy.bytes_(b'trade'), _trade(i))
+
+        server.register('slow', lambda x: time.sleep(0.3) or x)
+        server.register('.u.sub', subscribe)
+
+        q = QConnection(host = 'localhost', port = server.port, reader_class = QReader, writer_class = QWriter)
+        q.open()
+        try:
+            q.sendSync('slow', numpy.int64(1), timeout = 0.05)
+            assert False, 'QTimeoutException expected'
+        except QTimeoutException:
+            pass
+
+        # late response of the timed out query isn't delivered as an update
+        subscriber = QSubscriber(q, default_handler = lambda table, batch: others.append((table, batch)))
+        with subscriber:
+            subscriber.subscribe('trade', handler = lambda table, batch: trades.append(len(batch)))
+            assert _wait_for(lambda: sum(trades) == 3)
+
+        assert others == [], 'unexpected updates: %s' % others
+        assert subscriber.stats.received == 3 and subscriber.error is None
+
+
+
+test_subscriber()
+test_subscriber_overflow()
+test_subscriber_late_response()
@@ -92,6 +92,58 @@ def test_qdict():
         i += 1
 
 
+def test_qdict_index():
+    d = QDictionary(qlist(numpy.array([3, 1, 2, 1], dtype=numpy.int64), qtype=QLONG_LIST),
+                    qlist(numpy.array(['c', 'a', 'b', 'd']), qtype=QSYMBOL_LIST))
+
+    # first occurrence of duplicated keys wins, as with linear search
+    assert d[1] == b'a' and d[numpy.int32(2)] == b'b' and d[3.0] == b'c'
+    assert 1 in d and not 'a' in d
+    with pytest.raises(KeyError):
+        d[4]
+
+    values = d.get_many([1, 2, 3, 1])
+    assert isinstance(values, QList) and list(values) == [b'a', b'b', b'c', b'a']
+    assert list(d.get_many(numpy.array([2.0, 3.0]))) == [b'b', b'c']
+    with pytest.raises(KeyError):
+        d.get_many([1, 4])
+
+    # index is rebuilt when keys are replaced
+    d.keys = qlist(numpy.array([4, 5, 6, 7], dtype=numpy.int64), qtype=QLONG_LIST)
+    assert d[4] == b'c' and list(d.get_many([7, 5])) == [b'd', b'a']
+    with pytest.raises(KeyError):
+        d[1]
+
+    # indexed keys are copied, the caller's array stays writable
+    keys = qlist(numpy.array([8, 5, 6, 7], dtype=numpy.int64), qtype=QLONG_LIST)
+    d.keys = keys
+    assert d[8] == b'c' and 5 in d and list(d.get_many([6])) == [b'b']
+    keys[0] = 9
+    assert d[8] == b'c' and 9 not in d
+    assert d.keys.meta.qtype == QLONG
+    with pytest.raises(ValueError):
+        d.keys[0] = 9
+
+    # lists of keys can be modified in place
+    d = QDictionary([1, 2], [3, 4])
+    assert d[1] == 3
+    d.keys[0] = 5
+    assert d[5] == 3 and 1 not in d
+
+    d = QDictionary(qlist(numpy.array([b'abc', b'x']), qtype=QSYMBOL_LIST), [numpy.int64(1), [2, 3]])
+    assert d[b'x'] == [2, 3] and d.get_many([b'x', b'abc']) == [[2, 3], 1]
+    with pytest.raises(KeyError):
+        d.get_many(['x'])
+
+    d[b'abc'] = numpy.int64(4)
+    assert d[b'abc'] == 4
+
+    # keys which aren't hashable consistently with equality are searched linearly
+    d = QDictionary([qlist(numpy.array([0, 1]), qtype=QLONG_LIST), qtemporal(numpy.datetime64('2000-01-01', 'D'), qtype=QDATE)], [1, 2])
+    assert d[qlist(numpy.array([0, 1]), qtype=QLONG_LIST)] == 1
+    assert d.get_many([qlist(numpy.array([0, 1]), qtype=QLONG_LIST)]) == [1]
+
+
 def test_qtable():
     with pytest.raises(ValueError):
         qtable(qlist(['name', 'iq'], qtype=QSYMBOL_LIST),
@@ -165,6 +217,60 @@ def test_qkeyedtable():
 
 
 
+def test_qkeyedtable_index():
+    t = QKeyedTable(qtable(['eid'], [qlist(numpy.array([1003, 1001, 1002, 1001]), qtype=QLONG_LIST)]),
+                    qtable(['pos', 'size'], [qlist(numpy.array(['d3', 'd1', 'd2', 'd4']), qtype=QSYMBOL_LIST),
+                                             qlist(numpy.array([3.5, 1.5, 2.5, 4.5]), qtype=QDOUBLE_LIST)]))
+
+    # first row of duplicated keys wins
+    assert tuple(t.loc[1001]) == (b'd1', 1.5) and tuple(t.loc[numpy.int32(1002)]) == (b'd2', 2.5)
+    with pytest.raises(KeyError):
+        t.loc[1004]
+
+    rows = t.loc[numpy.array([1002, 1003, 1001])]
+    assert isinstance(rows, QTable) and list(rows['pos']) == [b'd2', b'd3', b'd1']
+    with pytest.raises(KeyError):
+        t.loc[[1001, 1004]]
+
+    joined = t.join([1004, 1002])
+    assert list(joined['pos']) == [b'', b'd2']
+    assert numpy.isnan(joined['size'][0]) and joined['size'][1] == 2.5
+    assert joined.meta.pos == QSYMBOL
+
+    # composite keys, temporal key columns
+    t = QKeyedTable(QColumnarTable(['sym', 'date'], [qlist(numpy.array(['a', 'b', 'a', 'b']), qtype=QSYMBOL_LIST),
+                                                     qlist(numpy.array([1, 1, 2, 2]), qtype=QDATE_LIST)]),
+                    QColumnarTable(['size'], [qlist(numpy.array([1, 2, 3, 4]), qtype=QLONG_LIST)]))
+
+    assert t.loc[('b', 2)] == (4, ) and t.loc[(b'a', numpy.datetime64('2000-01-03', 'D'))] == (3, )
+    assert t.loc[t.keys[0]] == (1, )
+    rows = t.loc[[('b', 1), ('a', 2)]]
+    assert isinstance(rows, QColumnarTable) and list(rows['size']) == [2, 3]
+    assert list(t.join([('a', 1), ('c', 1)])['size']) == [1, qnull(QLONG)]
+    assert list(t.join(qtable(['date', 'sym'], [qlist(numpy.array([2]), qtype=QDATE_LIST), qlist(numpy.array(['a']), qtype=QSYMBOL_LIST)]))['size']) == [3]
+    with pytest.raises(ValueError):
+        t.loc[[('a', 1, 1)]]
+
+    # ranges over the first key column
+    assert list(t.between('b', 'b').values['size']) == [2, 4]
+    t = QKeyedTable(qtable(['time'], [qlist(numpy.arange(10, dtype=numpy.int64) * 10, qtype=QLONG_LIST)]),
+                    qtable(['size'], [qlist(numpy.arange(10, dtype=numpy.int64), qtype=QLONG_LIST)]))
+    selected = t.between(15, 40)
+    assert list(selected.keys['time']) == [20, 30, 40] and list(selected.values['size']) == [2, 3, 4]
+    assert numpy.shares_memory(selected.values['size'], t.values['size'])
+    assert len(t.between(100, 200)) == 0
+
+    # index is rebuilt when keys are replaced, the caller's keys stay writable
+    keys = qtable(['time'], [qlist(numpy.arange(10, dtype=numpy.int64), qtype=QLONG_LIST)])
+    t.keys = keys
+    assert tuple(t.loc[5]) == (5, )
+    keys['time'][0] = 5
+    assert tuple(t.loc[0]) == (0, ) and tuple(t.loc[5]) == (5, )
+    with pytest.raises(ValueError):
+        t.keys['time'][0] = 5
+
+
+
 def test_qtemporallist():
     na_dt = numpy.arange('1999-01-01', '2005-12-31', dtype='datetime64[D]')
     na = array_to_raw_qtemporal(na_dt, qtype=QDATE_LIST)
@@ -332,8 +438,10 @@ def test_array_from_raw_qtemporal():
 
 test_is_null()
 test_qdict()
+test_qdict_index()
 test_qtable()
 test_qkeyedtable()
+test_qkeyedtable_index()
 test_qtemporallist()
 test_array_to_raw_qtemporal()
 test_array_from_raw_qtemporal()
@@ -15,6 +15,7 @@
 #
 
 import binascii
+import struct
 import sys
 if sys.version > '3':
     long = int
@@ -383,6 +384,86 @@ def test_write_single_char_string():
             single_char_strings = not single_char_strings
 
 
+def test_write_compressed():
+    COMPRESSED = OrderedDict()
+
+    with open('tests/QCompressedExpressions3.out', 'rb') as f:
+        while True:
+            query = f.readline().strip()
+            binary = f.readline().strip()
+
+            if not binary:
+                break
+
+            COMPRESSED[query] = binary
+
+    w = qwriter.QWriter(None, 3)
+
+    for query, value in ((b'1000#`q', qlist(numpy.array(['q'] * 1000), qtype = QSYMBOL_LIST)),
+                         (b'([] q:1000#`q)', qtable(qlist(numpy.array(['q']), qtype = QSYMBOL_LIST),
+                                                    [qlist(numpy.array(['q'] * 1000), qtype = QSYMBOL_LIST)]))):
+        serialized = binascii.hexlify(w.write(value, 1, compress = True))[16:].lower()
+        assert serialized == COMPRESSED[query].lower(), 'compression failed: %s, expected: %s actual: %s' % (query,  COMPRESSED[query].lower(), serialized)
+
+        # messages below the threshold are sent uncompressed
+        serialized = w.write(value, 1, compress = True, compress_threshold = 1 << 20)
+        assert serialized[2] == 0, 'unexpected compression: %s' % query
+
+    # data which cannot be compressed by half is sent as is
+    serialized = w.write(qlist(numpy.random.randint(0, 1 << 62, 1000), qtype = QLONG_LIST), 1, compress = True)
+    assert serialized[2] == 0, 'unexpected compression of random data'
+
+
+
+def test_write_large_message():
+    from qpython.qreader import QReader
+
+    class Stream(object):
+        def __init__(self):
+            self.chunks = []
+
+        def sendall(self, data):
+            self.chunks.append(bytes(data))
+
+    value = qlist(numpy.arange(1000) % 10, qtype = QLONG_LIST)
+    expected = qwriter.QWriter(None, 3).write(value, 1)
+
+    max_message_size, chunk_size = qwriter.MAX_MESSAGE_SIZE, qwriter.CHUNK_SIZE
+    # scaled down limits, messages over MAX_MESSAGE_SIZE are handled as >2GB
+    qwriter.MAX_MESSAGE_SIZE, qwriter.CHUNK_SIZE = 1000, 256
+    try:
+        # compression mode 1 can't describe >2GB messages either
+        for options in ({}, {'compress': True}):
+            try:
+                qwriter.QWriter(None, 3).write(value, 1, **options)
+                assert False, 'QWriterException expected'
+            except qwriter.QWriterException:
+                pass
+        small = qlist(numpy.arange(100) % 10, qtype = QLONG_LIST)
+        assert len(qwriter.QWriter(None, 3).write(small, 1, compress = True, compress_threshold = 0)) < 800
+
+        w = qwriter.QWriter(None, 6)
+        # vectors are serialized in chunks
+        serialized = w.write(value, 1)
+        assert serialized == expected
+        assert serialized[3] == 0 and struct.unpack('=I', serialized[4:8])[0] == 8014
+
+        compressed = w.write(value, 1, compress = True)
+        assert compressed[2] == 2, 'compression mode 2 expected'
+        assert struct.unpack('=q', compressed[8:16])[0] == 8014
+        assert QReader(None).read(source = compressed).data == value
+
+        # messages are sent in chunks
+        stream = Stream()
+        qwriter.QWriter(stream, 6).write(value, 1)
+        assert len(stream.chunks) == 32 and b''.join(stream.chunks) == serialized
+    finally:
+        qwriter.MAX_MESSAGE_SIZE, qwriter.CHUNK_SIZE = max_message_size, chunk_size
+
+
+
 init()
 test_writing()
 test_write_single_char_string()
+test_write_compressed()
+test_write_large_message()